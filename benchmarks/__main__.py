@@ -0,0 +1,177 @@
+"""Time synapse's operations on synthetic networks of increasing size.
+
+Run with ``python -m benchmarks``. Results are printed and, with --output,
+written as JSON so that runs of different versions can be compared with
+--compare.
+
+"""
+import argparse
+import json
+import pathlib
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import synapse
+
+from .vault import VaultSpec, generate
+
+
+DEFAULT_SIZES = [100, 1_000, 10_000]
+
+
+def _fresh(root):
+    return synapse.Network(root)
+
+
+def bench_iterate(root, keys):
+    network = _fresh(root)
+    return lambda: sum(1 for _ in network)
+
+
+def bench_check(root, keys):
+    return lambda: _fresh(root).check()
+
+
+def bench_bfs(root, keys):
+    network = _fresh(root)
+    start = network[keys['topic'][0]]
+
+    def note_neighbors(node):
+        return (v for v in node.neighbors if isinstance(v, synapse.NoteNode))
+
+    return lambda: synapse.bfs(start, neighbors=note_neighbors)
+
+
+def bench_fix_bidirectional_links(root, keys):
+    network = _fresh(root)
+    return network.fix_bidirectional_links
+
+
+def bench_rekey(root, keys):
+    network = _fresh(root)
+    node = network[keys['topic'][0]]
+    return lambda: node.rekey('renamed-topic')
+
+
+def bench_add_link(root, keys):
+    network = _fresh(root)
+    node = network[keys['thought'][0]]
+    return lambda: node.add_link(keys['topic'][-1])
+
+
+# name -> (setup, whether the operation modifies the network)
+OPERATIONS = {
+    'iterate': (bench_iterate, False),
+    'check': (bench_check, False),
+    'bfs': (bench_bfs, False),
+    'fix_bidirectional_links': (bench_fix_bidirectional_links, True),
+    'rekey': (bench_rekey, True),
+    'add_link': (bench_add_link, True),
+}
+
+
+def run(sizes, operations, repeat, tmpdir):
+    """Time each operation at each size, returning a list of result records."""
+    results = []
+    for size in sizes:
+        spec = VaultSpec.of_size(size)
+        pristine = pathlib.Path(tmpdir) / f'vault-{size}'
+        keys = generate(pristine, spec)
+
+        for name in operations:
+            setup, modifies = OPERATIONS[name]
+            timings = []
+            for _ in range(repeat):
+                root = pristine
+                if modifies:
+                    root = pathlib.Path(tmpdir) / f'scratch-{size}'
+                    shutil.rmtree(root, ignore_errors=True)
+                    shutil.copytree(pristine, root)
+
+                operation = setup(root, keys)
+                start = time.perf_counter()
+                operation()
+                timings.append(time.perf_counter() - start)
+
+            result = {
+                'size': size,
+                'notes': spec.notes,
+                'operation': name,
+                'seconds': min(timings),
+                'repeat': repeat,
+            }
+            print(f'{size:>8} {name:>24} {result["seconds"]:12.4f} s', flush=True)
+            results.append(result)
+    return results
+
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=pathlib.Path(__file__).parent
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, threshold):
+    """Print the change relative to a baseline; return the regressions."""
+    previous = {(r['size'], r['operation']): r['seconds'] for r in baseline['results']}
+    regressions = []
+    for result in results:
+        before = previous.get((result['size'], result['operation']))
+        if not before:
+            continue
+        ratio = result['seconds'] / before
+        flag = ''
+        if ratio > 1 + threshold:
+            flag = '  REGRESSION'
+            regressions.append(result)
+        print(f'{result["size"]:>8} {result["operation"]:>24} {ratio:8.2f}x{flag}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+                        help='approximate numbers of notes (default: %(default)s)')
+    parser.add_argument('--operations', nargs='+', choices=list(OPERATIONS),
+                        default=list(OPERATIONS))
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='report the best of this many runs')
+    parser.add_argument('--output', type=pathlib.Path, help='write results as JSON')
+    parser.add_argument('--compare', type=pathlib.Path,
+                        help='JSON results of an earlier run to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='slowdown counted as a regression (default: %(default)s)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        results = run(args.sizes, args.operations, args.repeat, tmpdir)
+
+    report = {
+        'revision': _git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'timestamp': time.time(),
+        'results': results,
+    }
+
+    if args.output is not None:
+        with args.output.open('w') as fileobj:
+            json.dump(report, fileobj, indent=2)
+
+    if args.compare is not None:
+        with args.compare.open() as fileobj:
+            baseline = json.load(fileobj)
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
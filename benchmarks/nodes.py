@@ -0,0 +1,49 @@
+"""Memory used per Node, and the cost of set membership between nodes.
+
+Run with ``python -m benchmarks.nodes``.
+
+"""
+import argparse
+import time
+import tracemalloc
+
+import synapse
+
+
+def measure_memory(network, keys, touch=lambda node: None):
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    nodes = [synapse.NoteNode(network, key) for key in keys]
+    for node in nodes:
+        touch(node)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    used = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    return used / len(nodes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--nodes', type=int, default=100_000)
+    args = parser.parse_args()
+
+    network = synapse.Network('.')
+    # keys are built at runtime, like those parsed out of notes
+    keys = [''.join(['thought:', 'note-', str(i % 1000)]) for i in range(args.nodes)]
+
+    print(f'{measure_memory(network, keys):10.1f} bytes per node')
+    per_node = measure_memory(network, keys, lambda node: node.type)
+    print(f'{per_node:10.1f} bytes per node after reading type')
+
+    nodes = [synapse.NoteNode(network, key) for key in keys[:1000]]
+    start = time.perf_counter()
+    try:
+        node_set = set(nodes)
+        hits = sum(node in node_set for node in nodes)
+        print(f'{(time.perf_counter() - start) * 1e3:10.2f} ms for {hits} set lookups')
+    except TypeError as exc:
+        print(f'nodes cannot be put in sets: {exc}')
+
+
+if __name__ == '__main__':
+    main()
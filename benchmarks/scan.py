@@ -0,0 +1,72 @@
+"""Throughput of link extraction: the original approach against synapse._scan.
+
+Run with ``python -m benchmarks.scan``.
+
+"""
+import argparse
+import pathlib
+import random
+import re
+import tempfile
+import time
+
+from synapse._scan import read_links
+
+
+def original_links(path):
+    """Link extraction as NoteNode.links originally did it."""
+    with open(path, 'rb') as fileobj:
+        contents = fileobj.read().decode()
+    matches = re.findall(r'\[\[.*?\]\]', contents)
+    return tuple(x.strip('[]') for x in matches)
+
+
+def make_corpus(root, n_notes, note_size, links_per_note, seed=0):
+    rng = random.Random(seed)
+    words = ['lorem', 'ipsum', 'dolor', 'sit', 'amet', 'graph', 'note', 'café']
+    paths = []
+    for i in range(n_notes):
+        lines = [f'# Note {i}', '']
+        size = 0
+        while size < note_size:
+            line = ' '.join(rng.choice(words) for _ in range(12))
+            lines.append(line)
+            size += len(line) + 1
+        for _ in range(links_per_note):
+            lines.insert(rng.randrange(len(lines)), f'- [[thought:t{rng.randrange(n_notes)}]]')
+        path = root / f't{i}.md'
+        path.write_text('\n'.join(lines))
+        paths.append(path)
+    return paths
+
+
+def measure(extract, paths, repeat):
+    total_bytes = sum(p.stat().st_size for p in paths)
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for path in paths:
+            extract(path)
+        best = min(best, time.perf_counter() - start)
+    return total_bytes / best / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--notes', type=int, default=500)
+    parser.add_argument('--note-size', type=int, default=20_000, help='bytes per note')
+    parser.add_argument('--links', type=int, default=20, help='links per note')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = make_corpus(pathlib.Path(tmp), args.notes, args.note_size, args.links)
+        assert all(original_links(p) == read_links(p) for p in paths)
+
+        for name, extract in [('original', original_links), ('scan', read_links)]:
+            throughput = measure(extract, paths, args.repeat)
+            print(f'{name:10} {throughput:10.1f} MB/s')
+
+
+if __name__ == '__main__':
+    main()
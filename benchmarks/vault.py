@@ -0,0 +1,142 @@
+"""Generation of synthetic networks of notes for benchmarking."""
+import dataclasses
+import pathlib
+import random
+from typing import Dict, List, Union
+
+
+WORDS = (
+    'lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod '
+    'tempor incididunt ut labore et dolore magna aliqua graph note topic'
+).split()
+
+SECTIONS = {
+    'topic': 'Topics',
+    'project': 'Projects',
+    'thought': 'Thoughts',
+    'journal': 'Journals',
+    'image': 'Images',
+    'file': 'Files',
+}
+
+
+@dataclasses.dataclass
+class VaultSpec:
+    """The shape of a synthetic network.
+
+    `links_per_note` is the average number of links made by each note to
+    other notes; `missing_backlinks` is the fraction of links between notes
+    that are not reciprocated, so that there is work for the bidirectionality
+    check and for fix-bidirectional-links.
+
+    """
+
+    topics: int = 10
+    projects: int = 5
+    thoughts: int = 60
+    journal: int = 25
+    images: int = 10
+    files: int = 10
+    links_per_note: int = 4
+    note_size: int = 2_000
+    missing_backlinks: float = 0.05
+    seed: int = 0
+
+    @classmethod
+    def of_size(cls, notes: int, **kwargs) -> 'VaultSpec':
+        """A spec with the default proportions, scaled to about `notes` notes."""
+        def share(fraction):
+            return max(1, round(notes * fraction))
+
+        return cls(
+            topics=share(0.10),
+            projects=share(0.05),
+            thoughts=share(0.60),
+            journal=share(0.25),
+            images=share(0.10),
+            files=share(0.10),
+            **kwargs
+        )
+
+    @property
+    def notes(self) -> int:
+        return self.topics + self.projects + self.thoughts + self.journal
+
+
+def generate(root: Union[str, pathlib.Path], spec: VaultSpec) -> Dict[str, List[str]]:
+    """Write a synthetic network to root, returning the keys of each type.
+
+    Topics are chained together so that they are connected, every project
+    and thought links to a topic, and every asset is linked from some note.
+
+    """
+    root = pathlib.Path(root)
+    rng = random.Random(spec.seed)
+
+    keys = {
+        'topic': [f'topic-{i}' for i in range(spec.topics)],
+        'project': [f'project:project-{i}' for i in range(spec.projects)],
+        'thought': [f'thought:thought-{i}' for i in range(spec.thoughts)],
+        'journal': [f'journal:2021-01-{i:05d}' for i in range(spec.journal)],
+        'image': [f'image:{i % 10}/image-{i}.png' for i in range(spec.images)],
+        'file': [f'file:{i % 10}/file-{i}.pdf' for i in range(spec.files)],
+    }
+    notes = keys['topic'] + keys['project'] + keys['thought'] + keys['journal']
+    links: Dict[str, List[str]] = {key: [] for key in notes}
+
+    def link(u, v, reciprocate=True):
+        if v not in links[u]:
+            links[u].append(v)
+        if reciprocate and v in links and rng.random() >= spec.missing_backlinks:
+            if u not in links[v]:
+                links[v].append(u)
+
+    for u, v in zip(keys['topic'], keys['topic'][1:]):
+        link(u, v)
+
+    for key in keys['project']:
+        link(key, rng.choice(keys['topic']))
+
+    for key in keys['thought']:
+        link(key, rng.choice(keys['topic'] + keys['project']))
+
+    for key in notes:
+        for _ in range(max(0, spec.links_per_note - len(links[key]))):
+            link(key, rng.choice(notes))
+
+    for key in keys['image'] + keys['file']:
+        link(rng.choice(notes), key, reciprocate=False)
+
+    for dirname in ['thought', 'project', 'journal']:
+        (root / dirname).mkdir(parents=True, exist_ok=True)
+
+    for key in notes:
+        _write_note(root, key, links[key], spec.note_size, rng)
+
+    for key in keys['image'] + keys['file']:
+        path = root / key.replace(':', '/')
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b'\0' * 64)
+
+    return keys
+
+
+def _write_note(root, key, links, note_size, rng):
+    lines = [f'# {key}', '']
+    size = 0
+    while size < note_size:
+        line = ' '.join(rng.choice(WORDS) for _ in range(12))
+        lines.append(line)
+        size += len(line) + 1
+
+    by_section: Dict[str, List[str]] = {}
+    for other in links:
+        type_ = other.split(':')[0] if ':' in other else 'topic'
+        by_section.setdefault(SECTIONS[type_], []).append(other)
+
+    for section, others in by_section.items():
+        lines.extend(['', f'## :{section}:'])
+        lines.extend(f'- [[{other}]]' for other in others)
+
+    path = root / (key.replace(':', '/') + '.md')
+    path.write_text('\n'.join(lines) + '\n')
@@ -16,7 +16,6 @@
               name = "synapse";
               src = ./.;
               propagatedBuildInputs = with python38Packages; [ 
-                markdown
                 networkx
                 matplotlib
               ];
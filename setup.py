@@ -4,8 +4,12 @@ from setuptools import setup, find_packages
 setup(
     name="synapse",
     version="0.0.0",
-    packages=find_packages(),
-    install_requires=["markdown", "networkx", "matplotlib"],
+    packages=find_packages(exclude=["benchmarks", "benchmarks.*"]),
+    install_requires=[],
+    extras_require={
+        "draw": ["networkx", "matplotlib"],
+        "rank": ["numpy", "scipy"],
+    },
     tests_require=["pytest"],
     entry_points={
         "console_scripts": [
@@ -1,2 +1,5 @@
-from ._network import Network, NoteNode, Node, bfs
+from ._network import Network, NoteNode, Node, bfs, on_snapshot
+from ._graph import Snapshot
+from ._profile import CheckProfile
+from ._report import Failure
 from .exceptions import *
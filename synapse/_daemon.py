@@ -0,0 +1,242 @@
+import contextlib
+import hashlib
+import io
+import json
+import os
+import pathlib
+import socket
+import stat
+import tempfile
+import traceback
+from typing import List, Optional
+
+from ._network import Network
+from .exceptions import DaemonError
+
+
+SOCKET_PATH = pathlib.Path('.synapse') / 'daemon.sock'
+
+# unix socket paths longer than this cannot be bound on every platform
+MAX_SOCKET_PATH = 100
+
+# seconds to wait for the reply to a command, and to a ping or shutdown
+REQUEST_TIMEOUT = 600
+PING_TIMEOUT = 5
+
+
+def private_dir() -> pathlib.Path:
+    """The per-user directory for sockets that do not fit in their workdir.
+
+    This is ``synapse`` in ``$XDG_RUNTIME_DIR`` if it is set, and otherwise
+    ``synapse-<uid>`` in the temporary directory. It is only created by the
+    daemon; see :func:`make_private_dir`.
+
+    """
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime_dir:
+        return pathlib.Path(runtime_dir) / 'synapse'
+    return pathlib.Path(tempfile.gettempdir()) / f'synapse-{os.getuid()}'
+
+
+def make_private_dir(directory: pathlib.Path):
+    """Create a directory only the current user can use, or check an existing one.
+
+    Raises DaemonError if the directory is a symlink, belongs to someone
+    else or can be accessed by others, since anyone who can write to it
+    could put their own socket in place of the daemon's.
+
+    """
+    with contextlib.suppress(FileExistsError):
+        directory.mkdir(mode=0o700)
+    info = os.lstat(directory)
+    if (not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid()
+            or info.st_mode & 0o077):
+        raise DaemonError(f'{directory} is not a private directory; refusing to use it.')
+
+
+def socket_path(workdir) -> pathlib.Path:
+    """Where the daemon for a workdir listens.
+
+    This is ``.synapse/daemon.sock`` in the workdir, unless that path is too
+    long for a unix socket, in which case it is named after a digest of the
+    workdir in the :func:`private_dir`.
+
+    """
+    workdir = pathlib.Path(workdir).resolve()
+    path = workdir / SOCKET_PATH
+    if len(os.fsencode(path)) <= MAX_SOCKET_PATH:
+        return path
+    digest = hashlib.sha1(os.fsencode(workdir)).hexdigest()[:16]
+    return private_dir() / f'{digest}.sock'
+
+
+def _send(path, message: dict, timeout: float) -> Optional[dict]:
+    """Send a message to the daemon at path and return its reply.
+
+    Returns None if no daemon is listening. Raises DaemonError if the socket
+    belongs to another user, in which case it is not connected to, or if the
+    daemon does not reply in time or closes the connection without a reply.
+
+    """
+    try:
+        info = os.stat(path)
+    except FileNotFoundError:
+        return None
+    if not stat.S_ISSOCK(info.st_mode) or info.st_uid != os.getuid():
+        raise DaemonError(f'{path} is not a socket of yours; not connecting to it.')
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        try:
+            sock.connect(os.fspath(path))
+        except (FileNotFoundError, ConnectionRefusedError):
+            return None
+        try:
+            sock.sendall(json.dumps(message).encode() + b'\n')
+            sock.shutdown(socket.SHUT_WR)
+            data = b''.join(iter(lambda: sock.recv(65536), b''))
+        except socket.timeout:
+            raise DaemonError(f'The daemon did not reply within {timeout} seconds.') from None
+        except OSError as exc:
+            raise DaemonError(f'Lost the connection to the daemon: {exc}') from None
+
+    try:
+        return json.loads(data)
+    except ValueError:
+        raise DaemonError('The daemon closed the connection without a reply.') from None
+
+
+def request(workdir, argv: List[str]) -> Optional[dict]:
+    """Run a synapse command line in the daemon for the workdir.
+
+    Returns a dictionary with the command's ``stdout``, ``stderr`` and
+    ``exit`` status, or None if no daemon is running. Raises DaemonError
+    if the daemon fails to reply, as the command may or may not have run.
+
+    """
+    return _send(socket_path(workdir), {'argv': argv, 'cwd': os.getcwd()}, REQUEST_TIMEOUT)
+
+
+def is_running(workdir) -> bool:
+    """Whether a daemon is serving the workdir."""
+    return _send(socket_path(workdir), {'ping': True}, PING_TIMEOUT) is not None
+
+
+def shutdown(workdir) -> bool:
+    """Stop the daemon for the workdir, returning whether one was running."""
+    return _send(socket_path(workdir), {'shutdown': True}, PING_TIMEOUT) is not None
+
+
+def daemonize():
+    """Fork into the background; returns True in the child, False in the parent."""
+    if os.fork() > 0:
+        return False
+
+    os.setsid()
+    devnull = os.open(os.devnull, os.O_RDWR)
+    for fd in range(3):
+        os.dup2(devnull, fd)
+    os.close(devnull)
+    return True
+
+
+class Server:
+    """Serves synapse commands for one workdir from a network kept in memory.
+
+    Before each request, changes reported by the watcher are applied to the
+    network with :meth:`Network.reload`, so that edits made outside synapse
+    are seen. Requests are handled one at a time.
+
+    """
+
+    def __init__(self, network: Network, parser, watcher):
+        self.network = network
+        self.parser = parser
+        self.watcher = watcher
+        self.path = socket_path(network.root)
+        self._running = False
+
+    def serve_forever(self):
+        if self.path.parent == private_dir():
+            make_private_dir(self.path.parent)
+        else:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        with contextlib.suppress(FileNotFoundError):
+            self.path.unlink()
+
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            # create the socket without access for others, rather than
+            # restricting it after the fact
+            umask = os.umask(0o177)
+            try:
+                sock.bind(os.fspath(self.path))
+            finally:
+                os.umask(umask)
+            sock.listen()
+            self._running = True
+            try:
+                while self._running:
+                    connection, _ = sock.accept()
+                    with connection:
+                        self._handle(connection)
+            finally:
+                with contextlib.suppress(FileNotFoundError):
+                    self.path.unlink()
+
+    def _handle(self, connection):
+        # a client which hangs up, stalls or sends garbage only loses its
+        # own request; the daemon keeps serving the others
+        connection.settimeout(PING_TIMEOUT)
+        try:
+            data = b''.join(iter(lambda: connection.recv(65536), b''))
+            message = json.loads(data)
+            if not isinstance(message, dict):
+                return
+            if message.get('shutdown') or message.get('ping'):
+                self._running = not message.get('shutdown')
+                response = {'stdout': '', 'stderr': '', 'exit': 0}
+            elif isinstance(message.get('argv'), list):
+                self._catch_up()
+                response = self.run(message['argv'], message.get('cwd'))
+            else:
+                return
+            connection.sendall(json.dumps(response).encode())
+        except (ValueError, OSError):
+            pass
+
+    def _catch_up(self):
+        from ._watch import RESCAN
+
+        changed = self.watcher.wait(timeout=0)
+        if RESCAN in changed:
+            self.network.refresh()
+        elif changed:
+            self.network.reload(changed)
+
+    def run(self, argv: List[str], cwd: Optional[str] = None) -> dict:
+        """Run a command line against the warm network, capturing its output."""
+        stdout, stderr = io.StringIO(), io.StringIO()
+        old_cwd = os.getcwd()
+        status = 0
+        with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+            try:
+                if cwd is not None:
+                    os.chdir(cwd)
+                args = self.parser.parse_args(argv)
+                if not getattr(args, 'daemon_can_serve', False):
+                    raise SystemExit('This command cannot be served by the daemon.')
+                args.network = self.network
+                args.cmd(args)
+            except SystemExit as exc:
+                if isinstance(exc.code, int):
+                    status = exc.code
+                elif exc.code is not None:
+                    print(exc.code, file=stderr)
+                    status = 1
+            except Exception:
+                traceback.print_exc()
+                status = 1
+            finally:
+                os.chdir(old_cwd)
+
+        return {'stdout': stdout.getvalue(), 'stderr': stderr.getvalue(), 'exit': status}
@@ -0,0 +1,142 @@
+import csv
+import json
+import os
+from typing import Callable, Dict, Iterator, TextIO, Tuple, Union
+from xml.sax.saxutils import escape, quoteattr
+
+from ._index import _read_bytes
+from ._scan import scan_sectioned_links
+from ._tree import iter_nodes
+from .util import NOTE_TYPES, get_key_type
+
+
+Record = Tuple[str, dict]
+
+
+def iter_records(root: Union[str, os.PathLike]) -> Iterator[Record]:
+    """Lazily yield ('node', fields) and ('edge', fields) as they are found.
+
+    A node has a key, type, path relative to the root, size in bytes and
+    mtime in seconds. An edge has a src, dst and section, which is the name
+    of the ``## :Section:`` the link is in, or None. Each note is yielded
+    just before the links it makes; nothing is kept once yielded.
+
+    """
+    root = os.fspath(root)
+    for type_, key, entry in iter_nodes(root):
+        stat = entry.stat()
+        yield 'node', {
+            'key': key,
+            'type': type_,
+            'path': os.path.relpath(entry.path, root).replace(os.sep, '/'),
+            'size': stat.st_size,
+            'mtime': stat.st_mtime,
+        }
+        if type_ in NOTE_TYPES:
+            for dst, section in scan_sectioned_links(_read_bytes(entry.path)):
+                yield 'edge', {'src': key, 'dst': dst, 'section': section}
+
+
+def _write_jsonl(records: Iterator[Record], out: TextIO):
+    for kind, fields in records:
+        out.write(json.dumps({'kind': kind, **fields}) + '\n')
+
+
+CSV_COLUMNS = ['kind', 'key', 'type', 'path', 'size', 'mtime', 'src', 'dst', 'section']
+
+
+def _write_csv(records: Iterator[Record], out: TextIO):
+    writer = csv.DictWriter(out, CSV_COLUMNS, lineterminator='\n')
+    writer.writeheader()
+    for kind, fields in records:
+        writer.writerow({'kind': kind, **fields})
+
+
+def _dot_quote(text: str) -> str:
+    return '"' + text.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def _write_dot(records: Iterator[Record], out: TextIO):
+    # edges to keys never declared as nodes become nodes implicitly
+    out.write('digraph synapse {\n')
+    for kind, fields in records:
+        if kind == 'node':
+            attributes = ', '.join(
+                f'{name}={_dot_quote(str(fields[name]))}'
+                for name in ('type', 'path', 'size', 'mtime')
+            )
+            out.write(f'  {_dot_quote(fields["key"])} [{attributes}];\n')
+        else:
+            section = '' if fields['section'] is None else f' [section={_dot_quote(fields["section"])}]'
+            out.write(f'  {_dot_quote(fields["src"])} -> {_dot_quote(fields["dst"])}{section};\n')
+    out.write('}\n')
+
+
+GRAPHML_KEYS = [
+    ('type', 'node', 'string'),
+    ('path', 'node', 'string'),
+    ('size', 'node', 'long'),
+    ('mtime', 'node', 'double'),
+    ('section', 'edge', 'string'),
+]
+
+
+def _graphml_node(key: str, fields: dict) -> str:
+    data = ''.join(
+        f'<data key="{name}">{escape(str(value))}</data>' for name, value in fields.items()
+    )
+    return f'    <node id={quoteattr(key)}>{data}</node>\n'
+
+
+def _write_graphml(records: Iterator[Record], out: TextIO):
+    out.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+    out.write('<graphml xmlns="http://graphml.graphdrawing.org/xmlns">\n')
+    for name, domain, type_ in GRAPHML_KEYS:
+        out.write(
+            f'  <key id="{name}" for="{domain}" attr.name="{name}" attr.type="{type_}"/>\n'
+        )
+    out.write('  <graph id="synapse" edgedefault="directed">\n')
+
+    # every edge must end at a declared node, so remember which were not,
+    # declaring links to missing keys at the end; only keys are kept
+    declared = set()
+    undeclared = set()
+    for kind, fields in records:
+        if kind == 'node':
+            key = fields['key']
+            declared.add(key)
+            undeclared.discard(key)
+            out.write(_graphml_node(key, {
+                name: fields[name] for name in ('type', 'path', 'size', 'mtime')
+            }))
+        else:
+            if fields['dst'] not in declared:
+                undeclared.add(fields['dst'])
+            data = ''
+            if fields['section'] is not None:
+                data = f'<data key="section">{escape(fields["section"])}</data>'
+            out.write(
+                f'    <edge source={quoteattr(fields["src"])} '
+                f'target={quoteattr(fields["dst"])}>{data}</edge>\n'
+            )
+
+    for key in sorted(undeclared):
+        out.write(_graphml_node(key, {'type': get_key_type(key)}))
+    out.write('  </graph>\n</graphml>\n')
+
+
+WRITERS: Dict[str, Callable[[Iterator[Record], TextIO], None]] = {
+    'jsonl': _write_jsonl,
+    'graphml': _write_graphml,
+    'dot': _write_dot,
+    'csv': _write_csv,
+}
+
+
+def export(root: Union[str, os.PathLike], out: TextIO, format: str = 'jsonl'):
+    """Write the nodes and links of the network at root to out, as they are found."""
+    try:
+        writer = WRITERS[format]
+    except KeyError:
+        raise ValueError(f'Unknown export format "{format}".') from None
+    writer(iter_records(root), out)
@@ -0,0 +1,44 @@
+import os
+import subprocess
+from typing import List, Optional, Set, Union
+
+from .exceptions import GitError
+
+
+def _git(root: Union[str, os.PathLike], *args: str) -> bytes:
+    try:
+        result = subprocess.run(
+            ['git', '-C', os.fspath(root), *args],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=False
+        )
+    except OSError as exc:
+        raise GitError(f'Could not run git: {exc}') from None
+    if result.returncode != 0:
+        raise GitError(result.stderr.decode(errors='replace').strip())
+    return result.stdout
+
+
+def _lines(output: bytes) -> List[str]:
+    return [line for line in output.decode().split('\0') if line]
+
+
+def changed_paths(root: Union[str, os.PathLike], rev: str) -> Set[str]:
+    """The paths under root changed since a revision, relative to root.
+
+    This includes files modified, added or deleted in the working tree,
+    whether or not the change is staged, and untracked files which are not
+    ignored. A renamed file counts as the deletion of its old path and the
+    addition of its new one.
+
+    """
+    diff = _git(root, 'diff', '--name-only', '--no-renames', '--relative', '-z', rev, '--')
+    untracked = _git(root, 'ls-files', '--others', '--exclude-standard', '-z')
+    return set(_lines(diff)) | set(_lines(untracked))
+
+
+def contents_at(root: Union[str, os.PathLike], rev: str, relpath: str) -> Optional[bytes]:
+    """The contents of a file, relative to root, at a revision; None if absent."""
+    try:
+        return _git(root, 'show', f'{rev}:./{relpath}')
+    except GitError:
+        return None
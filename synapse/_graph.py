@@ -0,0 +1,363 @@
+import array
+import copy
+import itertools
+import pathlib
+from typing import (
+    Collection, Dict, FrozenSet, Iterable, Iterator, List, Mapping, Optional, Set, Tuple, cast
+)
+
+from ._profile import COUNTERS
+from .util import NOTE_TYPES, get_key_type, get_relative_path
+
+
+class Snapshot:
+    """An immutable view of the keys, types and edges of a network.
+
+    A snapshot is taken in a single pass over the network's link index.
+    Every query afterwards is answered from memory, so any number of checks
+    can share one snapshot without touching the filesystem again.
+
+    Keys are plain strings; nodes are never constructed. Every edge is held
+    in memory, along with a map of predecessors, whichever index backs the
+    network.
+
+    """
+
+    def __init__(self, network):
+        self.root = network.root
+        self._links: Dict[str, Tuple[str, ...]] = dict(network._index.items())
+        # read after the index has been built, as building changes it
+        self.generation = network._index.generation
+        nodes = list(network._paths.nodes())
+        self.keys: Tuple[str, ...] = tuple(key for _, key in nodes)
+        self.types: Dict[str, str] = {key: type_ for type_, key in nodes}
+
+        self._network = network
+        self._exists: Dict[str, bool] = dict.fromkeys(self.keys, True)
+        self._link_sets: Dict[str, FrozenSet[str]] = {}
+        self._adjacency: Optional[Adjacency] = None
+        # the keys checks report on; None for every key
+        self.scope: Optional[FrozenSet[str]] = None
+
+        predecessors: Dict[str, Dict[str, None]] = {}
+        for u, links in self._links.items():
+            for v in links:
+                predecessors.setdefault(v, {})[u] = None
+        self._predecessors: Dict[str, Tuple[str, ...]] = {
+            v: tuple(us) for v, us in predecessors.items()
+        }
+
+    def __contains__(self, key: str) -> bool:
+        try:
+            exists = self._exists[key]
+        except KeyError:
+            # keys such as links to directories are not enumerated; the
+            # network counts this resolution itself
+            exists = self._exists[key] = key in self._network
+            return exists
+        COUNTERS.add('resolutions')
+        return exists
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.keys)
+
+    def of_type(self, *types: str) -> Iterator[str]:
+        """The keys of all nodes with one of the given types, in network order."""
+        return (k for k in self.keys if self.types[k] in types)
+
+    @property
+    def notes(self) -> Iterator[str]:
+        return self.of_type(*NOTE_TYPES)
+
+    def restricted(self, keys: Collection[str]) -> 'Snapshot':
+        """A view of the snapshot whose checks only report on the given keys.
+
+        The view shares the snapshot's data, so every query still sees the
+        whole network; only :meth:`checked` and :meth:`in_scope` change.
+
+        """
+        view = copy.copy(self)
+        view.scope = frozenset(keys)
+        return view
+
+    def in_scope(self, key: str) -> bool:
+        """Whether checks should report on a key."""
+        return self.scope is None or key in self.scope
+
+    def checked(self, *types: str) -> Iterator[str]:
+        """The keys of the given types that checks should report on, in network order."""
+        keys = self.of_type(*types)
+        if self.scope is None:
+            return keys
+        return (k for k in keys if k in self.scope)
+
+    def type(self, key: str) -> str:
+        try:
+            return self.types[key]
+        except KeyError:
+            return get_key_type(key)
+
+    def path(self, key: str) -> pathlib.Path:
+        return self.root / get_relative_path(key)
+
+    def links(self, key: str) -> Tuple[str, ...]:
+        """The keys linked to by a note, including links to missing keys."""
+        return self._links.get(key, ())
+
+    def neighbors(self, key: str) -> Iterator[str]:
+        """The existing keys linked to by a note."""
+        return (v for v in self.links(key) if v in self)
+
+    def links_to(self, u: str, v: str) -> bool:
+        """Whether the note `u` links to `v`."""
+        try:
+            link_set = self._link_sets[u]
+        except KeyError:
+            link_set = self._link_sets[u] = frozenset(self.links(u))
+        return v in link_set
+
+    def predecessors(self, key: str) -> Tuple[str, ...]:
+        """The keys of the notes linking to the given key."""
+        return self._predecessors.get(key, ())
+
+    @property
+    def adjacency(self) -> 'Adjacency':
+        """The links between existing nodes, numbered for fast traversal."""
+        if self._adjacency is None:
+            self._adjacency = Adjacency(self.keys, self._links)
+        return self._adjacency
+
+    def adjacency_of(self, types: Optional[Collection[str]] = None) -> 'Adjacency':
+        """The links among nodes of the given types, numbered for fast traversal."""
+        if types is None:
+            return self.adjacency
+        return Adjacency(list(self.of_type(*types)), self._links)
+
+    def neighborhood(
+            self,
+            key: str,
+            hops: int = 1,
+            types: Optional[Collection[str]] = None
+            ) -> Set[str]:
+        """The existing keys within `hops` links of a key, including the key.
+
+        Links are followed in both directions. If `types` is given, only
+        keys of those types are returned, though paths may pass through
+        nodes of any type.
+
+        """
+        adjacency = self.adjacency
+        start = adjacency.ids.get(key)
+        if start is None:
+            found = {key}
+        else:
+            found = {adjacency.keys[i] for i in adjacency.bfs(start, hops)}
+        if types is not None:
+            found = {k for k in found if self.type(k) in types}
+        return found
+
+    def shortest_path(self, u: str, v: str, directed: bool = False) -> Optional[List[str]]:
+        """The keys on a shortest path from `u` to `v`, or None if there is none.
+
+        Unless `directed` is true, links are followed in both directions.
+
+        """
+        if u == v:
+            return [u]
+        adjacency = self.adjacency
+        start, end = adjacency.ids.get(u), adjacency.ids.get(v)
+        if start is None or end is None:
+            return None
+        parents = adjacency.bfs(start, directed=directed, stop=end)
+        if end not in parents:
+            return None
+        path = [end]
+        while path[-1] != start:
+            path.append(parents[path[-1]])
+        return [adjacency.keys[i] for i in reversed(path)]
+
+    def subgraph(self, keys: Collection[str]) -> Dict[str, List[str]]:
+        """The links among the given keys, as a map from each key to its targets."""
+        adjacency = self.adjacency
+        ids = {adjacency.ids[k]: k for k in keys if k in adjacency.ids}
+        return {
+            k: [adjacency.keys[j] for j in adjacency.successors(i) if j in ids]
+            for i, k in ids.items()
+        }
+
+    def orphans(self, types: Optional[Collection[str]] = None) -> List[str]:
+        """The keys of nodes with no links to or from any existing node."""
+        adjacency = self.adjacency
+        return [
+            k for k in self._keys_of(types)
+            if not adjacency.out_degree(adjacency.ids[k])
+            and not adjacency.in_degree(adjacency.ids[k])
+        ]
+
+    def sinks(self, types: Optional[Collection[str]] = None) -> List[str]:
+        """The keys of nodes which are linked to, but link to no existing node."""
+        adjacency = self.adjacency
+        return [
+            k for k in self._keys_of(types)
+            if not adjacency.out_degree(adjacency.ids[k])
+            and adjacency.in_degree(adjacency.ids[k])
+        ]
+
+    def _keys_of(self, types: Optional[Collection[str]]) -> Iterator[str]:
+        return iter(self.keys) if types is None else self.of_type(*types)
+
+    def components(self, types: Optional[Collection[str]] = None) -> List[Set[str]]:
+        """The connected components of the subgraph of nodes of the given types.
+
+        Links are treated as undirected, and links to nodes of other types
+        are ignored. Components are computed with a union-find over the
+        edges, and are returned largest first; ties are broken by their
+        smallest key. If `types` is None, every node is included.
+
+        """
+        if types is None:
+            keys = list(self.keys)
+        else:
+            keys = list(self.of_type(*types))
+
+        forest = UnionFind(keys)
+        for u in keys:
+            for v in self.neighbors(u):
+                if v in forest:
+                    forest.union(u, v)
+
+        return sorted(forest.groups(), key=lambda c: (-len(c), min(c)))
+
+
+class Adjacency:
+    """The links between a set of keys, as compressed sparse rows of integers.
+
+    Each key is numbered by its position in `keys`. The targets of the links
+    made by node ``i`` are ``out_targets[out_offsets[i]:out_offsets[i + 1]]``,
+    and the sources of the links to it are found the same way in
+    ``in_sources``. Links to keys outside the set are dropped, as are
+    repeated links. Storing machine integers in arrays takes a fraction of
+    the memory of dictionaries of strings, and traversals touch only ints.
+
+    """
+
+    def __init__(self, keys: Collection[str], links: Mapping[str, Collection[str]]):
+        self.keys: List[str] = list(keys)
+        self.ids: Dict[str, int] = {k: i for i, k in enumerate(self.keys)}
+
+        # the rows of the outgoing links are filled in order, so need no sorting
+        ids = self.ids
+        self.out_offsets = array.array('i', [0])
+        self.out_targets = array.array('i')
+        for u in self.keys:
+            vs = links.get(u)
+            if vs:
+                targets = list(map(ids.get, dict.fromkeys(vs)))
+                if None in targets:
+                    # links to missing keys
+                    targets = [j for j in targets if j is not None]
+                self.out_targets.extend(cast(List[int], targets))
+            self.out_offsets.append(len(self.out_targets))
+
+        sources = array.array('i')
+        for i in range(len(self.keys)):
+            sources.extend([i] * self.out_degree(i))
+        self.in_offsets, self.in_sources = _compress(len(self.keys), self.out_targets, sources)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def successors(self, i: int) -> array.array:
+        return self.out_targets[self.out_offsets[i]:self.out_offsets[i + 1]]
+
+    def predecessors(self, i: int) -> array.array:
+        return self.in_sources[self.in_offsets[i]:self.in_offsets[i + 1]]
+
+    def out_degree(self, i: int) -> int:
+        return self.out_offsets[i + 1] - self.out_offsets[i]
+
+    def in_degree(self, i: int) -> int:
+        return self.in_offsets[i + 1] - self.in_offsets[i]
+
+    def bfs(
+            self,
+            start: int,
+            hops: Optional[int] = None,
+            directed: bool = False,
+            stop: Optional[int] = None
+            ) -> Dict[int, int]:
+        """Search breadth-first from start, returning the parent of each node reached.
+
+        The start is its own parent. The search goes at most `hops` links
+        deep, and ends early once `stop` is reached.
+
+        """
+        parents = {start: start}
+        frontier = [start]
+        depth = 0
+        while frontier and (hops is None or depth < hops):
+            next_frontier = []
+            for u in frontier:
+                neighbors: Iterable[int]
+                if directed:
+                    neighbors = self.successors(u)
+                else:
+                    neighbors = itertools.chain(self.successors(u), self.predecessors(u))
+                for v in neighbors:
+                    if v not in parents:
+                        parents[v] = u
+                        if v == stop:
+                            return parents
+                        next_frontier.append(v)
+            frontier = next_frontier
+            depth += 1
+        return parents
+
+
+def _compress(n: int, rows: array.array, columns: array.array) -> Tuple[array.array, array.array]:
+    """Sort (row, column) pairs by row into row offsets and columns, in O(n + m)."""
+    offsets = array.array('i', [0]) * (n + 1)
+    for r in rows:
+        offsets[r + 1] += 1
+    for i in range(n):
+        offsets[i + 1] += offsets[i]
+
+    placed = array.array('i', offsets[:n])
+    sorted_columns = array.array('i', [0]) * len(columns)
+    for r, c in zip(rows, columns):
+        sorted_columns[placed[r]] = c
+        placed[r] += 1
+    return offsets, sorted_columns
+
+
+class UnionFind:
+    """Disjoint sets of keys, with path halving and union by size."""
+
+    def __init__(self, keys: Collection[str]):
+        self._parent = {k: k for k in keys}
+        self._size = dict.fromkeys(keys, 1)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._parent
+
+    def find(self, key: str) -> str:
+        parent = self._parent
+        while parent[key] != key:
+            parent[key] = parent[parent[key]]
+            key = parent[key]
+        return key
+
+    def union(self, u: str, v: str):
+        u, v = self.find(u), self.find(v)
+        if u == v:
+            return
+        if self._size[u] < self._size[v]:
+            u, v = v, u
+        self._parent[v] = u
+        self._size[u] += self._size[v]
+
+    def groups(self) -> List[Set[str]]:
+        groups: Dict[str, Set[str]] = {}
+        for key in self._parent:
+            groups.setdefault(self.find(key), set()).add(key)
+        return list(groups.values())
@@ -0,0 +1,241 @@
+import hashlib
+import json
+import os
+import pathlib
+import time
+from typing import Callable, Dict, Iterator, Optional, Set, Tuple, Union
+
+from ._profile import COUNTERS
+from ._scan import extract_links, read_links, scan_links
+from ._tree import iter_nodes
+from .util import NOTE_TYPES
+
+
+CACHE_VERSION = 1
+
+# files modified this close to the time the cache was written may have
+# changed without changing their mtime on filesystems with coarse timestamps
+RACY_WINDOW_NS = 2_000_000_000
+
+
+def _read_bytes(path: str) -> bytes:
+    with open(path, 'rb') as fileobj:
+        data = fileobj.read()
+    COUNTERS.add('reads')
+    COUNTERS.add('bytes_read', len(data))
+    return data
+
+
+class LinkCache:
+    """Links extracted from each note, persisted between runs.
+
+    Every entry records the mtime, size and SHA-1 digest of the note it was
+    extracted from. A note whose stat is unchanged is not read at all; a note
+    whose stat changed is read and hashed, but only re-parsed if its digest
+    differs from the cached one.
+
+    """
+
+    def __init__(self, path: Union[str, pathlib.Path]):
+        self.path = pathlib.Path(path)
+        self.entries: Dict[str, list] = {}
+        self.written_ns = 0
+        self._seen: Set[str] = set()
+        self._dirty = False
+
+    def load(self):
+        """Read the cache file, silently starting over if it is unusable."""
+        try:
+            with self.path.open() as fileobj:
+                data = json.load(fileobj)
+            if data['version'] != CACHE_VERSION:
+                raise ValueError('Stale cache version.')
+            self.entries = data['entries']
+            self.written_ns = data['written_ns']
+        except (OSError, ValueError, KeyError, TypeError):
+            self.entries = {}
+            self.written_ns = 0
+            self._dirty = True
+
+    def get(self, key: str, stat: os.stat_result, read: Callable[[], bytes]) -> Tuple[str, ...]:
+        """Return the links of a note, reading it with `read` only if needed."""
+        self._seen.add(key)
+        entry = self.entries.get(key)
+
+        unchanged = False
+        if entry is not None and entry[0] == stat.st_mtime_ns and entry[1] == stat.st_size:
+            if stat.st_mtime_ns < self.written_ns - RACY_WINDOW_NS:
+                return tuple(entry[3])
+            unchanged = True
+
+        data = read()
+        digest = hashlib.sha1(data).hexdigest()
+        if entry is not None and entry[2] == digest:
+            links = tuple(entry[3])
+        else:
+            links = scan_links(data)
+
+        new_entry = [stat.st_mtime_ns, stat.st_size, digest, list(links)]
+        # an unchanged entry was only racy; saving the cache again moves
+        # its timestamp on, so that the entry is trusted from then on
+        if new_entry != entry or unchanged:
+            self.entries[key] = new_entry
+            self._dirty = True
+        return links
+
+    def save(self):
+        """Write the cache, dropping entries for notes that no longer exist."""
+        unseen = self.entries.keys() - self._seen
+        if not (self._dirty or unseen):
+            return
+
+        for key in unseen:
+            del self.entries[key]
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        data = {
+            'version': CACHE_VERSION,
+            'written_ns': time.time_ns(),
+            'entries': self.entries,
+        }
+        tmp_path = self.path.with_name(self.path.name + '.tmp')
+        with tmp_path.open('w') as fileobj:
+            json.dump(data, fileobj)
+        os.replace(tmp_path, self.path)
+        self._dirty = False
+
+
+class LinkIndex:
+    """The links made by every note in a network, and the links to every key.
+
+    The index is built lazily by reading every note exactly once. Afterwards,
+    the links of a note and the backlinks to any key are answered from memory.
+    Whenever synapse itself writes a note, the note's entry must be refreshed
+    with :meth:`update`.
+
+    If a :class:`LinkCache` is given, the links of unchanged notes are taken
+    from it instead of being read from disk. If `jobs` is greater than one,
+    notes are read by that many threads at once; the result does not depend
+    on the number of threads.
+
+    """
+
+    def __init__(self, network, cache: Optional[LinkCache] = None, jobs: Optional[int] = None):
+        self.network = network
+        self.cache = cache
+        self.jobs = jobs
+        self._links: Optional[Dict[str, Tuple[str, ...]]] = None
+        # key -> keys of the notes linking to it; dicts are used as ordered sets
+        self._backlinks: Dict[str, Dict[str, None]] = {}
+        # incremented whenever the index changes, so views can tell if stale
+        self.generation = 0
+
+    def _ensure_built(self) -> Dict[str, Tuple[str, ...]]:
+        if self._links is None:
+            self._links = {}
+            self._backlinks = {}
+            if self.cache is not None:
+                self.cache.load()
+
+            entries = [(key, entry) for _, key, entry in iter_nodes(self.network.root, NOTE_TYPES)]
+            if self.jobs is not None and self.jobs > 1:
+                # imported here as it is slow to import and rarely needed
+                import concurrent.futures
+
+                with concurrent.futures.ThreadPoolExecutor(self.jobs) as executor:
+                    # map yields in input order, keeping the index deterministic
+                    all_links = list(executor.map(self._read_links, entries))
+            else:
+                all_links = [self._read_links(key_and_entry) for key_and_entry in entries]
+
+            for (key, _), links in zip(entries, all_links):
+                self._set(key, links)
+
+            if self.cache is not None:
+                self.cache.save()
+        return self._links
+
+    def _read_links(self, key_and_entry: Tuple[str, os.DirEntry]) -> Tuple[str, ...]:
+        key, entry = key_and_entry
+        if self.cache is None:
+            return read_links(entry.path)
+        else:
+            # safe to call concurrently, as each call touches only its own key
+            COUNTERS.add('stats')
+            return self.cache.get(key, entry.stat(), lambda: _read_bytes(entry.path))
+
+    def _set(self, key: str, links: Tuple[str, ...]):
+        assert self._links is not None
+        self.generation += 1
+        self._discard(key)
+        self._links[key] = links
+        for target in links:
+            self._backlinks.setdefault(target, {})[key] = None
+
+    def _discard(self, key: str):
+        assert self._links is not None
+        for target in self._links.pop(key, ()):
+            sources = self._backlinks.get(target)
+            if sources is not None:
+                sources.pop(key, None)
+                if not sources:
+                    del self._backlinks[target]
+
+    def links(self, key: str) -> Tuple[str, ...]:
+        """The keys linked to by the note with the given key."""
+        links = self._ensure_built()
+        try:
+            return links[key]
+        except KeyError:
+            # the note was created after the index was built
+            return self.update(key)
+
+    def backlinks(self, key: str) -> Tuple[str, ...]:
+        """The keys of the notes which link to the given key."""
+        self._ensure_built()
+        return tuple(self._backlinks.get(key, ()))
+
+    def items(self) -> Iterator[Tuple[str, Tuple[str, ...]]]:
+        """Iterate over (key, links) pairs for every note."""
+        return iter(list(self._ensure_built().items()))
+
+    def update(self, key: str, contents: Optional[str] = None) -> Tuple[str, ...]:
+        """Re-read the links of a note, optionally from its new contents."""
+        self._ensure_built()
+        if contents is None:
+            contents = self.network[key].contents
+        links = extract_links(contents)
+        self._set(key, links)
+        return links
+
+    def touch(self, key: Optional[str] = None):
+        """Record a change to a node that does not affect any links."""
+        self.generation += 1
+
+    def remove(self, key: str):
+        """Forget the links of a note that has been deleted."""
+        self.generation += 1
+        if self._links is not None:
+            self._discard(key)
+
+    def rename(self, old_key: str, new_key: str):
+        """Move the entry for a node that has been re-keyed."""
+        self.rename_many({old_key: new_key})
+
+    def rename_many(self, mapping: Dict[str, str]):
+        """Move the entries for nodes re-keyed at the same time."""
+        self.generation += 1
+        if self._links is None:
+            return
+
+        moved = {old: self._links[old] for old in mapping if old in self._links}
+        for old_key in moved:
+            self._discard(old_key)
+        for old_key, links in moved.items():
+            self._set(mapping[old_key], links)
+
+    def clear(self):
+        """Forget everything; the index is rebuilt on next use."""
+        self.generation += 1
+        self._links = None
+        self._backlinks = {}
@@ -1,256 +1,677 @@
 import pathlib
 import collections
-import itertools
-import re
-from typing import Union, List, Callable
+import os
+import sys
+import time
+import functools
+from typing import (
+    TYPE_CHECKING, Union, List, Callable, Optional, Dict, Collection, FrozenSet, Set, Iterable,
+    TextIO, Tuple
+)
 
 from .exceptions import NetworkKeyError
-from .util import get_key_parts
+from ._index import LinkIndex, LinkCache
+from ._graph import Snapshot
+from ._profile import COUNTERS, CheckProfile, difference
+from ._report import Failure, ReportingList, line_of
+from ._scan import decode, replace_links, scan_links
+from ._search import SearchIndex, SqliteSearchIndex
+from ._tree import PathSet, classify, iter_nodes
+from .util import (
+    NOTE_TYPES, REKEY_SUFFIX, atomic_write, get_key_parts, get_key_type, get_relative_path,
+    stage_write
+)
 
+if TYPE_CHECKING:
+    # imported lazily at runtime; see Network.__init__
+    from ._sqlite import SqliteIndex
 
-NOTE_TYPES = {'topic', 'project', 'thought', 'journal'}
 
-Checker = Callable[["Network", List[str]], None]
+Checker = Callable[["Network", List[Failure]], None]
+SnapshotChecker = Callable[[Snapshot, List[Failure]], None]
 
 
 class Network:
 
     CHECKS: List[Checker] = []
 
-    def __init__(self, path: Union[str, pathlib.Path]):
+    CACHE_PATH = pathlib.Path('.synapse') / 'cache'
+
+    SQLITE_PATH = pathlib.Path('.synapse') / 'index.sqlite'
+    SEARCH_PATH = pathlib.Path('.synapse') / 'search.sqlite'
+
+    BACKENDS = ('memory', 'sqlite')
+
+    def __init__(
+            self,
+            path: Union[str, pathlib.Path],
+            cache: bool = False,
+            jobs: Optional[int] = None,
+            backend: str = 'memory'
+            ):
         self.root = pathlib.Path(path)
+        self._index: Union[LinkIndex, 'SqliteIndex']
+        if backend == 'memory':
+            link_cache = LinkCache(self.root / self.CACHE_PATH) if cache else None
+            self._index = LinkIndex(self, link_cache, jobs=jobs)
+        elif backend == 'sqlite':
+            # imported here so that sqlite3 is only loaded when it is used;
+            # the database persists between runs, so `cache` is not needed
+            from ._sqlite import SqliteIndex
+            self._index = SqliteIndex(self, self.root / self.SQLITE_PATH, jobs=jobs)
+        else:
+            raise ValueError(f'Unknown backend "{backend}".')
+        self._paths = PathSet(self.root)
+        self._search: Union[SearchIndex, SqliteSearchIndex]
+        if cache or backend == 'sqlite':
+            # persisted like the link index, so that a search in a new
+            # process only reads the notes changed since the last one
+            self._search = SqliteSearchIndex(self, self.root / self.SEARCH_PATH)
+        else:
+            self._search = SearchIndex(self)
+        self._snapshot: Optional[Snapshot] = None
+        # the keys the checks currently running report on; None for all
+        self._scope: Optional[FrozenSet[str]] = None
 
     def __iter__(self):
-        chain = itertools.chain(
-            self.topics, self.thoughts, self.journal, self.projects,
-            self.images, self.files, self.raw
-            )
-        return (x.key for x in chain)
+        return (key for _, key, _ in iter_nodes(self.root))
 
     def __contains__(self, key):
-        return Node(self, key).path.exists()
+        COUNTERS.add('resolutions')
+        return get_relative_path(key) in self._paths
 
     def __getitem__(self, key):
+        if key not in self:
+            raise NetworkKeyError(key)
+
         parts = key.split(':')
         if len(parts) == 1 or parts[0] in NOTE_TYPES:
-            node = NoteNode(self, key)
+            return NoteNode(self, key)
         else:
-            node = Node(self, key)
-
-        if not node.path.exists():
-            raise NetworkKeyError(node.key)
-
-        return node
+            return Node(self, key)
 
     @property
     def notes(self):
-        yield from itertools.chain(
-            self.topics, self.thoughts, self.journal, self.projects
-            )
+        yield from self._iter_nodes(*NOTE_TYPES)
 
     @property
     def topics(self):
-        yield from self._iter_notes()
+        yield from self._iter_nodes('topic')
 
     @property
     def thoughts(self):
-        yield from self._iter_notes('thought')
+        yield from self._iter_nodes('thought')
 
     @property
     def journal(self):
-        yield from self._iter_notes('journal')
+        yield from self._iter_nodes('journal')
 
     @property
     def projects(self):
-        yield from self._iter_notes('project')
+        yield from self._iter_nodes('project')
 
     @property
     def images(self):
-        yield from self._iter_files('image')
+        yield from self._iter_nodes('image')
 
     @property
     def files(self):
-        yield from self._iter_files('file')
+        yield from self._iter_nodes('file')
 
     @property
     def raw(self):
-        yield from self._iter_files('raw')
+        yield from self._iter_nodes('raw')
+
+    def _iter_nodes(self, *types):
+        """Yield the nodes of the given types, found in a single traversal."""
+        for type_, key, _ in iter_nodes(self.root, types):
+            if type_ in NOTE_TYPES:
+                yield NoteNode(self, key)
+            else:
+                yield Node(self, key)
+
+    def backlinks(self, key: str) -> List[str]:
+        """The keys of the notes which link to the given key."""
+        return list(self._index.backlinks(key))
+
+    def rekey_many(self, mapping: Dict[str, str]):
+        """Rename many nodes at once, updating every link to them.
+
+        The notes linking to the renamed nodes are found with the backlink
+        index, and each is rewritten once with all substitutions applied. The
+        rewritten notes are first staged in temporary files; only when every
+        one has been staged are they moved into place with atomic renames,
+        so an error while preparing the edits leaves the network untouched.
+
+        Renames may be chained or cyclic, as in ``{'a': 'b', 'b': 'a'}``.
+
+        """
+        nodes = {old_key: self[old_key] for old_key in mapping}
+        new_paths = {
+            old_key: node._rekeyed_path(mapping[old_key]) for old_key, node in nodes.items()
+        }
+
+        vacated = {node.path for node in nodes.values()}
+        if len(set(new_paths.values())) != len(new_paths):
+            raise ValueError("Cannot rekey two nodes to the same key.")
+        for old_key, new_path in new_paths.items():
+            if _relative(self.root, new_path) in self._paths and new_path not in vacated:
+                raise ValueError(f'Cannot rekey "{old_key}": "{mapping[old_key]}" exists.')
+
+        referrers = {}
+        for old_key in mapping:
+            referrers.update(dict.fromkeys(self._index.backlinks(old_key)))
+
+        staged = []
+        try:
+            for key in referrers:
+                note = self[key]
+                contents = note.contents
+                new_contents = replace_links(contents, mapping)
+                if new_contents != contents:
+                    staged.append((note, new_contents, stage_write(note.path, new_contents)))
+        except BaseException:
+            for _, _, tmp_path in staged:
+                tmp_path.unlink()
+            raise
+
+        for note, new_contents, tmp_path in staged:
+            os.replace(tmp_path, os.path.realpath(note.path))
+            self._index.update(note.key, new_contents)
+            self._search.update(note.key, new_contents)
+
+        # move through temporary names, so that chained renames do not collide
+        moves = []
+        for old_key, node in nodes.items():
+            new_path = new_paths[old_key]
+            _ensure_directory_exists(new_path)
+            tmp_path = new_path.with_name(f'.{new_path.name}{REKEY_SUFFIX}')
+            node.path.rename(tmp_path)
+            moves.append((old_key, node.path, tmp_path, new_path))
+
+        for _, _, tmp_path, new_path in moves:
+            tmp_path.rename(new_path)
+
+        self._paths.move_many([
+            (_relative(self.root, old_path), _relative(self.root, new_path))
+            for _, old_path, _, new_path in moves
+        ])
+        self._index.rename_many(mapping)
+        self._search.rename_many(mapping)
+
+    def components(self, types: Optional[Collection[str]] = None) -> List[Set[str]]:
+        """The keys in each connected component of the subgraph of the given types.
+
+        For example, ``network.components(['topic'])`` gives the groups of
+        topics that are linked to one another. Links are treated as
+        undirected. Components are returned largest first.
+
+        """
+        return self.snapshot().components(types)
+
+    def neighborhood(
+            self,
+            key: str,
+            hops: int = 1,
+            types: Optional[Collection[str]] = None
+            ) -> Set[str]:
+        """The keys within `hops` links of a node, in either direction.
+
+        The node's own key is included. If `types` is given, only keys of
+        those types are returned, though they may be reached through nodes
+        of any type.
+
+        """
+        if key not in self:
+            raise NetworkKeyError(key)
+        return self.snapshot().neighborhood(key, hops, types)
+
+    def shortest_path(self, u: str, v: str, directed: bool = False) -> Optional[List[str]]:
+        """The keys on a shortest path between two nodes, or None if there is none.
+
+        Links are followed in both directions unless `directed` is true.
+
+        """
+        for key in (u, v):
+            if key not in self:
+                raise NetworkKeyError(key)
+        return self.snapshot().shortest_path(u, v, directed)
+
+    def subgraph(self, keys: Collection[str]) -> Dict[str, List[str]]:
+        """The subgraph induced by the given keys.
+
+        Returns a dictionary mapping each key to the keys in the subgraph
+        that it links to.
+
+        """
+        for key in keys:
+            if key not in self:
+                raise NetworkKeyError(key)
+        return self.snapshot().subgraph(keys)
+
+    def orphans(self, types: Optional[Collection[str]] = None) -> List[str]:
+        """The keys of nodes, optionally of the given types, with no links at all."""
+        return self.snapshot().orphans(types)
+
+    def sinks(self, types: Optional[Collection[str]] = None) -> List[str]:
+        """The keys of nodes, optionally of the given types, linked to but not linking out."""
+        return self.snapshot().sinks(types)
+
+    def rank(
+            self,
+            method: str = 'pagerank',
+            types: Optional[Collection[str]] = None,
+            limit: Optional[int] = None,
+            samples: Optional[int] = None
+            ) -> List[Tuple[str, float]]:
+        """Score the importance of nodes, returning (key, score) pairs, best first.
+
+        The method is one of ``pagerank``, ``degree`` and ``betweenness``; see
+        :func:`_rank.scores`. If `types` is given, the scores are computed on
+        the subgraph of nodes of those types, so that, for example, topics
+        are ranked by their links to other topics. NumPy and SciPy are used
+        if installed. Betweenness is estimated from `samples` source nodes,
+        by default ``_rank.BETWEENNESS_SAMPLES``.
+
+        """
+        # imported here, as ranking is rare and the module is slow to import
+        from . import _rank
+
+        if samples is None:
+            samples = _rank.BETWEENNESS_SAMPLES
+        adjacency = self.snapshot().adjacency_of(types)
+        values = _rank.scores(adjacency, method, samples=samples)
+        return _rank.top(adjacency.keys, values, limit)
+
+    def export(self, out: TextIO, format: str = 'jsonl'):
+        """Write every node and link to out in the given format.
+
+        The formats are ``jsonl``, ``graphml``, ``dot`` and ``csv``. Records
+        are written as the network is read, without going through the link
+        index, so memory use does not grow with the size of the network.
+
+        """
+        # imported here, as xml.sax pulls in much of the standard library
+        from . import _export
+
+        _export.export(self.root, out, format)
+
+    def snapshot(self) -> Snapshot:
+        """An immutable view of the network, reused until the network changes."""
+        if self._snapshot is None or self._snapshot.generation != self._index.generation:
+            self._snapshot = Snapshot(self)
+        return self._snapshot
+
+    def reload(self, relpaths: Iterable[str]) -> Set[str]:
+        """Pick up changes made on disk to the given paths, relative to the root.
+
+        Only the given paths, and anything beneath them if they are
+        directories, are examined; changed notes are re-read. Returns the
+        keys of the nodes that were created, modified or deleted.
+
+        """
+        changed = set()
+        for relpath in relpaths:
+            for file_relpath, exists in self._paths.reload(relpath).items():
+                node = classify(file_relpath)
+                if node is None:
+                    continue
+                type_, key = node
+                if type_ in NOTE_TYPES:
+                    if exists:
+                        self._index.update(key)
+                        self._search.update(key)
+                    else:
+                        self._index.remove(key)
+                        self._search.remove(key)
+                else:
+                    self._index.touch(key)
+                changed.add(key)
+        return changed
+
+    def refresh(self):
+        """Discard the link index and known paths so outside edits are picked up."""
+        self._index.clear()
+        self._paths.clear()
+        self._search.clear()
+
+    def search(
+            self,
+            query: str,
+            types: Optional[Collection[str]] = None,
+            near: Optional[str] = None,
+            hops: int = 1,
+            limit: Optional[int] = 10
+            ) -> List[Tuple[str, float]]:
+        """Find the notes best matching a query, as (key, score) pairs.
+
+        Notes are ranked with BM25 by the words of the query they contain.
+        Results can be restricted to notes of the given `types`, and to notes
+        within `hops` links of the note `near`, in either direction. At most
+        `limit` results are returned, best first; None means no limit.
+
+        """
+        keys = None
+        if near is not None:
+            keys = self.neighborhood(near, hops)
+        return self._search.search(query, types=types, keys=keys, limit=limit)
+
+    def fix_bidirectional_links(self, dry_run: bool = False) -> Dict[str, List[str]]:
+        """Add the missing links back between notes.
+
+        The missing links are found in a single snapshot of the network and
+        grouped by the note they must be added to, so that each note is
+        written at most once. Returns a dictionary mapping the key of every
+        note to be edited to the keys it should link to; if `dry_run` is
+        true, nothing is written.
+
+        """
+        graph = self.snapshot()
+        missing: Dict[str, Dict[str, None]] = {}
+        for u in graph.notes:
+            for v in graph.neighbors(u):
+                if graph.type(v) in NOTE_TYPES and not graph.links_to(v, u):
+                    missing.setdefault(v, {})[u] = None
+
+        plan = {v: list(us) for v, us in missing.items()}
+        if not dry_run:
+            for v, us in plan.items():
+                self[v]._add_links(us)
+        return plan
+
+    def affected_since(self, rev: str) -> Set[str]:
+        """The keys of the nodes whose checks may have changed since a git revision.
+
+        These are the nodes whose files changed since `rev`, including
+        uncommitted and untracked files, together with every node they link
+        to or are linked from, both now and, for notes, as of `rev`. Only changed
+        notes are read at `rev`; the current links come from the index.
+        Raises :class:`GitError` if the network is not in a git repository
+        or the revision does not exist.
+
+        """
+        # imported here, as subprocess is only needed for this
+        from . import _git
+
+        graph = self.snapshot()
+        affected = set()
+        for relpath in _git.changed_paths(self.root, rev):
+            node = classify(relpath)
+            if node is None:
+                continue
+            type_, key = node
+            affected.add(key)
+            affected.update(graph.links(key))
+            affected.update(graph.predecessors(key))
+            if type_ in NOTE_TYPES:
+                # links since removed matter too, e.g. an image no longer linked
+                old_contents = _git.contents_at(self.root, rev, relpath)
+                if old_contents is not None:
+                    affected.update(scan_links(old_contents))
+        return affected
+
+    def check(
+            self,
+            profile: bool = False,
+            report: Optional[Callable[[Failure], None]] = None,
+            scope: Optional[Collection[str]] = None
+            ):
+        """Run every check, returning a list of :class:`Failure` records.
+
+        If `report` is given, it is called with each failure as soon as it is
+        found, so that failures can be written out before every check has
+        run. If `profile` is true, a :class:`CheckProfile` recording the time
+        taken by each checker and the I/O performed is returned alongside the
+        failures.
+
+        If `scope` is given, checks adapted with :func:`on_snapshot` only
+        report failures concerning the given keys, such as those returned by
+        :meth:`affected_since`: the failures at their paths, and those
+        about topic components containing them. Other checkers run as usual.
+
+        """
+        counts_before = COUNTERS.copy()
+        start = time.perf_counter()
+
+        failures = [] if report is None else ReportingList(report)
+        # take the snapshot up front so that every checker shares it
+        self.snapshot()
+        snapshot_time = time.perf_counter() - start
+
+        timings: Dict[str, float] = {}
+        self._scope = None if scope is None else frozenset(scope)
+        try:
+            for position, checker in enumerate(Network.CHECKS):
+                checker_start = time.perf_counter()
+                try:
+                    checker(self, failures)
+                except FatalFailure:
+                    break
+                finally:
+                    if profile:
+                        name = _checker_name(checker)
+                        if name in timings:
+                            name = f'{name}#{position}'
+                        timings[name] = time.perf_counter() - checker_start
+        finally:
+            self._scope = None
+
+        if not profile:
+            return failures
+
+        check_profile = CheckProfile(
+            total=time.perf_counter() - start,
+            snapshot=snapshot_time,
+            checks=timings,
+            counts=difference(COUNTERS.copy(), counts_before),
+        )
+        return failures, check_profile
+
+
+def _checker_name(checker: Checker) -> str:
+    return getattr(checker, '__name__', repr(checker))
 
-    def _iter_notes(self, subdir=None):
-        """Yield the keys of notes in the optional subdir"""
-        to_key = lambda p: str(p.with_suffix('')).replace('/', ':')
-        yield from self._iter_files(subdir, NodeClass=NoteNode, to_key=to_key)
 
-    def _iter_files(self, subdir, NodeClass=None, to_key=None):
-        """Yield the keys of files in the subdir."""
-        if to_key is None:
-            to_key = lambda p: str(p).replace('/', ':')
+class FatalFailure(Exception):
+    """A failed check that may prevent other checks from running."""
 
-        if NodeClass is None:
-            NodeClass = Node
 
-        if subdir is not None:
-            root_of_search = self.root / subdir
-        else:
-            root_of_search = self.root
+def on_snapshot(checker: SnapshotChecker) -> Checker:
+    """Adapt a checker of a :class:`Snapshot` to the :data:`Checker` signature.
 
-        if root_of_search.is_dir():
-            for subpath in root_of_search.iterdir():
-                if subpath.is_file():
-                    key = to_key(subpath.relative_to(self.root))
-                    yield NodeClass(self, key)
+    The wrapped checker is handed the network's current snapshot, which is
+    shared by all checks in a single call to :meth:`Network.check`. If the
+    check is scoped, the snapshot is restricted to the scope; see
+    :meth:`Snapshot.restricted`.
 
-    def fix_bidirectional_links(self):
-        for u in self.notes:
-            note_neighbors = (v for v in u.neighbors if isinstance(v, NoteNode))
-            for v in note_neighbors:
-                if u not in v.neighbors:
-                    v.add_link(u)
+    """
+    @functools.wraps(checker)
+    def adapted(network, failures):
+        graph = network.snapshot()
+        if network._scope is not None:
+            graph = graph.restricted(network._scope)
+        return checker(graph, failures)
 
-    def check(self):
-        failures = []
-        for checker in Network.CHECKS:
-            try:
-                checker(self, failures)
-            except FatalFailure:
-                break
+    return adapted
 
-        return failures
 
+def depends_on(*types: str) -> Callable[[Checker], Checker]:
+    """Declare the types of node whose changes can affect a checker's result.
 
-class FatalFailure(Exception):
-    """A failed check that may prevent other checks from running."""
+    A change to a node means that it was created or deleted, or that its
+    links changed. Checkers without a declaration are assumed to depend on
+    every type.
 
+    """
+    def decorator(checker):
+        checker.depends_on = frozenset(types)
+        return checker
 
-def _conventional_error_message(source_file, message):
-    return f"{source_file} -- {message}"
+    return decorator
 
 
 @Network.CHECKS.append
-def _all_links_are_existing(network, failures):
-    for note in network.notes:
-        for key in note.links:
-            if key not in network:
-                msg = _conventional_error_message(note.path, f'Link to nonexistant "{key}"')
-                failures.append(msg)
+@on_snapshot
+def _all_links_are_existing(graph, failures):
+    for note in graph.checked(*NOTE_TYPES):
+        for key in graph.links(note):
+            if key not in graph:
+                path = graph.path(note)
+                failures.append(Failure(
+                    'SYN001', f'Link to nonexistant "{key}"', path=path,
+                    line=line_of(path, f'[[{key}]]'), key=key
+                ))
 
     if failures:
         raise FatalFailure('Some links did not exist.')
 
 
 @Network.CHECKS.append
-def _links_between_notes_are_bidirectional(network, failures):
-    for u in network.notes:
-        note_neighbors = [n for n in u.neighbors if n.type in NOTE_TYPES]
-        for v in note_neighbors:
-            if u not in v.neighbors:
-                msg = f'There is a link from "{u.key}" to here, but not back.'
-                msg = _conventional_error_message(v.path, msg)
-                failures.append(msg)
+@depends_on(*NOTE_TYPES)
+@on_snapshot
+def _links_between_notes_are_bidirectional(graph, failures):
+    # found from the note missing the link back, so that a scoped check only
+    # looks at the notes linking to those in scope
+    for v in graph.checked(*NOTE_TYPES):
+        for u in graph.predecessors(v):
+            if not graph.links_to(v, u):
+                msg = f'There is a link from "{u}" to here, but not back.'
+                failures.append(Failure('SYN002', msg, path=graph.path(v), key=u))
 
 
 @Network.CHECKS.append
-def _projects_link_to_topics(network, failures):
-    for project in network.projects:
-        linked_topics = [p for p in project.neighbors if p.type == 'topic']
+@depends_on('project', 'topic')
+@on_snapshot
+def _projects_link_to_topics(graph, failures):
+    for project in graph.checked('project'):
+        linked_topics = [p for p in graph.neighbors(project) if graph.type(p) == 'topic']
 
         if not linked_topics:
-            failures.append(_conventional_error_message(project.path, f'No topics linked.'))
+            failures.append(Failure('SYN003', 'No topics linked.', path=graph.path(project)))
 
 
 @Network.CHECKS.append
-def _thoughts_link_to_topics_or_projects(network, failures):
-    for thought in network.thoughts:
-        linked = [p for p in thought.neighbors if (p.type == 'topic') or (p.type == 'project')]
+@depends_on('thought', 'topic', 'project')
+@on_snapshot
+def _thoughts_link_to_topics_or_projects(graph, failures):
+    for thought in graph.checked('thought'):
+        linked = [p for p in graph.neighbors(thought) if graph.type(p) in {'topic', 'project'}]
 
         if not linked:
-            failures.append(_conventional_error_message(thought.path, f'No topics or projects linked'))
+            failures.append(Failure('SYN004', 'No topics or projects linked', path=graph.path(thought)))
 
 
 @Network.CHECKS.append
-def _non_notes_must_have_predecessor(network, failures):
-    chain = itertools.chain(network.images, network.files, network.raw)
-    for node in chain:
-        if not list(node.predecessors):
-            msg = f'"{node.key}" has no predecessor.'
-            failures.append(msg)
+@on_snapshot
+def _non_notes_must_have_predecessor(graph, failures):
+    for key in graph.checked('image', 'file', 'raw'):
+        if not graph.predecessors(key):
+            msg = f'"{key}" has no predecessor.'
+            failures.append(Failure('SYN005', msg, path=graph.path(key), key=key))
 
 
 @Network.CHECKS.append
-def _topics_must_be_connected(network, failures):
-    root = next(network.topics)
-    visited = set()
-    all_topics = set(n.key for n in network.topics)
+@depends_on('topic')
+@on_snapshot
+def _topics_must_be_connected(graph, failures):
+    # the components are of the whole network, as which is the main one
+    # depends on every topic, but only those in scope are reported
+    if graph.scope is not None and next(graph.checked('topic'), None) is None:
+        return
+
+    components = graph.components(['topic'])
+    if len(components) <= 1:
+        return
+
+    main = components[0]
+    for component in components[1:]:
+        if graph.scope is not None and graph.scope.isdisjoint(component):
+            continue
+        key = min(component)
+        msg = (
+            f'Not connected to the main component of {len(main)} topics; '
+            f'this component has {len(component)}: {", ".join(sorted(component))}'
+        )
+        failures.append(Failure('SYN006', msg, path=graph.path(key)))
 
-    def only_topics(node):
-        return (u for u in node.neighbors if u.type == 'topic')
 
-    bfs(root, neighbors=only_topics, callback=lambda node: visited.add(node.key))
+class Node:
+    """A node in the network, identified and hashed by its key.
 
-    if len(visited) != len(all_topics):
-        unvisited = all_topics - visited
-        for key in unvisited:
-            node = Node(network, key)
-            failures.append(_conventional_error_message(node.path, f'Not connected to "{root.key}"'))
+    Nodes hash by key, so they can be kept in sets and used as dictionary
+    keys; a node should not be re-keyed while it is stored in one.
 
+    """
 
-class Node:
+    __slots__ = ('network', '_key', '_type', '_path')
 
     def __init__(self, network: Network, key: str):
         self.network = network
         self.key = key
 
+    @property
+    def key(self):
+        return self._key
+
+    @key.setter
+    def key(self, key: str):
+        self._key = sys.intern(key)
+        self._type = None
+        self._path = None
+
     def __eq__(self, other):
-        return self.key == other.key
+        if not isinstance(other, Node):
+            return NotImplemented
+        return self._key == other._key
+
+    def __hash__(self):
+        return hash(self._key)
+
+    def __repr__(self):
+        return f'{type(self).__name__}({self._key!r})'
 
     @property
     def type(self):
-        parts = self.key.split(':')
-        if len(parts) > 1:
-            return parts[0]
-        else:
-            return 'topic'
+        if self._type is None:
+            self._type = sys.intern(get_key_type(self._key))
+        return self._type
 
     @property
     def path(self):
-        path = self.network.root / self.key.replace(':', '/')
-        if path.suffix == '' and (self.type in NOTE_TYPES):
-            path = path.with_suffix('.md')
-        return path
+        if self._path is None:
+            self._path = self.network.root / get_relative_path(self._key)
+        return self._path
 
     @property
     def contents(self):
         try:
             with self.path.open("rb") as fileobj:
-                try:
-                    return fileobj.read().decode()
-                except UnicodeDecodeError:
-                    return fileobj.read().decode("latin1")
+                data = fileobj.read()
         except Exception as exc:
             raise RuntimeError(f'Could not read "{self.key}".') from exc
+        COUNTERS.add('reads')
+        COUNTERS.add('bytes_read', len(data))
+        return decode(data)
 
     @property
     def predecessors(self):
-        for note in self.network.notes:
-            if self in note.successors:
-                yield note
+        for key in self.network._index.backlinks(self.key):
+            yield self.network[key]
 
     def rekey(self, new_key):
+        """Rename the node and update links in other files."""
+        self.network.rekey_many({self.key: new_key})
+        self.key = new_key
+
+    def _rekeyed_path(self, new_key: str) -> pathlib.Path:
+        """The path of this node if it had the new key."""
         key_parts = get_key_parts(new_key)
 
         if key_parts.type != self.type:
             raise ValueError("Cannot change type with rekey.")
 
         dir = self.network.root / key_parts.type
-
-        for predecessor in self.predecessors:
-            predecessor._update_link(self.key, new_key)
-
-        new_path = (dir / key_parts.name).with_suffix(self.path.suffix)
-        _ensure_directory_exists(new_path)
-        self.path.rename(new_path)
-
-        self.key = new_key
+        return (dir / key_parts.name).with_suffix(self.path.suffix)
 
 
 def _insert_into_section(lines: List[str], section_name: str, link_text: str):
@@ -263,6 +684,10 @@ def _insert_into_section(lines: List[str], section_name: str, link_text: str):
         lines.append(header)
     lines.insert(ix, link_text)
 
+def _relative(root, path):
+    return path.relative_to(root).as_posix()
+
+
 def _ensure_directory_exists(path):
     if not path.is_dir():
         path = path.parent
@@ -270,10 +695,11 @@ def _ensure_directory_exists(path):
 
 class NoteNode(Node):
 
+    __slots__ = ()
+
     @property
     def links(self):
-        matches = re.findall(r'\[\[.*?\]\]', self.contents)
-        return (x.strip('[]') for x in matches)
+        return self.network._index.links(self.key)
 
     @property
     def successors(self):
@@ -289,19 +715,22 @@ class NoteNode(Node):
         else:
             other_node = node_or_key
 
-        lines = self.contents.split('\n')
-        section_name = other_node.type.capitalize() + 's'
-        link_text = f'- [[{other_node.key}]]'
-        _insert_into_section(lines, section_name, link_text)
-
-        with self.path.open('w') as fileobj:
-            fileobj.write('\n'.join(lines))
+        self._add_links([other_node.key])
 
         if (other_node.type in NOTE_TYPES) and (self not in other_node.neighbors):
             other_node.add_link(self)
 
-    def rekey(self, new_key: str):
-        """Rename the note and update links in other files."""
+    def _add_links(self, keys: List[str]):
+        """Link to all of the keys, each in its section, in a single write."""
+        lines = self.contents.split('\n')
+        # each link goes to the top of its section, so insert the last first
+        for key in reversed(keys):
+            section_name = get_key_type(key).capitalize() + 's'
+            _insert_into_section(lines, section_name, f'- [[{key}]]')
+        self._write('\n'.join(lines))
+
+    def _rekeyed_path(self, new_key: str) -> pathlib.Path:
+        """The path of this note if it had the new key."""
         key_parts = get_key_parts(new_key)
         if key_parts.type == 'topic':
             dir = self.network.root
@@ -311,31 +740,27 @@ class NoteNode(Node):
         if key_parts.type not in NOTE_TYPES:
             raise ValueError("Cannot re-key a note to be a non-note.")
 
-        for predecessor in self.predecessors:
-            predecessor._update_link(self.key, new_key)
-
-        new_path = (dir / key_parts.name).with_suffix('.md')
-        self.path.rename(new_path)
-
-        self.key = new_key
+        return (dir / key_parts.name).with_suffix('.md')
 
-    def _update_link(self, old_key, new_key):
-        new_contents = self.contents.replace(f'[[{old_key}]]', f'[[{new_key}]]')
-        with self.path.open('w') as fileobj:
-            fileobj.write(new_contents)
+    def _write(self, contents: str):
+        """Atomically overwrite the note and keep the link index up to date."""
+        atomic_write(self.path, contents)
+        self.network._index.update(self.key, contents)
+        self.network._search.update(self.key, contents)
 
 def bfs(root: NoteNode, neighbors=None, callback=None):
+    """Visit every node reachable from root in breadth-first order."""
     if neighbors is None:
         neighbors = lambda node: node.neighbors
 
     if callback is None:
         callback = lambda node: None
 
-    visited = set()
+    visited = {root.key}
     queue = collections.deque([root])
 
     while queue:
-        u = queue.pop()
+        u = queue.popleft()
         callback(u)
 
         for neighbor in neighbors(u):
@@ -0,0 +1,61 @@
+import collections
+import dataclasses
+import threading
+from typing import Dict
+
+
+class Counters:
+    """Process-wide counts of the work done by synapse.
+
+    The names in use are ``reads`` and ``bytes_read`` for files read,
+    ``stats`` for stat calls, ``listings`` for directories listed, and
+    ``resolutions`` for keys looked up in a network. Counting is cheap and
+    always on; take a :meth:`copy` before and after an operation to find
+    what it did.
+
+    """
+
+    def __init__(self):
+        self._counts = collections.Counter()
+        self._lock = threading.Lock()
+
+    def add(self, name: str, n: int = 1):
+        with self._lock:
+            self._counts[name] += n
+
+    def copy(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counts)
+
+
+COUNTERS = Counters()
+
+
+def difference(after: Dict[str, int], before: Dict[str, int]) -> Dict[str, int]:
+    """The counts accumulated between two copies of the counters."""
+    names = ['reads', 'bytes_read', 'stats', 'listings', 'resolutions']
+    return {name: after.get(name, 0) - before.get(name, 0) for name in names}
+
+
+@dataclasses.dataclass
+class CheckProfile:
+    """Where the time went in a call to :meth:`Network.check`.
+
+    `snapshot` is the time taken to load the network, which is dominated by
+    I/O; `checks` maps the name of every checker that ran to its wall time.
+
+    """
+
+    total: float
+    snapshot: float
+    checks: Dict[str, float]
+    counts: Dict[str, int]
+
+    def format(self) -> str:
+        lines = [f'{"snapshot":40} {self.snapshot:10.4f} s']
+        for name, seconds in self.checks.items():
+            lines.append(f'{name:40} {seconds:10.4f} s')
+        lines.append(f'{"total":40} {self.total:10.4f} s')
+        for name, count in self.counts.items():
+            lines.append(f'{name:40} {count:10}')
+        return '\n'.join(lines)
@@ -0,0 +1,192 @@
+import dataclasses
+import json
+import os
+import pathlib
+from typing import Callable, Dict, Iterable, Optional, TextIO, Tuple, Union
+
+
+# code -> (check id, description); codes are stable between releases
+RULES: Dict[str, Tuple[str, str]] = {
+    'SYN001': ('missing-link', 'Links must point to existing nodes.'),
+    'SYN002': ('unidirectional-link', 'Links between notes must go both ways.'),
+    'SYN003': ('project-without-topic', 'Projects must link to a topic.'),
+    'SYN004': ('thought-without-topic', 'Thoughts must link to a topic or project.'),
+    'SYN005': ('asset-without-predecessor', 'Images, files and raw files must be linked to.'),
+    'SYN006': ('disconnected-topics', 'All topics must be connected.'),
+}
+
+# the code of failures reported as plain strings by third-party checkers
+CUSTOM_CODE = 'custom'
+
+
+@dataclasses.dataclass(frozen=True)
+class Failure:
+    """A failed check, as a record.
+
+    `code` is a stable identifier such as ``SYN001`` and `check` a readable
+    name for it; see :data:`RULES`. `path` is the file the failure is
+    reported against, `line` the 1-based line of the offending link, if
+    there is one, and `key` the key of the other node involved, if any.
+
+    Converted to a string, a failure reads ``path -- message``, or just
+    the message if there is no path.
+
+    """
+
+    code: str
+    message: str
+    path: Optional[pathlib.Path] = None
+    line: Optional[int] = None
+    key: Optional[str] = None
+    severity: str = 'error'
+
+    @property
+    def check(self) -> str:
+        return RULES.get(self.code, (self.code,))[0]
+
+    def __str__(self):
+        if self.path is None:
+            return self.message
+        return f'{self.path} -- {self.message}'
+
+    def to_dict(self, root: Union[str, os.PathLike, None] = None) -> dict:
+        """The failure as JSON-compatible data, with its path relative to root."""
+        path = None
+        if self.path is not None:
+            relpath = self.path if root is None else os.path.relpath(self.path, root)
+            path = pathlib.Path(relpath).as_posix()
+        return {
+            'code': self.code,
+            'check': self.check,
+            'severity': self.severity,
+            'path': path,
+            'line': self.line,
+            'key': self.key,
+            'message': self.message,
+        }
+
+
+def as_failure(failure: Union[Failure, str]) -> Failure:
+    """A failure record, from either a record or a plain string."""
+    if isinstance(failure, Failure):
+        return failure
+    return Failure(CUSTOM_CODE, str(failure))
+
+
+class ReportingList(list):
+    """A list of failures that reports each one as it is appended."""
+
+    def __init__(self, report: Callable[[Failure], None]):
+        super().__init__()
+        self.report = report
+
+    def append(self, failure):
+        super().append(failure)
+        self.report(failure)
+
+    def extend(self, failures):
+        for failure in failures:
+            self.append(failure)
+
+    def __iadd__(self, failures: Iterable) -> 'ReportingList':  # type: ignore[misc]
+        self.extend(failures)
+        return self
+
+    def insert(self, index, failure):
+        super().insert(index, failure)
+        self.report(failure)
+
+
+def line_of(path: Union[str, os.PathLike], text: str) -> Optional[int]:
+    """The 1-based number of the first line of a file containing text, if any."""
+    try:
+        with open(path, 'rb') as fileobj:
+            for number, line in enumerate(fileobj, 1):
+                if text.encode() in line:
+                    return number
+    except OSError:
+        pass
+    return None
+
+
+class TextWriter:
+    """Writes each failure on a line of its own, as text."""
+
+    def __init__(self, out: TextIO, root=None):
+        self.out = out
+
+    def write(self, failure: Union[Failure, str]):
+        self.out.write(f'{failure}\n')
+
+    def close(self):
+        pass
+
+
+class JsonWriter:
+    """Writes each failure as a JSON object on a line of its own."""
+
+    def __init__(self, out: TextIO, root=None):
+        self.out = out
+        self.root = root
+
+    def write(self, failure: Union[Failure, str]):
+        self.out.write(json.dumps(as_failure(failure).to_dict(self.root)) + '\n')
+
+    def close(self):
+        pass
+
+
+class SarifWriter:
+    """Writes a SARIF 2.1.0 log, streaming each result as it is written.
+
+    The rules and other metadata come first, so that the results can follow
+    one at a time; the log is only valid JSON once :meth:`close` is called.
+
+    """
+
+    VERSION = '2.1.0'
+    SCHEMA = 'https://json.schemastore.org/sarif-2.1.0.json'
+
+    def __init__(self, out: TextIO, root=None):
+        self.out = out
+        self.root = root
+        self._count = 0
+        rules = [
+            {'id': code, 'name': check, 'shortDescription': {'text': description}}
+            for code, (check, description) in RULES.items()
+        ]
+        header = json.dumps({
+            'version': self.VERSION,
+            '$schema': self.SCHEMA,
+            'runs': [{'tool': {'driver': {'name': 'synapse', 'rules': rules}}, 'results': []}],
+        })
+        # split off the closing brackets, to be written after the results
+        self._footer = ']}]}'
+        assert header.endswith('[' + self._footer)
+        self.out.write(header[:-len(self._footer)] + '\n')
+
+    def write(self, failure: Union[Failure, str]):
+        record = as_failure(failure).to_dict(self.root)
+        result = {
+            'ruleId': record['code'],
+            'level': 'warning' if record['severity'] == 'warning' else 'error',
+            'message': {'text': record['message']},
+        }
+        if record['path'] is not None:
+            location = {'artifactLocation': {'uri': record['path']}}
+            if record['line'] is not None:
+                location['region'] = {'startLine': record['line']}
+            result['locations'] = [{'physicalLocation': location}]
+        separator = ',\n' if self._count else ''
+        self.out.write(separator + json.dumps(result))
+        self._count += 1
+
+    def close(self):
+        self.out.write('\n' + self._footer + '\n')
+
+
+WRITERS = {
+    'text': TextWriter,
+    'json': JsonWriter,
+    'sarif': SarifWriter,
+}
@@ -0,0 +1,94 @@
+import mmap
+import os
+import re
+import sys
+from typing import Dict, Optional, Tuple, Union
+
+from ._profile import COUNTERS
+
+
+LINK_PATTERN = re.compile(r'\[\[.*?\]\]')
+LINK_PATTERN_BYTES = re.compile(rb'\[\[.*?\]\]')
+
+# a ``## :Section:`` header, if the match starts a line; without a leading
+# anchor the pattern starts with a literal, which is much faster to search for
+SECTION_PATTERN_BYTES = re.compile(rb'## :(.*?):[ \t\r]*$', re.MULTILINE)
+
+# notes at least this large are memory-mapped rather than read into memory
+MMAP_THRESHOLD = 1 << 20
+
+
+def decode(data: bytes) -> str:
+    """Decode the contents of a note as UTF-8, falling back to latin-1."""
+    try:
+        return data.decode()
+    except UnicodeDecodeError:
+        return data.decode('latin1')
+
+
+def extract_links(contents: str) -> Tuple[str, ...]:
+    """Return the keys of all [[links]] in the decoded contents of a note."""
+    return tuple(
+        sys.intern(m.group().strip('[]')) for m in LINK_PATTERN.finditer(contents)
+    )
+
+
+def replace_links(contents: str, mapping: Dict[str, str]) -> str:
+    """Replace every [[old]] link in the contents with [[new]], in one pass."""
+    def substitute(match):
+        key = match.group()[2:-2]
+        if key in mapping:
+            return f'[[{mapping[key]}]]'
+        return match.group()
+
+    return LINK_PATTERN.sub(substitute, contents)
+
+
+def scan_links(data: Union[bytes, mmap.mmap]) -> Tuple[str, ...]:
+    """Return the keys of all [[links]] in the raw contents of a note.
+
+    Only the matched spans are decoded; each is decoded on its own, so a
+    stray invalid byte elsewhere in the note does not affect the keys. Keys
+    are interned, so a key linked from many notes is stored once.
+
+    """
+    return tuple(
+        sys.intern(decode(m.group().strip(b'[]')))
+        for m in LINK_PATTERN_BYTES.finditer(data)
+    )
+
+
+def scan_sectioned_links(data: Union[bytes, mmap.mmap]) -> Tuple[Tuple[str, Optional[str]], ...]:
+    """Return (key, section) for every [[link]] in the raw contents of a note.
+
+    The section of a link is the name of the nearest ``## :Section:`` header
+    above it, or None if there is no such header.
+
+    """
+    headers = [
+        (m.start(), sys.intern(decode(m.group(1))))
+        for m in SECTION_PATTERN_BYTES.finditer(data)
+        if m.start() == 0 or data[m.start() - 1:m.start()] == b'\n'
+    ]
+    edges = []
+    section = None
+    i = 0
+    for m in LINK_PATTERN_BYTES.finditer(data):
+        while i < len(headers) and headers[i][0] < m.start():
+            section = headers[i][1]
+            i += 1
+        edges.append((sys.intern(decode(m.group().strip(b'[]'))), section))
+    return tuple(edges)
+
+
+def read_links(path: Union[str, os.PathLike]) -> Tuple[str, ...]:
+    """Return the keys of all [[links]] in the note at the path."""
+    with open(path, 'rb') as fileobj:
+        size = os.fstat(fileobj.fileno()).st_size
+        COUNTERS.add('reads')
+        COUNTERS.add('bytes_read', size)
+        if size < MMAP_THRESHOLD:
+            return scan_links(fileobj.read())
+
+        with mmap.mmap(fileobj.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return scan_links(mapped)
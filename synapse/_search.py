@@ -0,0 +1,441 @@
+import heapq
+import math
+import os
+import pathlib
+import re
+import sys
+import time
+from collections import Counter
+from typing import TYPE_CHECKING, Collection, Dict, Iterable, List, Optional, Tuple, Union
+
+from ._index import RACY_WINDOW_NS, _read_bytes
+from ._profile import COUNTERS
+from ._scan import decode
+from ._tree import iter_nodes
+from .util import NOTE_TYPES, get_key_type, get_relative_path
+
+
+if TYPE_CHECKING:
+    import sqlite3
+
+
+TOKEN_PATTERN = re.compile(r'\w+')
+
+# the usual BM25 parameters: term frequency saturation and length normalization
+K1 = 1.2
+B = 0.75
+
+
+def tokenize(text: str) -> List[str]:
+    """The lowercased words of a text, in order."""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def _note_words(key: str, contents: str) -> List[str]:
+    """The words a note is indexed under: those of its name, then its contents."""
+    return tokenize(key.rpartition(':')[2]) + tokenize(contents)
+
+
+def _weight(n: int, df: int) -> float:
+    """The BM25 weight of a word found in `df` of `n` notes."""
+    idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+    return idf * (K1 + 1)
+
+
+def _norm(length: int, average_length: float) -> float:
+    """The BM25 length normalization of a note with `length` words."""
+    return K1 * (1 - B + B * length / average_length)
+
+
+def _best(scores: Dict[str, float], limit: Optional[int]) -> List[Tuple[str, float]]:
+    def rank(item):
+        return -item[1], item[0]
+
+    if limit is None:
+        return sorted(scores.items(), key=rank)
+    return heapq.nsmallest(limit, scores.items(), key=rank)
+
+
+class SearchIndex:
+    """An inverted index of the words in every note, ranked with BM25.
+
+    The index is built lazily by reading every note once, and afterwards
+    kept up to date through the same methods as :class:`LinkIndex`, so a
+    query only touches the postings of its own words. The name of a note
+    is indexed along with its contents.
+
+    """
+
+    def __init__(self, network):
+        self.network = network
+        # word -> key of each note containing it -> number of occurrences
+        self._postings: Optional[Dict[str, Dict[str, int]]] = None
+        # key -> the distinct words of the note, so that it can be removed
+        self._words: Dict[str, Tuple[str, ...]] = {}
+        self._lengths: Dict[str, int] = {}
+        self._types: Dict[str, str] = {}
+        self._total_length = 0
+        # key -> its BM25 length normalization; None when out of date
+        self._norms: Optional[Dict[str, float]] = None
+
+    def _ensure_built(self) -> Dict[str, Dict[str, int]]:
+        if self._postings is None:
+            self._postings = {}
+            self._words = {}
+            self._lengths = {}
+            self._types = {}
+            self._total_length = 0
+            for type_, key, entry in iter_nodes(self.network.root, NOTE_TYPES):
+                self._add(key, type_, decode(_read_bytes(entry.path)))
+        return self._postings
+
+    def _add(self, key: str, type_: str, contents: str):
+        assert self._postings is not None
+        words = _note_words(key, contents)
+        counts = Counter(words)
+        distinct = []
+        for word, count in counts.items():
+            word = sys.intern(word)
+            self._postings.setdefault(word, {})[key] = count
+            distinct.append(word)
+        self._words[key] = tuple(distinct)
+        self._lengths[key] = len(words)
+        self._types[key] = type_
+        self._total_length += len(words)
+        self._norms = None
+
+    def _discard(self, key: str):
+        assert self._postings is not None
+        for word in self._words.pop(key, ()):
+            postings = self._postings[word]
+            del postings[key]
+            if not postings:
+                del self._postings[word]
+        self._total_length -= self._lengths.pop(key, 0)
+        self._types.pop(key, None)
+        self._norms = None
+
+    def _length_norms(self) -> Dict[str, float]:
+        """The BM25 length normalization of every note, computed once per change."""
+        if self._norms is None:
+            average_length = self._total_length / len(self._lengths)
+            self._norms = {
+                key: _norm(length, average_length) for key, length in self._lengths.items()
+            }
+        return self._norms
+
+    def search(
+            self,
+            query: str,
+            types: Optional[Collection[str]] = None,
+            keys: Optional[Collection[str]] = None,
+            limit: Optional[int] = 10
+            ) -> List[Tuple[str, float]]:
+        """The best matches for a query, as (key, score) pairs, best first.
+
+        A note matches if it contains any word of the query. Results can be
+        restricted to notes of the given `types`, and to the given `keys`.
+        Ties are broken by key.
+
+        """
+        all_postings = self._ensure_built()
+        if not self._lengths:
+            return []
+
+        n = len(self._lengths)
+        norms = self._length_norms()
+        scores: Dict[str, float] = {}
+        for word in set(tokenize(query)):
+            postings = all_postings.get(word)
+            if not postings:
+                continue
+
+            weight = _weight(n, len(postings))
+            matches: Iterable[Tuple[str, int]]
+            if keys is not None:
+                # look up the keys of the neighbourhood rather than scan
+                matches = [(key, postings[key]) for key in keys if key in postings]
+            else:
+                matches = postings.items()
+            if types is not None:
+                matches = [(key, count) for key, count in matches if self._types[key] in types]
+
+            get = scores.get
+            for key, count in matches:
+                scores[key] = get(key, 0.0) + weight * count / (count + norms[key])
+
+        return _best(scores, limit)
+
+    def update(self, key: str, contents: Optional[str] = None):
+        """Re-index a note, optionally from its new contents."""
+        if self._postings is None:
+            return
+        if contents is None:
+            contents = self.network[key].contents
+        self._discard(key)
+        self._add(key, get_key_type(key), contents)
+
+    def remove(self, key: str):
+        """Forget a note that has been deleted."""
+        if self._postings is not None:
+            self._discard(key)
+
+    def rename(self, old_key: str, new_key: str):
+        """Move the entry for a note that has been re-keyed."""
+        self.rename_many({old_key: new_key})
+
+    def rename_many(self, mapping: Dict[str, str]):
+        """Re-index notes re-keyed at the same time, whose names have changed."""
+        if self._postings is None:
+            return
+
+        moved = [old_key for old_key in mapping if old_key in self._words]
+        for old_key in moved:
+            self._discard(old_key)
+        for old_key in moved:
+            self.update(mapping[old_key])
+
+    def clear(self):
+        """Forget everything; the index is rebuilt on next use."""
+        self._postings = None
+
+
+SEARCH_SCHEMA_VERSION = 1
+
+SEARCH_SCHEMA = '''
+CREATE TABLE notes (
+    id INTEGER PRIMARY KEY,
+    key TEXT UNIQUE NOT NULL,
+    type TEXT NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    indexed_ns INTEGER NOT NULL
+);
+CREATE TABLE postings (
+    word TEXT NOT NULL,
+    note INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (word, note)
+) WITHOUT ROWID;
+CREATE INDEX postings_note ON postings (note);
+'''
+
+
+class SqliteSearchIndex:
+    """The same index as :class:`SearchIndex`, kept in an SQLite database.
+
+    The database persists between runs. When first used, it is reconciled
+    with the disk like :class:`SqliteIndex`: only the notes whose stat
+    changed are read again, and the rows of deleted notes are dropped.
+    Afterwards, a query reads the postings of its own words and nothing
+    else, so a search is fast even in a fresh process.
+
+    Scores are those of :class:`SearchIndex`.
+
+    """
+
+    def __init__(self, network, path: Union[str, pathlib.Path]):
+        self.network = network
+        self.path = pathlib.Path(path)
+        self._db: Optional['sqlite3.Connection'] = None
+        self._built = False
+
+    def _connect(self) -> 'sqlite3.Connection':
+        # imported here so that sqlite3 is only loaded when it is used
+        import sqlite3
+
+        if self._db is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            try:
+                self._db = self._open()
+            except sqlite3.DatabaseError:
+                # not a database, e.g. because it was truncated; start over
+                self.path.unlink()
+                self._db = self._open()
+        return self._db
+
+    def _open(self) -> 'sqlite3.Connection':
+        import sqlite3
+
+        # the daemon may serve requests on a thread other than the one that
+        # created the network; requests are never handled concurrently
+        db = sqlite3.connect(os.fspath(self.path), check_same_thread=False)
+        try:
+            version = db.execute('PRAGMA user_version').fetchone()[0]
+            if version != SEARCH_SCHEMA_VERSION:
+                db.executescript(
+                    'DROP TABLE IF EXISTS postings;'
+                    'DROP TABLE IF EXISTS notes;'
+                    + SEARCH_SCHEMA
+                    + f'PRAGMA user_version = {SEARCH_SCHEMA_VERSION};'
+                )
+        except sqlite3.DatabaseError:
+            db.close()
+            raise
+        return db
+
+    def _ensure_built(self) -> 'sqlite3.Connection':
+        db = self._connect()
+        if self._built:
+            return db
+
+        stored = {
+            key: (mtime_ns, size, indexed_ns)
+            for key, mtime_ns, size, indexed_ns in db.execute(
+                'SELECT key, mtime_ns, size, indexed_ns FROM notes'
+            )
+        }
+
+        seen = set()
+        stale = []
+        for type_, key, entry in iter_nodes(self.network.root, NOTE_TYPES):
+            seen.add(key)
+            COUNTERS.add('stats')
+            stat = entry.stat()
+            row = stored.get(key)
+            if (
+                row is not None
+                and row[0] == stat.st_mtime_ns
+                and row[1] == stat.st_size
+                and stat.st_mtime_ns < row[2] - RACY_WINDOW_NS
+            ):
+                continue
+            words = _note_words(key, decode(_read_bytes(entry.path)))
+            stale.append((key, type_, stat, len(words), Counter(words)))
+
+        now = time.time_ns()
+        # written in a few statements, as one statement per note is slow
+        with db:
+            replaced = [(key,) for key in stored.keys() - seen]
+            replaced.extend((key,) for key, _, _, _, _ in stale if key in stored)
+            db.executemany(
+                'DELETE FROM postings WHERE note = (SELECT id FROM notes WHERE key = ?)', replaced
+            )
+            db.executemany('DELETE FROM notes WHERE key = ?', replaced)
+            db.executemany(
+                'INSERT INTO notes (key, type, mtime_ns, size, length, indexed_ns)'
+                ' VALUES (?, ?, ?, ?, ?, ?)',
+                (
+                    (key, type_, stat.st_mtime_ns, stat.st_size, length, now)
+                    for key, type_, stat, length, _ in stale
+                )
+            )
+            ids = dict(db.execute('SELECT key, id FROM notes'))
+            # the ids of new rows increase, so the postings of each word are
+            # already in order of id; sorting the words alone gives the rows
+            # in primary key order, which is much faster to insert
+            by_word: Dict[str, List[Tuple[int, int]]] = {}
+            for key, _, _, _, counts in stale:
+                note = ids[key]
+                for word, count in counts.items():
+                    by_word.setdefault(word, []).append((note, count))
+            rows = (
+                (word, note, count)
+                for word in sorted(by_word) for note, count in by_word[word]
+            )
+            # filling an empty table is faster still without its index
+            if not stored:
+                db.execute('DROP INDEX postings_note')
+            db.executemany('INSERT INTO postings VALUES (?, ?, ?)', rows)
+            if not stored:
+                db.execute('CREATE INDEX postings_note ON postings (note)')
+
+        self._built = True
+        return db
+
+    @staticmethod
+    def _delete(db, key: str):
+        row = db.execute('SELECT id FROM notes WHERE key = ?', (key,)).fetchone()
+        if row is not None:
+            db.execute('DELETE FROM postings WHERE note = ?', row)
+            db.execute('DELETE FROM notes WHERE id = ?', row)
+
+    @classmethod
+    def _store(cls, db, type_: str, key: str, stat: os.stat_result, words: List[str]):
+        """Write the row and the postings of a note, given its words."""
+        cls._delete(db, key)
+        note = db.execute(
+            'INSERT INTO notes (key, type, mtime_ns, size, length, indexed_ns)'
+            ' VALUES (?, ?, ?, ?, ?, ?)',
+            (key, type_, stat.st_mtime_ns, stat.st_size, len(words), time.time_ns())
+        ).lastrowid
+        db.executemany(
+            'INSERT INTO postings VALUES (?, ?, ?)',
+            ((word, note, count) for word, count in Counter(words).items())
+        )
+
+    def search(
+            self,
+            query: str,
+            types: Optional[Collection[str]] = None,
+            keys: Optional[Collection[str]] = None,
+            limit: Optional[int] = 10
+            ) -> List[Tuple[str, float]]:
+        """The best matches for a query; see :meth:`SearchIndex.search`."""
+        db = self._ensure_built()
+        n, total_length = db.execute('SELECT COUNT(*), SUM(length) FROM notes').fetchone()
+        if not n:
+            return []
+
+        average_length = total_length / n
+        if keys is not None:
+            keys = set(keys)
+        scores: Dict[str, float] = {}
+        for word in set(tokenize(query)):
+            postings = db.execute(
+                'SELECT key, count, length, type FROM postings'
+                ' JOIN notes ON notes.id = postings.note WHERE word = ?',
+                (word,)
+            ).fetchall()
+            if not postings:
+                continue
+
+            weight = _weight(n, len(postings))
+            if keys is not None:
+                postings = [row for row in postings if row[0] in keys]
+            if types is not None:
+                postings = [row for row in postings if row[3] in types]
+
+            get = scores.get
+            for key, count, length, _ in postings:
+                norm = _norm(length, average_length)
+                scores[key] = get(key, 0.0) + weight * count / (count + norm)
+
+        return _best(scores, limit)
+
+    def update(self, key: str, contents: Optional[str] = None):
+        """Re-index a note, optionally from its new contents."""
+        if not self._built:
+            return
+        path = self.network.root / get_relative_path(key)
+        COUNTERS.add('stats')
+        # stat before reading: a write in between then leaves the row stale
+        stat = os.stat(path)
+        if contents is None:
+            contents = decode(_read_bytes(path))
+        with self._connect() as db:
+            self._store(db, get_key_type(key), key, stat, _note_words(key, contents))
+
+    def remove(self, key: str):
+        """Forget a note that has been deleted."""
+        if self._built:
+            with self._connect() as db:
+                self._delete(db, key)
+
+    def rename(self, old_key: str, new_key: str):
+        """Move the entry for a note that has been re-keyed."""
+        self.rename_many({old_key: new_key})
+
+    def rename_many(self, mapping: Dict[str, str]):
+        """Re-index notes re-keyed at the same time, whose names have changed."""
+        if not self._built:
+            return
+        for old_key in mapping:
+            self.remove(old_key)
+        for new_key in mapping.values():
+            self.update(new_key)
+
+    def clear(self):
+        """Forget everything; the index is reconciled with the disk on next use."""
+        self._built = False
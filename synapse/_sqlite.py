@@ -0,0 +1,317 @@
+import hashlib
+import os
+import pathlib
+import sqlite3
+import sys
+import time
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+from ._index import RACY_WINDOW_NS, _read_bytes
+from ._profile import COUNTERS
+from ._scan import scan_sectioned_links
+from ._tree import iter_nodes
+from .util import NOTE_TYPES, get_key_type, get_relative_path
+
+
+SCHEMA_VERSION = 1
+
+SCHEMA = '''
+CREATE TABLE nodes (
+    key TEXT PRIMARY KEY,
+    type TEXT NOT NULL,
+    path TEXT NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    hash TEXT,
+    indexed_ns INTEGER NOT NULL
+);
+CREATE INDEX nodes_type ON nodes (type);
+CREATE TABLE edges (
+    src TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    dst TEXT NOT NULL,
+    section TEXT,
+    PRIMARY KEY (src, position)
+) WITHOUT ROWID;
+CREATE INDEX edges_dst ON edges (dst);
+'''
+
+Edges = Tuple[Tuple[str, Optional[str]], ...]
+
+
+class SqliteIndex:
+    """The links made by every note in a network, kept in an SQLite database.
+
+    The database persists between runs and may be queried by other tools. Its
+    ``nodes`` table holds the key, type, path, mtime, size and SHA-1 digest
+    of every node (assets are not hashed), and its ``edges`` table holds the
+    source, position, target and ``## :Section:`` of every link, indexed by
+    target so that backlinks are found without a scan.
+
+    When first used, the database is reconciled with the disk: nodes whose
+    stat is unchanged are not read, notes whose stat changed are read and
+    hashed but only re-parsed if their digest changed, and the rows of
+    deleted nodes are dropped. Afterwards it is kept up to date through the
+    same methods as :class:`LinkIndex`, which it can replace.
+
+    What the database saves is re-reading the notes on every run, not
+    memory: lookups of single keys, such as :meth:`backlinks`, are indexed
+    queries, but a :class:`Snapshot`, and so every check, still loads all
+    edges into memory through :meth:`items`.
+
+    """
+
+    def __init__(self, network, path: Union[str, pathlib.Path], jobs: Optional[int] = None):
+        self.network = network
+        self.path = pathlib.Path(path)
+        self.jobs = jobs
+        self._db: Optional[sqlite3.Connection] = None
+        self._built = False
+        # incremented whenever the index changes, so views can tell if stale
+        self.generation = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            try:
+                self._db = self._open()
+            except sqlite3.DatabaseError:
+                # not a database, e.g. because it was truncated; start over
+                self.path.unlink()
+                self._db = self._open()
+        return self._db
+
+    def _open(self) -> sqlite3.Connection:
+        # the daemon may serve requests on a thread other than the one that
+        # created the network; requests are never handled concurrently
+        db = sqlite3.connect(os.fspath(self.path), check_same_thread=False)
+        try:
+            version = db.execute('PRAGMA user_version').fetchone()[0]
+            if version != SCHEMA_VERSION:
+                db.executescript(
+                    'DROP TABLE IF EXISTS edges;'
+                    'DROP TABLE IF EXISTS nodes;'
+                    + SCHEMA
+                    + f'PRAGMA user_version = {SCHEMA_VERSION};'
+                )
+        except sqlite3.DatabaseError:
+            db.close()
+            raise
+        return db
+
+    def _ensure_built(self):
+        if self._built:
+            return
+
+        db = self._connect()
+        stored = {
+            key: (mtime_ns, size, digest, indexed_ns)
+            for key, mtime_ns, size, digest, indexed_ns in db.execute(
+                'SELECT key, mtime_ns, size, hash, indexed_ns FROM nodes'
+            )
+        }
+
+        seen = set()
+        stale = []
+        for type_, key, entry in iter_nodes(self.network.root):
+            seen.add(key)
+            COUNTERS.add('stats')
+            stat = entry.stat()
+            row = stored.get(key)
+            if (
+                row is not None
+                and row[0] == stat.st_mtime_ns
+                and row[1] == stat.st_size
+                and stat.st_mtime_ns < row[3] - RACY_WINDOW_NS
+            ):
+                continue
+            stale.append((type_, key, entry.path, stat, None if row is None else row[2]))
+
+        if self.jobs is not None and self.jobs > 1:
+            # imported here as it is slow to import and rarely needed
+            import concurrent.futures
+
+            with concurrent.futures.ThreadPoolExecutor(self.jobs) as executor:
+                scanned = list(executor.map(self._scan, stale))
+        else:
+            scanned = [self._scan(item) for item in stale]
+
+        now = time.time_ns()
+        node_rows = []
+        edge_rows = []
+        reparsed = []
+        for (type_, key, _, stat, _), (digest, edges) in zip(stale, scanned):
+            node_rows.append(
+                (key, type_, get_relative_path(key), stat.st_mtime_ns, stat.st_size, digest, now)
+            )
+            if edges is not None:
+                reparsed.append((key,))
+                edge_rows.extend(
+                    (key, position, dst, section)
+                    for position, (dst, section) in enumerate(edges)
+                )
+
+        # written in a few statements, as one statement per note is slow
+        with db:
+            unseen = [(key,) for key in stored.keys() - seen]
+            db.executemany('DELETE FROM nodes WHERE key = ?', unseen)
+            db.executemany('DELETE FROM edges WHERE src = ?', unseen + reparsed)
+            db.executemany('INSERT OR REPLACE INTO nodes VALUES (?, ?, ?, ?, ?, ?, ?)', node_rows)
+            db.executemany('INSERT INTO edges VALUES (?, ?, ?, ?)', edge_rows)
+
+        self._built = True
+        self.generation += 1
+
+    @staticmethod
+    def _scan(item) -> Tuple[Optional[str], Optional[Edges]]:
+        """The digest and, if it changed, the links of a stale node."""
+        type_, _, path, _, old_digest = item
+        if type_ not in NOTE_TYPES:
+            return None, None
+        data = _read_bytes(path)
+        digest = hashlib.sha1(data).hexdigest()
+        if digest == old_digest:
+            return digest, None
+        return digest, scan_sectioned_links(data)
+
+    def _store(
+            self,
+            type_: str,
+            key: str,
+            stat: os.stat_result,
+            digest: Optional[str],
+            edges: Optional[Edges]
+            ):
+        """Write the row of a node and, unless `edges` is None, its links."""
+        db = self._connect()
+        db.execute(
+            'INSERT OR REPLACE INTO nodes VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (key, type_, get_relative_path(key), stat.st_mtime_ns, stat.st_size,
+             digest, time.time_ns())
+        )
+        if edges is not None:
+            db.execute('DELETE FROM edges WHERE src = ?', (key,))
+            db.executemany(
+                'INSERT INTO edges VALUES (?, ?, ?, ?)',
+                ((key, position, dst, section) for position, (dst, section) in enumerate(edges))
+            )
+
+    def _delete(self, key: str):
+        db = self._connect()
+        db.execute('DELETE FROM nodes WHERE key = ?', (key,))
+        db.execute('DELETE FROM edges WHERE src = ?', (key,))
+
+    def links(self, key: str) -> Tuple[str, ...]:
+        """The keys linked to by the note with the given key."""
+        self._ensure_built()
+        db = self._connect()
+        if db.execute('SELECT 1 FROM nodes WHERE key = ?', (key,)).fetchone() is None:
+            # the note was created after the index was built
+            return self.update(key)
+        return tuple(
+            dst for dst, in db.execute(
+                'SELECT dst FROM edges WHERE src = ? ORDER BY position', (key,)
+            )
+        )
+
+    def backlinks(self, key: str) -> Tuple[str, ...]:
+        """The keys of the notes which link to the given key."""
+        self._ensure_built()
+        db = self._connect()
+        return tuple(
+            src for src, in db.execute(
+                'SELECT DISTINCT src FROM edges WHERE dst = ? ORDER BY src', (key,)
+            )
+        )
+
+    def items(self) -> Iterator[Tuple[str, Tuple[str, ...]]]:
+        """Iterate over (key, links) pairs for every note."""
+        self._ensure_built()
+        db = self._connect()
+        placeholders = ', '.join('?' * len(NOTE_TYPES))
+        links: Dict[str, List[str]] = {
+            key: [] for key, in db.execute(
+                f'SELECT key FROM nodes WHERE type IN ({placeholders}) ORDER BY key',
+                tuple(NOTE_TYPES)
+            )
+        }
+        for src, dst in db.execute('SELECT src, dst FROM edges ORDER BY src, position'):
+            links[src].append(sys.intern(dst))
+        return iter([(key, tuple(targets)) for key, targets in links.items()])
+
+    def update(self, key: str, contents: Optional[str] = None) -> Tuple[str, ...]:
+        """Re-read the links of a note.
+
+        The note is read from disk even if its new `contents` are given, so
+        that the digest and stat recorded are those of the file.
+
+        """
+        self._ensure_built()
+        path = self.network[key].path
+        COUNTERS.add('stats')
+        # stat before reading: a write in between then leaves the row stale
+        stat = os.stat(path)
+        data = _read_bytes(path)
+        edges = scan_sectioned_links(data)
+        with self._connect():
+            self._store(get_key_type(key), key, stat, hashlib.sha1(data).hexdigest(), edges)
+        self.generation += 1
+        return tuple(dst for dst, _ in edges)
+
+    def touch(self, key: Optional[str] = None):
+        """Record a change to a node that does not affect any links."""
+        self.generation += 1
+        if key is None or not self._built:
+            return
+
+        COUNTERS.add('stats')
+        with self._connect():
+            try:
+                stat = os.stat(self.network.root / get_relative_path(key))
+            except FileNotFoundError:
+                self._delete(key)
+            else:
+                self._store(get_key_type(key), key, stat, None, None)
+
+    def remove(self, key: str):
+        """Forget the links of a note that has been deleted."""
+        self.generation += 1
+        if self._built:
+            with self._connect():
+                self._delete(key)
+
+    def rename(self, old_key: str, new_key: str):
+        """Move the entry for a node that has been re-keyed."""
+        self.rename_many({old_key: new_key})
+
+    def rename_many(self, mapping: Dict[str, str]):
+        """Move the entries for nodes re-keyed at the same time."""
+        self.generation += 1
+        if not self._built:
+            return
+
+        # move through temporary keys, so that chained renames do not collide
+        temporary = {old_key: f'\0{i}' for i, old_key in enumerate(mapping)}
+        with self._connect() as db:
+            for old_key, tmp_key in temporary.items():
+                db.execute('UPDATE nodes SET key = ? WHERE key = ?', (tmp_key, old_key))
+                db.execute('UPDATE edges SET src = ? WHERE src = ?', (tmp_key, old_key))
+            for old_key, tmp_key in temporary.items():
+                new_key = mapping[old_key]
+                db.execute(
+                    'UPDATE nodes SET key = ?, path = ? WHERE key = ?',
+                    (new_key, get_relative_path(new_key), tmp_key)
+                )
+                db.execute('UPDATE edges SET src = ? WHERE src = ?', (new_key, tmp_key))
+
+    def clear(self):
+        """Forget everything; the index is reconciled with the disk on next use."""
+        self.generation += 1
+        self._built = False
+
+    def close(self):
+        """Close the connection to the database."""
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+            self._built = False
@@ -0,0 +1,220 @@
+import os
+from typing import Collection, Dict, Iterator, List, Optional, Tuple, Union
+
+from ._profile import COUNTERS
+from .util import is_node_name
+
+
+NOTE_DIRECTORIES = {'thought', 'journal', 'project'}
+ASSET_DIRECTORIES = {'image', 'file', 'raw'}
+
+
+def _identity(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_dev, stat.st_ino
+
+
+def walk(root: Union[str, os.PathLike]) -> Iterator[Tuple[str, os.DirEntry]]:
+    """Recursively yield (relative path, entry) for everything below root.
+
+    Relative paths use forward slashes. Hidden directories such as ``.git``
+    are yielded but not descended into. Symbolic links to directories are
+    followed, unless they lead back to a directory being walked.
+
+    """
+    # each directory is walked along with the paths of those above it, so
+    # that a link to one of them can be recognized; only links need a stat
+    stack: List[Tuple[str, str, Tuple[str, ...]]] = [('', os.fspath(root), ())]
+    while stack:
+        prefix, directory, ancestors = stack.pop()
+        try:
+            entries = list(os.scandir(directory))
+        except (FileNotFoundError, NotADirectoryError):
+            continue
+        COUNTERS.add('listings')
+
+        for entry in entries:
+            relpath = prefix + entry.name
+            yield relpath, entry
+            if entry.name.startswith('.') or not entry.is_dir():
+                continue
+            if entry.is_symlink():
+                identity = _identity(entry.path)
+                if identity is None or any(
+                    _identity(path) == identity for path in (directory, *ancestors)
+                ):
+                    continue
+            stack.append((relpath + '/', entry.path, (directory, *ancestors)))
+
+
+def iter_nodes(
+        root: Union[str, os.PathLike],
+        types: Optional[Collection[str]] = None
+        ) -> Iterator[Tuple[str, str, os.DirEntry]]:
+    """Lazily yield (type, key, entry) for every node in the network at root.
+
+    The tree is traversed once, and each entry is classified by the top-level
+    directory it is in: files in the root are topics, files directly inside
+    ``thought/``, ``journal/`` and ``project/`` are notes of that type, and
+    files anywhere below ``image/``, ``file/`` and ``raw/`` are assets, whose
+    keys keep the slashes of their nested path. Hidden files and files
+    staged by synapse are skipped; see :func:`is_node_name`. If `types` is
+    given, only the parts of the tree holding nodes of those types are
+    visited.
+
+    """
+    try:
+        top_level = list(os.scandir(os.fspath(root)))
+    except FileNotFoundError:
+        return
+    COUNTERS.add('listings')
+
+    for entry in top_level:
+        name = entry.name
+        if not is_node_name(name):
+            continue
+        if entry.is_file():
+            if types is None or 'topic' in types:
+                yield 'topic', os.path.splitext(name)[0], entry
+        elif types is not None and name not in types:
+            continue
+        elif name in NOTE_DIRECTORIES and entry.is_dir():
+            COUNTERS.add('listings')
+            for subentry in os.scandir(entry.path):
+                if subentry.is_file() and is_node_name(subentry.name):
+                    yield name, name + ':' + os.path.splitext(subentry.name)[0], subentry
+        elif name in ASSET_DIRECTORIES and entry.is_dir():
+            for relpath, subentry in walk(entry.path):
+                if subentry.is_file() and is_node_name(subentry.name):
+                    yield name, name + ':' + relpath, subentry
+
+
+def classify(relpath: str) -> Optional[Tuple[str, str]]:
+    """The (type, key) of the node stored in the file at relpath, if any.
+
+    This is the inverse of the key-to-path mapping, following the same rules
+    as :func:`iter_nodes`.
+
+    """
+    parts = relpath.split('/')
+    if not all(map(is_node_name, parts)):
+        return None
+    if len(parts) == 1:
+        return 'topic', os.path.splitext(relpath)[0]
+
+    top = parts[0]
+    if top in NOTE_DIRECTORIES and len(parts) == 2:
+        return top, top + ':' + os.path.splitext(parts[1])[0]
+    elif top in ASSET_DIRECTORIES:
+        return top, top + ':' + '/'.join(parts[1:])
+    else:
+        return None
+
+
+class PathSet:
+    """The relative paths of every file and directory in a network.
+
+    The set is filled lazily by a single recursive walk of the tree, after
+    which membership tests need no system calls. Synapse records the files
+    it creates or renames with :meth:`add` and :meth:`move`, and changes
+    made by others can be picked up path by path with :meth:`reload`.
+
+    """
+
+    def __init__(self, root: Union[str, os.PathLike]):
+        self.root = root
+        # relative path -> whether it is a directory, in the order found
+        self._paths: Optional[Dict[str, bool]] = None
+
+    def _ensure_built(self) -> Dict[str, bool]:
+        if self._paths is None:
+            self._paths = {
+                relpath: entry.is_dir() for relpath, entry in walk(self.root)
+            }
+        return self._paths
+
+    def __contains__(self, relpath: str) -> bool:
+        return relpath.rstrip('/') in self._ensure_built()
+
+    def nodes(self) -> Iterator[Tuple[str, str]]:
+        """Yield the (type, key) of every node, without touching the disk."""
+        for relpath, is_dir in list(self._ensure_built().items()):
+            if not is_dir:
+                node = classify(relpath)
+                if node is not None:
+                    yield node
+
+    def add(self, relpath: str, is_dir: bool = False):
+        """Record a new path, along with its parent directories."""
+        paths = self._ensure_built()
+        parts = relpath.split('/')
+        for i in range(1, len(parts)):
+            paths['/'.join(parts[:i])] = True
+        paths[relpath] = is_dir
+
+    def _remove(self, relpath: str) -> Dict[str, bool]:
+        """Forget a path and everything beneath it, returning what was removed."""
+        paths = self._ensure_built()
+        if paths.get(relpath) is False:
+            # a file, so there is nothing beneath it
+            del paths[relpath]
+            return {relpath: False}
+
+        prefix = relpath + '/'
+        removed = {p: d for p, d in paths.items() if p.startswith(prefix)}
+        if relpath in paths:
+            removed[relpath] = paths[relpath]
+        for path in removed:
+            del paths[path]
+        return removed
+
+    def move(self, old_relpath: str, new_relpath: str):
+        """Record that a path, and everything beneath it, has been renamed."""
+        self.move_many([(old_relpath, new_relpath)])
+
+    def move_many(self, moves: Collection[Tuple[str, str]]):
+        """Record several renames made at once, possibly into each other's place."""
+        self._ensure_built()
+        added = {}
+        for old_relpath, new_relpath in moves:
+            for path, is_dir in self._remove(old_relpath).items():
+                added[new_relpath + path[len(old_relpath):]] = is_dir
+
+        for relpath, is_dir in added.items():
+            self.add(relpath, is_dir)
+
+    def reload(self, relpath: str) -> Dict[str, bool]:
+        """Re-examine a path changed on disk, and everything beneath it.
+
+        Returns a dictionary mapping the relative path of every file that
+        was affected to whether it exists now.
+
+        """
+        self._ensure_built()
+        removed = self._remove(relpath)
+        changed = {p: False for p, is_dir in removed.items() if not is_dir}
+
+        path = os.path.join(self.root, relpath)
+        if os.path.isdir(path):
+            self.add(relpath, is_dir=True)
+            if not os.path.basename(relpath).startswith('.'):
+                for subpath, entry in walk(path):
+                    is_dir = entry.is_dir()
+                    self.add(relpath + '/' + subpath, is_dir)
+                    if not is_dir:
+                        changed[relpath + '/' + subpath] = True
+        elif os.path.exists(path):
+            self.add(relpath)
+            changed[relpath] = True
+        elif not removed:
+            # never seen, but may still be known elsewhere, such as in an index
+            changed[relpath] = False
+
+        return changed
+
+    def clear(self):
+        """Forget everything; the tree is walked again on next use."""
+        self._paths = None
@@ -0,0 +1,281 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+from ._network import Network, FatalFailure
+from ._report import Failure
+from ._tree import iter_nodes, walk
+from .util import get_key_type
+
+
+# reported by a watcher in place of paths when it has lost track of what
+# changed, so that everything must be re-read; no path contains a NUL
+RESCAN = '\0rescan'
+
+
+class IncrementalChecker:
+    """Runs the checks of a network, re-running only those that may have changed.
+
+    The failures found by each checker are remembered. When told which types
+    of node have changed, a checker is re-run only if it declares, through
+    :func:`depends_on`, that it depends on one of those types; checkers
+    without a declaration are always re-run. The failures returned are the
+    same as those of :meth:`Network.check`.
+
+    """
+
+    def __init__(self, network: Network):
+        self.network = network
+        # checker -> (its failures, whether it raised FatalFailure)
+        self._results: Dict[object, Tuple[List[Failure], bool]] = {}
+
+    def check(self, changed_types: Optional[Set[str]] = None) -> List[Failure]:
+        """Return all failures, given the types of node changed since last time.
+
+        If `changed_types` is None, every checker is run.
+
+        """
+        failures = []
+        for position, checker in enumerate(Network.CHECKS):
+            depends = getattr(checker, 'depends_on', None)
+            cached = self._results.get(checker)
+            if (
+                cached is None
+                or changed_types is None
+                or depends is None
+                or depends & changed_types
+            ):
+                own_failures: List[Failure] = []
+                try:
+                    checker(self.network, own_failures)
+                    fatal = False
+                except FatalFailure:
+                    fatal = True
+                cached = self._results[checker] = (own_failures, fatal)
+
+            own_failures, fatal = cached
+            failures.extend(own_failures)
+            if fatal:
+                # the later checkers are not run, so their results cannot be
+                # kept: they would miss the changes made in the meantime
+                for skipped in Network.CHECKS[position + 1:]:
+                    self._results.pop(skipped, None)
+                break
+
+        return failures
+
+
+class PollingWatcher:
+    """Finds changed files by periodically comparing the stat of every node."""
+
+    def __init__(self, root, interval: float = 0.5):
+        self.root = root
+        self.interval = interval
+        self._stats = self._scan()
+
+    def _scan(self) -> Dict[str, Tuple[int, int]]:
+        root = os.fspath(self.root)
+        stats = {}
+        for _, _, entry in iter_nodes(root):
+            stat = entry.stat()
+            relpath = os.path.relpath(entry.path, root).replace(os.sep, '/')
+            stats[relpath] = (stat.st_mtime_ns, stat.st_size)
+        return stats
+
+    def wait(self, timeout: Optional[float] = None) -> Set[str]:
+        """Block until some files change, returning their relative paths.
+
+        Returns an empty set if nothing changed before the timeout.
+
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            stats = self._scan()
+            changed = {
+                relpath for relpath in stats.keys() | self._stats.keys()
+                if stats.get(relpath) != self._stats.get(relpath)
+            }
+            self._stats = stats
+            if changed:
+                return changed
+            if deadline is not None and time.monotonic() >= deadline:
+                return set()
+            time.sleep(self.interval)
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    """Finds changed files with Linux's inotify, watching every directory.
+
+    New directories are watched as soon as they appear, and reported along
+    with everything already in them.
+
+    """
+
+    IN_MODIFY = 0x002
+    IN_ATTRIB = 0x004
+    IN_CLOSE_WRITE = 0x008
+    IN_MOVED_FROM = 0x040
+    IN_MOVED_TO = 0x080
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    IN_Q_OVERFLOW = 0x4000
+    IN_IGNORED = 0x8000
+    IN_ISDIR = 0x40000000
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+
+    MASK = (
+        IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+        | IN_CREATE | IN_DELETE
+    )
+
+    EVENT = struct.Struct('iIII')
+
+    # events arriving this soon after the first are reported together
+    SETTLE_TIME = 0.05
+
+    def __init__(self, root):
+        self.root = os.fspath(root)
+        libc_name = ctypes.util.find_library('c')
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self._fd = self._libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        # watch descriptor -> directory relative to the root ('' for the root)
+        self._watches: Dict[int, str] = {}
+        self._watch_tree('')
+
+    def _watch(self, reldir: str):
+        path = os.path.join(self.root, reldir)
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), self.MASK)
+        if wd >= 0:
+            self._watches[wd] = reldir
+
+    def _watch_tree(self, reldir: str) -> Set[str]:
+        """Watch a directory and those below it, returning the files in them."""
+        self._watch(reldir)
+        files = set()
+        prefix = reldir + '/' if reldir else ''
+        for relpath, entry in walk(os.path.join(self.root, reldir)):
+            if entry.is_dir():
+                if not any(part.startswith('.') for part in relpath.split('/')):
+                    self._watch(prefix + relpath)
+            else:
+                files.add(prefix + relpath)
+        return files
+
+    def _read_events(self) -> Set[str]:
+        changed: Set[str] = set()
+        while True:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                return changed
+
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = self.EVENT.unpack_from(data, offset)
+                offset += self.EVENT.size
+                name = data[offset:offset + length].rstrip(b'\0').decode(
+                    sys.getfilesystemencoding(), 'surrogateescape'
+                )
+                offset += length
+
+                if mask & self.IN_Q_OVERFLOW:
+                    # events were dropped, so directories created since may
+                    # be unwatched; watch them all again and read everything
+                    self._watch_tree('')
+                    changed.add(RESCAN)
+                    continue
+
+                if mask & self.IN_IGNORED:
+                    self._watches.pop(wd, None)
+                    continue
+
+                reldir = self._watches.get(wd)
+                if reldir is None or not name:
+                    continue
+                relpath = f'{reldir}/{name}' if reldir else name
+                changed.add(relpath)
+
+                if mask & self.IN_ISDIR and mask & (self.IN_CREATE | self.IN_MOVED_TO):
+                    if not name.startswith('.'):
+                        changed |= self._watch_tree(relpath)
+
+    def wait(self, timeout: Optional[float] = None) -> Set[str]:
+        """Block until some files change, returning their relative paths.
+
+        Returns an empty set if nothing changed before the timeout. If the
+        kernel's event queue overflowed, the set contains :data:`RESCAN`.
+
+        """
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return set()
+        changed = self._read_events()
+        # editors often save in several steps; gather them into one batch
+        while select.select([self._fd], [], [], self.SETTLE_TIME)[0]:
+            changed |= self._read_events()
+        return changed
+
+    def close(self):
+        os.close(self._fd)
+
+
+def make_watcher(root, poll: bool = False, interval: float = 0.5):
+    """An inotify watcher if possible, otherwise a polling watcher."""
+    if not poll and sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(root)
+        except (OSError, AttributeError):
+            # no inotify, e.g. because libc lacks it or the limit is reached
+            pass
+    return PollingWatcher(root, interval)
+
+
+def watch(network: Network, watcher, report=print, iterations: Optional[int] = None):
+    """Re-check the network whenever its files change, reporting differences.
+
+    Every failure is reported at the start. Afterwards, each new failure is
+    reported prefixed with ``+`` and each resolved failure with ``-``. If
+    `iterations` is given, stop after that many batches of changes.
+
+    """
+    checker = IncrementalChecker(network)
+    failures = checker.check()
+    for failure in failures:
+        report(str(failure))
+
+    batches = 0
+    while iterations is None or batches < iterations:
+        relpaths = watcher.wait()
+        if not relpaths:
+            continue
+
+        batches += 1
+        if RESCAN in relpaths:
+            network.refresh()
+            new_failures = checker.check()
+        else:
+            changed_keys = network.reload(relpaths)
+            if not changed_keys:
+                continue
+            new_failures = checker.check({get_key_type(key) for key in changed_keys})
+
+        previous = set(failures)
+        current = set(new_failures)
+        for failure in new_failures:
+            if failure not in previous:
+                report(f'+ {failure}')
+        for failure in failures:
+            if failure not in current:
+                report(f'- {failure}')
+        failures = new_failures
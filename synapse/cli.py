@@ -1,62 +1,441 @@
 import argparse
+import os
 import pathlib
+import sys
+import time
 
+from . import _report
 from ._network import Network, NetworkKeyError
-from . import draw
+from .exceptions import DaemonError, GitError
+from ._tree import ASSET_DIRECTORIES
+from .util import NOTE_TYPES
+
+
+DAEMON_START_TIMEOUT = 60
+
+
+def _network(args):
+    # set when the command is served by a daemon holding a warm network
+    network = getattr(args, 'network', None)
+    if network is not None:
+        return network
+    return Network(args.workdir, cache=args.cache, jobs=args.jobs, backend=args.backend)
 
 
 def cmd_check(args):
-    network = Network(args.workdir)
-    failures = network.check()
-    for failure in failures:
-        print(failure)
+    network = _network(args)
+
+    profiler = None
+    if args.profile_output is not None:
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    scope = None
+    if args.since is not None:
+        try:
+            scope = network.affected_since(args.since)
+        except GitError as exc:
+            raise SystemExit(f'Cannot check since "{args.since}": {exc}')
+
+    # failures are written as they are found, rather than all at the end
+    writer = _report.WRITERS[args.format](sys.stdout, root=network.root)
+    _, profile = network.check(profile=True, report=writer.write, scope=scope)
+    writer.close()
+
+    if profiler is not None:
+        profiler.disable()
+        profiler.dump_stats(args.profile_output)
+
+    if args.profile:
+        print(profile.format(), file=sys.stderr)
 
 
 def cmd_draw(args):
-    network = Network(args.workdir)
-    draw.topic_graph(network)
+    # networkx and matplotlib are slow to import, so only do so when drawing
+    from . import draw
+
+    network = _network(args)
+    draw.draw(
+        network, args.type or ['topic'], output=args.output, near=args.near,
+        hops=args.hops, component=args.component, relayout=args.relayout
+    )
 
 
 def cmd_fix_bidirectional_links(args):
-    network = Network(args.workdir)
-    network.fix_bidirectional_links()
+    network = _network(args)
+    plan = network.fix_bidirectional_links(dry_run=args.dry_run)
+    if args.dry_run:
+        for key, links in plan.items():
+            for link in links:
+                print(f'{network[key].path} -- add [[{link}]]')
+
+
+def _read_rekey_mapping(path):
+    """Read tab-separated old and new keys, one pair per line."""
+    mapping = {}
+    with open(path) as fileobj:
+        for number, line in enumerate(fileobj, 1):
+            line = line.rstrip('\n')
+            if not line.strip() or line.startswith('#'):
+                continue
+            try:
+                old_key, new_key = line.split('\t')
+            except ValueError:
+                raise SystemExit(
+                    f'{path}:{number}: expected an old and a new key separated by a tab.'
+                ) from None
+            if old_key in mapping:
+                raise SystemExit(f'{path}:{number}: "{old_key}" is rekeyed more than once.')
+            mapping[old_key] = new_key
+    return mapping
 
 
 def cmd_rekey(args):
-    network = Network(args.workdir)
-    network[args.src].rekey(args.dst)
+    network = _network(args)
+    if args.from_file is not None:
+        if args.src is not None:
+            raise SystemExit('Give either src and dst or --from-file, not both.')
+        network.rekey_many(_read_rekey_mapping(args.from_file))
+    elif args.src is None or args.dst is None:
+        raise SystemExit('Both src and dst are required.')
+    else:
+        network[args.src].rekey(args.dst)
 
 
 def cmd_link(args):
-    network = Network(args.workdir)
+    network = _network(args)
     network[args.u].add_link(args.v)
 
 
-def main():
+def cmd_search(args):
+    network = _network(args)
+    results = network.search(
+        ' '.join(args.query), types=args.type, near=args.near, hops=args.hops,
+        limit=args.limit
+    )
+    for key, score in results:
+        print(f'{score:8.3f}  {key}')
+
+
+def cmd_path(args):
+    network = _network(args)
+    path = network.shortest_path(args.u, args.v, directed=args.directed)
+    if path is None:
+        raise SystemExit(f'No path from "{args.u}" to "{args.v}".')
+    for key in path:
+        print(key)
+
+
+def cmd_neighborhood(args):
+    network = _network(args)
+    for key in sorted(network.neighborhood(args.key, args.hops, args.type)):
+        print(key)
+
+
+def cmd_subgraph(args):
+    network = _network(args)
+    for u, vs in network.subgraph(args.keys).items():
+        for v in vs:
+            print(f'{u}\t{v}')
+
+
+def cmd_orphans(args):
+    network = _network(args)
+    for key in network.orphans(args.type):
+        print(key)
+
+
+def cmd_sinks(args):
+    network = _network(args)
+    for key in network.sinks(args.type):
+        print(key)
+
+
+def cmd_rank(args):
+    network = _network(args)
+    results = network.rank(args.method, types=args.type, limit=args.limit, samples=args.samples)
+    for key, score in results:
+        print(f'{score:12.6g}  {key}')
+
+
+def cmd_export(args):
+    network = _network(args)
+    try:
+        if args.output is None:
+            network.export(sys.stdout, args.format)
+            sys.stdout.flush()
+        else:
+            with open(args.output, 'w', newline='') as fileobj:
+                network.export(fileobj, args.format)
+    except BrokenPipeError:
+        # the reader, such as head, stopped early; silence the final flush
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+
+
+def cmd_watch(args):
+    from ._watch import make_watcher, watch
+
+    network = _network(args)
+    watcher = make_watcher(network.root, poll=args.poll, interval=args.interval)
+    try:
+        watch(network, watcher, report=lambda line: print(line, flush=True))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
+
+
+def cmd_daemon(args):
+    from . import _daemon
+    from ._watch import make_watcher
+
+    if args.action == 'status':
+        running = _daemon.is_running(args.workdir)
+        print('running' if running else 'not running')
+        sys.exit(0 if running else 1)
+
+    if args.action == 'stop':
+        if not _daemon.shutdown(args.workdir):
+            raise SystemExit('No daemon is running.')
+        return
+
+    if _daemon.is_running(args.workdir):
+        raise SystemExit('A daemon is already running.')
+
+    if not args.foreground and not _daemon.daemonize():
+        # in the parent: wait until the child is ready to serve
+        deadline = time.monotonic() + DAEMON_START_TIMEOUT
+        while not _daemon.is_running(args.workdir):
+            if time.monotonic() > deadline:
+                raise SystemExit('The daemon did not start.')
+            time.sleep(0.05)
+        return
+
+    # the daemon changes into the directory of each client, where a
+    # relative workdir would no longer point at the network
+    args.workdir = pathlib.Path(args.workdir).resolve()
+    network = _network(args)
+    network.snapshot()
+    watcher = make_watcher(network.root)
+    server = _daemon.Server(network, _make_parser(), watcher)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
+
+
+def _add_type_argument(parser, choices):
+    parser.add_argument(
+        '--type', action='append', choices=choices,
+        help='Only show nodes of this type; may be repeated.'
+    )
+
+
+def _make_parser():
     parser = argparse.ArgumentParser()
     parser.add_argument('--workdir', default=pathlib.Path.cwd())
+    parser.add_argument(
+        '--cache', action='store_true',
+        help='Persist extracted links and the search index in .synapse between runs.'
+    )
+    parser.add_argument(
+        '--backend', choices=Network.BACKENDS, default='memory',
+        help='Where to keep the link index; sqlite persists it in .synapse/index.sqlite.'
+    )
+    parser.add_argument(
+        '--jobs', '-j', type=int, default=None, metavar='N',
+        help='Read notes using N threads at once.'
+    )
+    parser.add_argument(
+        '--no-daemon', action='store_true',
+        help='Do not use a running daemon, even if there is one.'
+    )
 
     subparsers = parser.add_subparsers()
 
     check_parser = subparsers.add_parser('check')
-    check_parser.set_defaults(cmd=cmd_check)
+    check_parser.add_argument(
+        '--profile', action='store_true',
+        help='Print the time taken by each check and the I/O performed.'
+    )
+    check_parser.add_argument(
+        '--profile-output', metavar='FILE',
+        help='Write cProfile statistics, readable with pstats, to FILE.'
+    )
+    check_parser.add_argument(
+        '--format', choices=list(_report.WRITERS), default='text',
+        help='Write failures as text, as JSON objects one per line, or as a SARIF log.'
+    )
+    check_parser.add_argument(
+        '--since', metavar='REV',
+        help='Only report failures concerning the files changed since the git '
+             'revision REV, and the nodes they link to or from.'
+    )
+    check_parser.set_defaults(cmd=cmd_check, daemon_can_serve=True)
 
     draw_parser = subparsers.add_parser('draw')
+    draw_parser.add_argument(
+        '--output', '-o', metavar='FILE',
+        help='Write the drawing to FILE, e.g. graph.svg or graph.png, instead of showing it.'
+    )
+    _add_type_argument(draw_parser, sorted(NOTE_TYPES | ASSET_DIRECTORIES))
+    draw_parser.add_argument(
+        '--near', metavar='KEY',
+        help='Only draw nodes within --hops links of KEY.'
+    )
+    draw_parser.add_argument(
+        '--hops', type=int, default=1, metavar='K',
+        help='How many links away from --near to draw (default: %(default)s).'
+    )
+    draw_parser.add_argument(
+        '--component', metavar='KEY',
+        help='Only draw the connected component containing KEY.'
+    )
+    draw_parser.add_argument(
+        '--relayout', action='store_true',
+        help='Lay the graph out from scratch instead of reusing .synapse/layout.json.'
+    )
     draw_parser.set_defaults(cmd=cmd_draw)
 
     fix_parser = subparsers.add_parser('fix-bidirectional-links')
-    fix_parser.set_defaults(cmd=cmd_fix_bidirectional_links)
+    fix_parser.add_argument(
+        '--dry-run', action='store_true',
+        help='Print the links that would be added without writing anything.'
+    )
+    fix_parser.set_defaults(cmd=cmd_fix_bidirectional_links, daemon_can_serve=True)
 
     rekey_parser = subparsers.add_parser('rekey')
-    rekey_parser.add_argument('src')
-    rekey_parser.add_argument('dst')
-    rekey_parser.set_defaults(cmd=cmd_rekey)
+    rekey_parser.add_argument('src', nargs='?')
+    rekey_parser.add_argument('dst', nargs='?')
+    rekey_parser.add_argument(
+        '--from-file', metavar='FILE',
+        help='Rekey many nodes at once; FILE has an old and new key per line, tab-separated.'
+    )
+    rekey_parser.set_defaults(cmd=cmd_rekey, daemon_can_serve=True)
 
     link_parser = subparsers.add_parser('link')
     link_parser.add_argument('u')
     link_parser.add_argument('v')
-    link_parser.set_defaults(cmd=cmd_link)
+    link_parser.set_defaults(cmd=cmd_link, daemon_can_serve=True)
+
+    search_parser = subparsers.add_parser('search')
+    search_parser.add_argument('query', nargs='+')
+    _add_type_argument(search_parser, sorted(NOTE_TYPES))
+    search_parser.add_argument(
+        '--near', metavar='KEY',
+        help='Only find notes within --hops links of KEY.'
+    )
+    search_parser.add_argument(
+        '--hops', type=int, default=1, metavar='K',
+        help='How many links away from --near to look (default: %(default)s).'
+    )
+    search_parser.add_argument(
+        '--limit', type=int, default=10, metavar='N',
+        help='Show at most N results (default: %(default)s).'
+    )
+    search_parser.set_defaults(cmd=cmd_search, daemon_can_serve=True)
+
+    path_parser = subparsers.add_parser('path')
+    path_parser.add_argument('u')
+    path_parser.add_argument('v')
+    path_parser.add_argument(
+        '--directed', action='store_true',
+        help='Only follow links in the direction they were made.'
+    )
+    path_parser.set_defaults(cmd=cmd_path, daemon_can_serve=True)
+
+    neighborhood_parser = subparsers.add_parser('neighborhood')
+    neighborhood_parser.add_argument('key')
+    neighborhood_parser.add_argument(
+        '--hops', type=int, default=1, metavar='K',
+        help='How many links away to look (default: %(default)s).'
+    )
+    _add_type_argument(neighborhood_parser, sorted(NOTE_TYPES | ASSET_DIRECTORIES))
+    neighborhood_parser.set_defaults(cmd=cmd_neighborhood, daemon_can_serve=True)
+
+    subgraph_parser = subparsers.add_parser('subgraph')
+    subgraph_parser.add_argument('keys', nargs='+')
+    subgraph_parser.set_defaults(cmd=cmd_subgraph, daemon_can_serve=True)
+
+    orphans_parser = subparsers.add_parser('orphans')
+    _add_type_argument(orphans_parser, sorted(NOTE_TYPES | ASSET_DIRECTORIES))
+    orphans_parser.set_defaults(cmd=cmd_orphans, daemon_can_serve=True)
+
+    sinks_parser = subparsers.add_parser('sinks')
+    _add_type_argument(sinks_parser, sorted(NOTE_TYPES | ASSET_DIRECTORIES))
+    sinks_parser.set_defaults(cmd=cmd_sinks, daemon_can_serve=True)
+
+    rank_parser = subparsers.add_parser('rank')
+    rank_parser.add_argument(
+        '--method', choices=['pagerank', 'degree', 'betweenness'], default='pagerank',
+        help='How to score nodes (default: %(default)s).'
+    )
+    _add_type_argument(rank_parser, sorted(NOTE_TYPES | ASSET_DIRECTORIES))
+    rank_parser.add_argument(
+        '--limit', type=int, default=20, metavar='N',
+        help='Show at most N nodes (default: %(default)s).'
+    )
+    rank_parser.add_argument(
+        '--samples', type=int, default=32, metavar='N',
+        help='Estimate betweenness from N source nodes (default: %(default)s).'
+    )
+    rank_parser.set_defaults(cmd=cmd_rank, daemon_can_serve=True)
+
+    export_parser = subparsers.add_parser('export')
+    export_parser.add_argument(
+        '--format', choices=['jsonl', 'graphml', 'dot', 'csv'], default='jsonl',
+        help='Output format (default: %(default)s).'
+    )
+    export_parser.add_argument(
+        '--output', '-o', metavar='FILE',
+        help='Write to FILE instead of standard output.'
+    )
+    # not served by the daemon, whose replies are not streamed
+    export_parser.set_defaults(cmd=cmd_export)
+
+    watch_parser = subparsers.add_parser('watch')
+    watch_parser.add_argument(
+        '--poll', action='store_true',
+        help='Poll for changes instead of using inotify.'
+    )
+    watch_parser.add_argument(
+        '--interval', type=float, default=0.5, metavar='SECONDS',
+        help='Time between polls (default: %(default)s).'
+    )
+    watch_parser.set_defaults(cmd=cmd_watch)
+
+    daemon_parser = subparsers.add_parser('daemon')
+    daemon_parser.add_argument('action', choices=['start', 'stop', 'status'])
+    daemon_parser.add_argument(
+        '--foreground', action='store_true',
+        help='Serve from this process instead of forking into the background.'
+    )
+    daemon_parser.set_defaults(cmd=cmd_daemon)
+
+    return parser
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+
+    parser = _make_parser()
+    args = parser.parse_args(argv)
 
-    args = parser.parse_args()
+    try:
+        if getattr(args, 'daemon_can_serve', False) and not args.no_daemon:
+            from . import _daemon
+            response = _daemon.request(args.workdir, argv)
+            if response is not None:
+                sys.stdout.write(response['stdout'])
+                sys.stderr.write(response['stderr'])
+                sys.exit(response['exit'])
 
-    args.cmd(args)
+        args.cmd(args)
+    except DaemonError as exc:
+        raise SystemExit(str(exc))
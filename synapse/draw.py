@@ -1,16 +1,186 @@
+import json
+import math
+import pathlib
+import random
+from typing import Collection, Dict, Optional, Tuple
+
 import networkx as nx
-import matplotlib.pyplot as plt
 
+from .exceptions import NetworkKeyError
+from .util import atomic_write
+
+
+LAYOUT_PATH = pathlib.Path('.synapse') / 'layout.json'
+
+LAYOUT_VERSION = 1
+
+# iterations of the spring layout used to place nodes
+ITERATIONS = 50
+
+# larger graphs are drawn without labels, which would be unreadable
+LABEL_LIMIT = 500
+
+Position = Tuple[float, float]
+
+
+def load_layout(path) -> Dict[str, Position]:
+    """Read cached node positions, returning none if the file is unusable."""
+    try:
+        with open(path) as fileobj:
+            data = json.load(fileobj)
+        if data['version'] != LAYOUT_VERSION:
+            raise ValueError('Stale layout version.')
+        return {key: (float(x), float(y)) for key, (x, y) in data['positions'].items()}
+    except (OSError, ValueError, KeyError, TypeError):
+        return {}
+
+
+def save_layout(path, positions: Dict[str, Position]):
+    """Write node positions so that later drawings can reuse them."""
+    path = pathlib.Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    data = {
+        'version': LAYOUT_VERSION,
+        'positions': {key: [x, y] for key, (x, y) in positions.items()},
+    }
+    atomic_write(path, json.dumps(data))
+
+
+def select(
+        network,
+        types: Collection[str] = ('topic',),
+        near: Optional[str] = None,
+        hops: int = 1,
+        component: Optional[str] = None
+        ) -> nx.Graph:
+    """The nodes of the given types and the links among them, as a graph.
+
+    The edges are taken from the network's snapshot. If `near` is given,
+    only nodes within `hops` links of it are kept; if `component` is given,
+    only the connected component containing it. Either key must be of one
+    of the given types.
+
+    """
+    adjacency = network.snapshot().adjacency_of(types)
+    ids = range(len(adjacency))
+    start_key = near if near is not None else component
+    if start_key is not None:
+        if start_key not in network:
+            raise NetworkKeyError(start_key)
+        start = adjacency.ids.get(start_key)
+        if start is None:
+            raise ValueError(f'"{start_key}" is not of a type being drawn.')
+        ids = adjacency.bfs(start, hops if near is not None else None)
+
+    kept = set(ids)
+    graph = nx.Graph()
+    graph.add_nodes_from(adjacency.keys[i] for i in sorted(kept))
+    graph.add_edges_from(
+        (adjacency.keys[i], adjacency.keys[j])
+        for i in kept for j in adjacency.successors(i) if j in kept and j != i
+    )
+    return graph
+
+
+def layout(graph: nx.Graph, cached: Dict[str, Position], seed: int = 0) -> Dict[str, Position]:
+    """Positions for every node of the graph, reusing the cached ones.
+
+    Nodes with a cached position stay where they are, so a drawing changes
+    little after a small edit; only new nodes are placed, starting beside
+    their placed neighbours. If no node has a cached position, the graph is
+    laid out from scratch.
+
+    """
+    known = {key: cached[key] for key in graph if key in cached}
+    if len(known) == len(graph):
+        return known
+
+    if not known:
+        positions = nx.spring_layout(graph, iterations=ITERATIONS, seed=seed)
+        return {key: (float(x), float(y)) for key, (x, y) in positions.items()}
+
+    rng = random.Random(seed)
+    xs = [x for x, _ in known.values()]
+    ys = [y for _, y in known.values()]
+    spread = max(max(xs) - min(xs), max(ys) - min(ys), 1.0) / math.sqrt(len(graph))
+
+    initial = dict(known)
+    for key in graph:
+        if key in known:
+            continue
+        placed = [known[other] for other in graph[key] if other in known]
+        if placed:
+            x = sum(p[0] for p in placed) / len(placed)
+            y = sum(p[1] for p in placed) / len(placed)
+        else:
+            x, y = rng.uniform(min(xs), max(xs)), rng.uniform(min(ys), max(ys))
+        initial[key] = (x + rng.uniform(-spread, spread), y + rng.uniform(-spread, spread))
+
+    positions = nx.spring_layout(
+        graph, pos=initial, fixed=list(known), iterations=ITERATIONS, seed=seed
+    )
+    return {key: (float(x), float(y)) for key, (x, y) in positions.items()}
+
+
+def render(graph: nx.Graph, positions: Dict[str, Position], output=None):
+    """Draw the graph to a file, or in a window if `output` is None.
+
+    The format of the file, such as SVG or PNG, is given by its extension.
+    Files are drawn on a figure of their own, without pyplot, so no
+    interactive backend or display is needed.
+
+    """
+    labels = len(graph) <= LABEL_LIMIT
+    node_size = 300 if labels else 20
+
+    if output is None:
+        import matplotlib.pyplot as plt
+
+        nx.draw_networkx(graph, positions, with_labels=labels, node_size=node_size)
+        plt.show()
+        return
+
+    from matplotlib.figure import Figure
+
+    size = min(100.0, max(8.0, math.sqrt(len(graph))))
+    figure = Figure(figsize=(size, size))
+    axes = figure.add_subplot()
+    axes.set_axis_off()
+    nx.draw_networkx(
+        graph, positions, ax=axes, with_labels=labels, node_size=node_size
+    )
+    figure.savefig(output, bbox_inches='tight')
+
+
+def draw(
+        network,
+        types: Collection[str] = ('topic',),
+        output=None,
+        near: Optional[str] = None,
+        hops: int = 1,
+        component: Optional[str] = None,
+        relayout: bool = False
+        ):
+    """Draw the graph of nodes of the given types, caching the layout.
+
+    Positions are cached in ``.synapse/layout.json`` in the network's root;
+    see :func:`layout`. If `relayout` is true, the cache is ignored. The
+    nodes drawn can be restricted as in :func:`select`.
+
+    """
+    path = network.root / LAYOUT_PATH
+    cached = {} if relayout else load_layout(path)
+    graph = select(network, types, near=near, hops=hops, component=component)
+    positions = layout(graph, cached)
 
-def topic_graph(network):
-    g = nx.Graph()
+    # keep the positions of nodes not drawn this time, unless they are gone
+    snapshot = network.snapshot()
+    cached.update(positions)
+    save_layout(path, {key: xy for key, xy in cached.items() if key in snapshot})
 
-    for topic in network.topics:
-        g.add_node(topic.key)
+    render(graph, positions, output)
 
-        linked_topics = [n for n in topic.successors if n.type == 'topic']
-        for neighbor in linked_topics:
-            g.add_edge(topic.key, neighbor.key)
 
-    nx.draw_networkx(g, with_labels=True)
-    plt.show()
+def topic_graph(network, **kwargs):
+    """Draw the graph of topics; see :func:`draw`."""
+    draw(network, ('topic',), **kwargs)
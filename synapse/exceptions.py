@@ -4,3 +4,11 @@ class Error(Exception):
 
 class NetworkKeyError(Error):
     """The key does not exist."""
+
+
+class GitError(Error):
+    """A git command failed, or git could not be run."""
+
+
+class DaemonError(Error):
+    """The daemon could not be used safely, or did not reply."""
@@ -1,4 +1,15 @@
 import collections
+import os
+import pathlib
+import stat
+
+
+NOTE_TYPES = {'topic', 'project', 'thought', 'journal'}
+
+# files being written are staged beside their destination under these
+# suffixes; they are never nodes, even if left behind by a crash
+STAGED_SUFFIX = '.synapse-tmp'
+REKEY_SUFFIX = '.synapse-rekey'
 
 
 def get_key_parts(k):
@@ -8,3 +19,63 @@ def get_key_parts(k):
         return KeyParts(*parts)
     else:
         return KeyParts('topic', k)
+
+
+def get_key_type(k):
+    parts = k.split(':')
+    if len(parts) > 1:
+        return parts[0]
+    else:
+        return 'topic'
+
+
+def get_relative_path(k):
+    """The path of the node with key `k`, relative to the network's root."""
+    path = k.replace(':', '/')
+    if pathlib.PurePosixPath(path).suffix == '' and (get_key_type(k) in NOTE_TYPES):
+        path += '.md'
+    return path
+
+
+def stage_write(path, contents):
+    """Write contents to a temporary file beside path, returning its path.
+
+    Moving the temporary file over the real path of path, with symlinks
+    resolved, completes the write atomically; see :func:`atomic_write`.
+    The temporary file gets the permissions of the file it is to replace.
+
+    """
+    path = pathlib.Path(os.path.realpath(path))
+    tmp_path = path.with_name(f'.{path.name}{STAGED_SUFFIX}')
+    try:
+        mode = stat.S_IMODE(os.stat(path).st_mode)
+    except FileNotFoundError:
+        mode = None
+    with tmp_path.open('w') as fileobj:
+        if mode is not None:
+            # before writing, so the contents are never more exposed
+            os.chmod(fileobj.fileno(), mode)
+        fileobj.write(contents)
+        fileobj.flush()
+        os.fsync(fileobj.fileno())
+    return tmp_path
+
+
+def atomic_write(path, contents):
+    """Replace the contents of the file at path, never leaving it half-written.
+
+    If path is a symlink, the file it points to is written, and the link
+    itself left in place.
+
+    """
+    os.replace(stage_write(path, contents), os.path.realpath(path))
+
+
+def is_node_name(name: str) -> bool:
+    """Whether a file or directory with this name can hold a node.
+
+    Hidden files, such as editors' swap files, and files staged by synapse
+    itself are not nodes.
+
+    """
+    return not name.startswith('.') and not name.endswith((STAGED_SUFFIX, REKEY_SUFFIX))
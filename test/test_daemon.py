@@ -0,0 +1,223 @@
+import argparse
+import os
+import socket
+import stat
+import threading
+
+import pytest
+
+import synapse
+from synapse import _daemon
+from synapse._watch import PollingWatcher
+from synapse.exceptions import DaemonError
+
+
+def _make_parser():
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers()
+
+    def cmd_check(args):
+        for failure in args.network.check():
+            print(failure)
+
+    def cmd_link(args):
+        args.network[args.u].add_link(args.v)
+
+    check_parser = subparsers.add_parser('check')
+    check_parser.set_defaults(cmd=cmd_check, daemon_can_serve=True)
+    link_parser = subparsers.add_parser('link')
+    link_parser.add_argument('u')
+    link_parser.add_argument('v')
+    link_parser.set_defaults(cmd=cmd_link, daemon_can_serve=True)
+    return parser
+
+
+@pytest.fixture
+def server(example):
+    network = synapse.Network(example.path)
+    server = _daemon.Server(network, _make_parser(), PollingWatcher(example.path))
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    while not _daemon.is_running(example.path):
+        pass
+    yield server
+    _daemon.shutdown(example.path)
+    thread.join()
+
+
+def test_request_returns_none_without_daemon(example):
+    assert _daemon.request(example.path, ['check']) is None
+    assert not _daemon.is_running(example.path)
+
+
+def test_daemon_serves_commands_from_warm_network(example, server):
+    # given
+    example.make_note('foo')
+    example.make_note('thought:bar', """
+        [[foo]]
+    """)
+
+    # when
+    before = _daemon.request(example.path, ['check'])
+    _daemon.request(example.path, ['link', 'foo', 'thought:bar'])
+    after = _daemon.request(example.path, ['check'])
+
+    # then
+    assert before['exit'] == 0
+    assert 'but not back' in before['stdout']
+    assert after == {'stdout': '', 'stderr': '', 'exit': 0}
+    assert '[[thought:bar]]' in (example.path / 'foo.md').read_text()
+
+
+def test_daemon_sees_edits_made_outside_synapse(example, server):
+    # given
+    example.make_note('foo')
+    assert _daemon.request(example.path, ['check'])['stdout'] == ''
+
+    # when
+    example.make_note('project:bar')
+    response = _daemon.request(example.path, ['check'])
+
+    # then
+    assert 'No topics linked' in response['stdout']
+
+
+def test_daemon_reports_errors_with_exit_status(example, server):
+    # when
+    response = _daemon.request(example.path, ['link', 'missing', 'also missing'])
+
+    # then
+    assert response['exit'] == 1
+    assert 'NetworkKeyError' in response['stderr']
+
+
+def test_long_workdirs_use_a_socket_in_the_runtime_dir(example, tmp_path, monkeypatch):
+    # given
+    workdir = example.path / ('x' * 100)
+    workdir.mkdir()
+    monkeypatch.setenv('XDG_RUNTIME_DIR', str(tmp_path))
+
+    # when
+    path = _daemon.socket_path(workdir)
+
+    # then
+    assert path.parent == tmp_path / 'synapse'
+    assert len(os.fsencode(path)) <= _daemon.MAX_SOCKET_PATH
+
+
+def test_private_dir_is_created_for_the_user_only(tmp_path):
+    # given
+    directory = tmp_path / 'synapse'
+
+    # when
+    _daemon.make_private_dir(directory)
+    _daemon.make_private_dir(directory)
+
+    # then
+    assert stat.S_IMODE(directory.stat().st_mode) == 0o700
+
+
+def test_private_dir_refuses_a_directory_others_can_write_to(tmp_path):
+    # given
+    directory = tmp_path / 'synapse'
+    directory.mkdir()
+    directory.chmod(0o777)
+
+    # then
+    with pytest.raises(DaemonError):
+        _daemon.make_private_dir(directory)
+
+
+def test_daemon_socket_is_private(example, server):
+    assert stat.S_IMODE(server.path.stat().st_mode) == 0o600
+
+
+def test_request_refuses_a_socket_of_another_user(example, server, monkeypatch):
+    # given
+    uid = os.getuid()
+    monkeypatch.setattr(os, 'getuid', lambda: uid + 1)
+
+    # then
+    with pytest.raises(DaemonError):
+        _daemon.request(example.path, ['check'])
+
+
+@pytest.fixture
+def broken_daemon(example):
+    """A socket where the daemon would be, which reads one request and
+    closes the connection without a reply once told to."""
+    path = _daemon.socket_path(example.path)
+    path.parent.mkdir()
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(os.fspath(path))
+    listener.listen()
+    close = threading.Event()
+
+    def accept_then_close():
+        connection, _ = listener.accept()
+        while connection.recv(65536):
+            pass
+        close.wait(timeout=5)
+        connection.close()
+
+    thread = threading.Thread(target=accept_then_close)
+    thread.start()
+    yield close
+    close.set()
+    thread.join()
+    listener.close()
+
+
+def test_request_fails_clearly_if_the_daemon_dies(example, broken_daemon):
+    # given
+    broken_daemon.set()
+
+    # then
+    with pytest.raises(DaemonError, match='without a reply'):
+        _daemon.request(example.path, ['check'])
+
+
+def test_request_fails_clearly_if_the_daemon_hangs(example, broken_daemon, monkeypatch):
+    # given
+    monkeypatch.setattr(_daemon, 'REQUEST_TIMEOUT', 0.1)
+
+    # then
+    with pytest.raises(DaemonError, match='did not reply'):
+        _daemon.request(example.path, ['check'])
+
+
+def test_daemon_started_with_a_relative_workdir_serves_other_directories(example, monkeypatch):
+    # given
+    from synapse import cli
+    example.make_note('foo')
+    example.make_note('thought:new')
+    monkeypatch.chdir(example.path.parent)
+    argv = ['--workdir', example.path.name, 'daemon', 'start', '--foreground']
+    thread = threading.Thread(target=cli.main, args=(argv,))
+    thread.start()
+    try:
+        while not _daemon.is_running(example.path):
+            pass
+
+        # when
+        monkeypatch.chdir(example.path)
+        response = _daemon.request(example.path, ['link', 'thought:new', 'foo'])
+    finally:
+        _daemon.shutdown(example.path)
+        thread.join()
+
+    # then
+    assert response['exit'] == 0, response['stderr']
+    assert '[[foo]]' in (example.path / 'thought' / 'new.md').read_text()
+
+
+@pytest.mark.parametrize('data', [b'', b'not json', b'[]', b'{}', b'{"argv": "check"}'])
+def test_daemon_survives_bad_requests(example, server, data):
+    # given
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(os.fspath(server.path))
+        sock.sendall(data)
+
+    # then
+    assert _daemon.is_running(example.path)
+    assert _daemon.request(example.path, ['check'])['exit'] == 0
@@ -0,0 +1,74 @@
+import json
+
+import pytest
+
+import synapse
+
+pytest.importorskip('networkx')
+pytest.importorskip('matplotlib')
+
+from synapse import draw
+
+
+def _topics(example):
+    example.make_note('a', """
+        [[b]]
+    """)
+    example.make_note('b', """
+        [[a]]
+        [[c]]
+    """)
+    example.make_note('c', """
+        [[b]]
+    """)
+    example.make_note('d')
+
+
+def test_draw_writes_file_and_caches_layout(example, tmp_path_factory):
+    # given
+    _topics(example)
+    network = synapse.Network(example.path)
+    output = tmp_path_factory.mktemp('output') / 'graph.svg'
+
+    # when
+    draw.topic_graph(network, output=output)
+
+    # then
+    assert output.read_text().lstrip().startswith('<?xml')
+    with (example.path / '.synapse' / 'layout.json').open() as fileobj:
+        positions = json.load(fileobj)['positions']
+    assert set(positions) == {'a', 'b', 'c', 'd'}
+
+
+def test_cached_positions_are_kept_when_nodes_are_added(example, tmp_path_factory):
+    # given
+    _topics(example)
+    output_directory = tmp_path_factory.mktemp('output')
+    draw.topic_graph(synapse.Network(example.path), output=output_directory / 'before.png')
+    before = draw.load_layout(example.path / '.synapse' / 'layout.json')
+
+    # when
+    example.make_note('e', """
+        [[a]]
+    """)
+    draw.topic_graph(synapse.Network(example.path), output=output_directory / 'after.png')
+
+    # then
+    after = draw.load_layout(example.path / '.synapse' / 'layout.json')
+    assert set(after) == {'a', 'b', 'c', 'd', 'e'}
+    assert all(after[key] == pytest.approx(before[key]) for key in before)
+
+
+def test_select_restricts_to_neighborhood_and_component(example):
+    # given
+    _topics(example)
+    network = synapse.Network(example.path)
+
+    # when
+    near = draw.select(network, near='a', hops=1)
+    component = draw.select(network, component='a')
+
+    # then
+    assert set(near) == {'a', 'b'}
+    assert {frozenset(edge) for edge in near.edges} == {frozenset(['a', 'b'])}
+    assert set(component) == {'a', 'b', 'c'}
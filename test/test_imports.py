@@ -0,0 +1,54 @@
+import os
+import pathlib
+import re
+import subprocess
+import sys
+import time
+
+
+ROOT = pathlib.Path(__file__).parent.parent
+
+# generous, so as not to be flaky on slow machines; override to tighten
+IMPORT_BUDGET = float(os.environ.get('SYNAPSE_IMPORT_BUDGET', '0.3'))
+CHECK_BUDGET = float(os.environ.get('SYNAPSE_CHECK_BUDGET', '1.0'))
+
+HEAVY_MODULES = [
+    'networkx', 'matplotlib', 'numpy', 'scipy', 'concurrent.futures', 'cProfile',
+    'xml.sax', 'urllib.request', 'subprocess', 'random',
+    'synapse.draw', 'synapse._watch', 'synapse._daemon', 'synapse._export',
+    'synapse._git', 'synapse._rank',
+]
+
+
+def _python(*args):
+    return subprocess.run(
+        [sys.executable, *args], cwd=ROOT, capture_output=True, text=True, check=True
+    )
+
+
+def test_cli_does_not_import_heavy_modules():
+    code = (
+        'import sys, synapse.cli; '
+        f'print([m for m in {HEAVY_MODULES!r} if m in sys.modules])'
+    )
+    assert _python('-c', code).stdout.strip() == '[]'
+
+
+def test_import_time_is_within_budget():
+    result = _python('-X', 'importtime', '-c', 'import synapse.cli')
+    times = {}
+    for line in result.stderr.splitlines():
+        match = re.match(r'import time:\s+\d+ \|\s+(\d+) \|\s+(\S+)', line)
+        if match:
+            times[match.group(2)] = int(match.group(1)) / 1e6
+
+    assert times['synapse.cli'] < IMPORT_BUDGET
+
+
+def test_check_startup_is_within_budget(example):
+    example.make_note('foo')
+    code = f'from synapse.cli import main; main(["--workdir", {str(example.path)!r}, "check"])'
+
+    start = time.perf_counter()
+    _python('-c', code)
+    assert time.perf_counter() - start < CHECK_BUDGET
@@ -1,3 +1,5 @@
+import json
+
 import pytest
 
 import synapse
@@ -179,7 +181,7 @@ def test_fails_if_link_between_notes_is_not_bidirectional(example):
     failures = network.check()
 
     assert len(failures) == 1
-    assert 'but not back' in failures[0]
+    assert 'but not back' in failures[0].message
 
 
 def test_fails_if_project_does_not_link_to_topic(example):
@@ -267,7 +269,7 @@ def test_fails_if_image_has_no_predecessor(example):
     failures = network.check()
 
     assert len(failures) == 1
-    assert 'predecessor' in failures[0]
+    assert 'predecessor' in failures[0].message
 
 def test_allows_image_keys_to_have_slashes(example):
     # given
@@ -292,7 +294,7 @@ def test_fails_if_file_has_no_predecessor(example):
     failures = network.check()
 
     assert len(failures) == 1
-    assert 'predecessor' in failures[0]
+    assert 'predecessor' in failures[0].message
 
 
 def test_allows_file_keys_to_have_slashes(example):
@@ -319,7 +321,7 @@ def test_fails_if_raw_has_no_predecessor(example):
     failures = network.check()
 
     assert len(failures) == 1
-    assert 'predecessor' in failures[0]
+    assert 'predecessor' in failures[0].message
 
 def test_allows_raw_keys_to_have_slashes(example):
     # given
@@ -352,7 +354,7 @@ def test_fails_if_topics_are_disconnected(example):
     failures = network.check()
 
     assert len(failures) == 1
-    assert 'connected' in failures[0]
+    assert 'connected' in failures[0].message
 
 
 # nodes
@@ -635,3 +637,1688 @@ def test_rekey_an_image_to_a_note_raises(example):
     node = network['image:foo.png']
     with pytest.raises(ValueError):
         node.rekey('bar')
+
+
+# link index
+# ==========
+
+def test_links_are_read_once_and_served_from_index(example):
+    # given
+    example.make_note('foo', """
+        [[bar]]
+    """)
+    example.make_note('bar', """
+        [[foo]]
+    """)
+    network = synapse.Network(example.path)
+    assert list(network['foo'].links) == ['bar']
+
+    # when
+    example.make_note('foo', """
+        [[baz]]
+    """)
+
+    # then
+    assert list(network['foo'].links) == ['bar']
+    network.refresh()
+    assert list(network['foo'].links) == ['baz']
+
+
+def test_index_is_updated_when_link_is_added(example):
+    # given
+    example.make_note('foo')
+    example.make_note('bar')
+    network = synapse.Network(example.path)
+    assert list(network['foo'].links) == []
+
+    # when
+    network['foo'].add_link('bar')
+
+    # then
+    assert list(network['foo'].links) == ['bar']
+    assert list(network['bar'].links) == ['foo']
+
+
+def test_index_is_updated_on_rekey(example):
+    # given
+    example.make_note('foo', """
+        [[bar]]
+    """)
+    example.make_note('bar', """
+        [[foo]]
+    """)
+    network = synapse.Network(example.path)
+    assert list(network['bar'].links) == ['foo']
+
+    # when
+    network['foo'].rekey('baz')
+
+    # then
+    assert list(network['bar'].links) == ['baz']
+    assert list(network['baz'].links) == ['bar']
+    assert [n.key for n in network['bar'].predecessors] == ['baz']
+
+
+def test_backlinks_lists_notes_linking_to_key(example):
+    # given
+    example.make_note('foo', """
+        [[image:foo.png]]
+        [[bar]]
+        [[bar]]
+    """)
+    example.make_note('thought:baz', """
+        [[bar]]
+    """)
+    example.make_note('bar')
+    example.make_image('foo.png')
+
+    # when
+    network = synapse.Network(example.path)
+
+    # then
+    assert sorted(network.backlinks('bar')) == ['foo', 'thought:baz']
+    assert network.backlinks('image:foo.png') == ['foo']
+    assert network.backlinks('foo') == []
+
+
+def test_backlinks_are_updated_when_links_change(example):
+    # given
+    example.make_note('foo', """
+        [[bar]]
+    """)
+    example.make_note('bar', """
+        [[foo]]
+    """)
+    example.make_note('baz')
+    network = synapse.Network(example.path)
+    assert network.backlinks('baz') == []
+
+    # when
+    network['foo'].rekey('quux')
+    network['baz'].add_link('bar')
+
+    # then
+    assert network.backlinks('foo') == []
+    assert network.backlinks('quux') == ['bar']
+    assert sorted(network.backlinks('bar')) == ['baz', 'quux']
+
+
+# link cache
+# ==========
+
+def test_cache_is_written_to_workdir(example):
+    # given
+    example.make_note('foo', """
+        [[bar]]
+    """)
+    example.make_note('bar')
+
+    # when
+    network = synapse.Network(example.path, cache=True)
+    network.check()
+
+    # then
+    with (example.path / '.synapse' / 'cache').open() as fileobj:
+        entries = json.load(fileobj)['entries']
+    assert entries['foo'][3] == ['bar']
+    assert entries['bar'][3] == []
+
+
+def test_cache_is_used_for_notes_whose_stat_is_unchanged(example):
+    # given
+    example.make_note('foo', """
+        [[bar]]
+    """)
+    example.make_note('bar')
+    synapse.Network(example.path, cache=True).check()
+
+    # pretend the cache was written long after the notes, and tamper with it
+    cache_path = example.path / '.synapse' / 'cache'
+    with cache_path.open() as fileobj:
+        data = json.load(fileobj)
+    data['written_ns'] += 10 ** 12
+    data['entries']['foo'][3] = ['from cache']
+    with cache_path.open('w') as fileobj:
+        json.dump(data, fileobj)
+
+    # when
+    network = synapse.Network(example.path, cache=True)
+
+    # then
+    assert list(network['foo'].links) == ['from cache']
+
+
+def test_cache_settles_notes_saved_just_before_it_was_written(example, monkeypatch):
+    # given
+    example.make_note('foo', """
+        [[bar]]
+    """)
+    example.make_note('bar')
+    synapse.Network(example.path, cache=True).check()
+
+    # pretend the cache was written a second after the notes were saved
+    cache_path = example.path / '.synapse' / 'cache'
+    with cache_path.open() as fileobj:
+        data = json.load(fileobj)
+    saved_ns = max(entry[0] for entry in data['entries'].values())
+    data['written_ns'] = saved_ns + 10 ** 9
+    with cache_path.open('w') as fileobj:
+        json.dump(data, fileobj)
+
+    # when
+    monkeypatch.setattr(synapse._index.time, 'time_ns', lambda: saved_ns + 10 ** 10)
+    _, racy = synapse.Network(example.path, cache=True).check(profile=True)
+    _, settled = synapse.Network(example.path, cache=True).check(profile=True)
+
+    # then
+    assert racy.counts['reads'] == 2
+    assert settled.counts['reads'] == 0
+
+
+def test_cache_is_invalidated_by_edits_outside_synapse(example):
+    # given
+    example.make_note('foo', """
+        [[bar]]
+    """)
+    example.make_note('bar')
+    example.make_note('baz')
+    synapse.Network(example.path, cache=True).check()
+
+    # when
+    example.make_note('foo', """
+        [[baz]]
+    """)
+    network = synapse.Network(example.path, cache=True)
+
+    # then
+    assert list(network['foo'].links) == ['baz']
+    assert network.backlinks('baz') == ['foo']
+
+
+def test_cache_drops_entries_for_deleted_notes(example):
+    # given
+    example.make_note('foo')
+    example.make_note('bar')
+    synapse.Network(example.path, cache=True).check()
+
+    # when
+    (example.path / 'bar.md').unlink()
+    synapse.Network(example.path, cache=True).check()
+
+    # then
+    with (example.path / '.synapse' / 'cache').open() as fileobj:
+        entries = json.load(fileobj)['entries']
+    assert set(entries) == {'foo'}
+
+
+# sqlite index
+# ============
+
+def _query(example, sql, *params):
+    import sqlite3
+    db = sqlite3.connect(str(example.path / '.synapse' / 'index.sqlite'))
+    try:
+        return db.execute(sql, params).fetchall()
+    finally:
+        db.close()
+
+
+def test_sqlite_index_records_nodes_and_edges_with_sections(example):
+    # given
+    example.make_note('foo', """
+        [[thought:baz]]
+
+        ## :Topics:
+        - [[bar]]
+
+        ## :Images:
+        - [[image:pic.png]]
+    """)
+    example.make_note('bar')
+    example.make_note('thought:baz')
+    example.make_image('pic.png')
+
+    # when
+    network = synapse.Network(example.path, backend='sqlite')
+    network.check()
+
+    # then
+    nodes = _query(example, 'SELECT key, type, path FROM nodes ORDER BY key')
+    assert nodes == [
+        ('bar', 'topic', 'bar.md'),
+        ('foo', 'topic', 'foo.md'),
+        ('image:pic.png', 'image', 'image/pic.png'),
+        ('thought:baz', 'thought', 'thought/baz.md'),
+    ]
+    edges = _query(example, 'SELECT dst, section FROM edges WHERE src = ? ORDER BY position', 'foo')
+    assert edges == [('thought:baz', None), ('bar', 'Topics'), ('image:pic.png', 'Images')]
+
+
+def test_sqlite_backend_finds_the_same_failures(example):
+    # given
+    example.make_note('foo', """
+        [[bar]]
+        [[thought:baz]]
+    """)
+    example.make_note('bar')
+    example.make_note('thought:baz', """
+        [[foo]]
+    """)
+    example.make_note('quux')
+    example.make_image('lonely.png')
+
+    # when
+    expected = synapse.Network(example.path).check()
+    actual = synapse.Network(example.path, backend='sqlite').check()
+
+    # then
+    assert expected
+    assert actual == expected
+
+
+def test_sqlite_index_is_reconciled_with_edits_outside_synapse(example):
+    # given
+    example.make_note('foo', """
+        [[bar]]
+    """)
+    example.make_note('bar')
+    example.make_note('baz')
+    synapse.Network(example.path, backend='sqlite').check()
+
+    # when
+    example.make_note('foo', """
+        [[baz]]
+    """)
+    (example.path / 'bar.md').unlink()
+    network = synapse.Network(example.path, backend='sqlite')
+
+    # then
+    assert list(network['foo'].links) == ['baz']
+    assert network.backlinks('baz') == ['foo']
+    assert network.backlinks('bar') == []
+    assert _query(example, 'SELECT key FROM nodes ORDER BY key') == [('baz',), ('foo',)]
+
+
+def test_sqlite_index_does_not_reread_unchanged_notes(example):
+    # given
+    example.make_note('foo', """
+        [[bar]]
+    """)
+    example.make_note('bar')
+    synapse.Network(example.path, backend='sqlite').check()
+
+    # pretend the rows were written long after the notes, and tamper with them
+    import sqlite3
+    db = sqlite3.connect(str(example.path / '.synapse' / 'index.sqlite'))
+    with db:
+        db.execute('UPDATE nodes SET indexed_ns = indexed_ns + ?', (10 ** 12,))
+        db.execute("UPDATE edges SET dst = 'from index' WHERE src = 'foo'")
+    db.close()
+
+    # when
+    network = synapse.Network(example.path, backend='sqlite')
+
+    # then
+    assert list(network['foo'].links) == ['from index']
+
+
+def test_sqlite_index_follows_add_link_and_rekey(example):
+    # given
+    example.make_note('foo')
+    example.make_note('bar')
+    network = synapse.Network(example.path, backend='sqlite')
+    network.check()
+
+    # when
+    network['foo'].add_link('bar')
+    network['bar'].rekey('baz')
+
+    # then
+    assert list(network['foo'].links) == ['baz']
+    assert [n.key for n in network['foo'].predecessors] == ['baz']
+    assert _query(example, 'SELECT src, dst, section FROM edges ORDER BY src') == [
+        ('baz', 'foo', 'Topics'), ('foo', 'baz', 'Topics')
+    ]
+    assert _query(example, "SELECT path FROM nodes WHERE key = 'baz'") == [('baz.md',)]
+
+
+def test_sqlite_index_follows_reload(example):
+    # given
+    example.make_note('foo')
+    example.make_image('pic.png')
+    network = synapse.Network(example.path, backend='sqlite')
+    network.check()
+
+    # when
+    example.make_note('foo', """
+        [[bar]]
+    """)
+    example.make_note('bar')
+    (example.path / 'image' / 'pic.png').unlink()
+    network.reload(['foo.md', 'bar.md', 'image/pic.png'])
+
+    # then
+    assert network.backlinks('bar') == ['foo']
+    assert _query(example, 'SELECT key FROM nodes ORDER BY key') == [('bar',), ('foo',)]
+
+
+def test_unusable_sqlite_index_is_rebuilt(example):
+    # given
+    example.make_note('foo', """
+        [[bar]]
+    """)
+    example.make_note('bar')
+    (example.path / '.synapse').mkdir()
+    (example.path / '.synapse' / 'index.sqlite').write_bytes(b'not a database' * 100)
+
+    # when
+    network = synapse.Network(example.path, backend='sqlite')
+
+    # then
+    assert list(network['foo'].links) == ['bar']
+
+
+# check engine
+# ============
+
+def test_snapshot_is_shared_by_all_checks(example):
+    # given
+    example.make_note('foo', """
+        [[bar]]
+    """)
+    example.make_note('bar', """
+        [[foo]]
+    """)
+    network = synapse.Network(example.path)
+    seen = []
+
+    @synapse.on_snapshot
+    def record(graph, failures):
+        seen.append(graph)
+
+    # when
+    network.CHECKS.extend([record, record])
+    try:
+        network.check()
+    finally:
+        del network.CHECKS[-2:]
+
+    # then
+    assert len(seen) == 2
+    assert seen[0] is seen[1]
+    assert seen[0].links('foo') == ('bar',)
+    assert seen[0].predecessors('foo') == ('bar',)
+
+
+def test_snapshot_is_retaken_after_network_changes(example):
+    # given
+    example.make_note('foo')
+    example.make_note('bar')
+    network = synapse.Network(example.path)
+    before = network.snapshot()
+
+    # when
+    network['foo'].add_link('bar')
+
+    # then
+    after = network.snapshot()
+    assert after is not before
+    assert after.links_to('foo', 'bar')
+    assert after.links_to('bar', 'foo')
+
+
+def test_checker_taking_a_network_still_works(example):
+    # given
+    example.make_note('foo')
+
+    def legacy(network, failures):
+        for note in network.notes:
+            failures.append(f'saw {note.key}')
+
+    network = synapse.Network(example.path)
+
+    # when
+    network.CHECKS.append(legacy)
+    try:
+        failures = network.check()
+    finally:
+        network.CHECKS.remove(legacy)
+
+    # then
+    assert failures == ['saw foo']
+
+
+@pytest.mark.parametrize('jobs', [None, 1, 4])
+def test_index_is_independent_of_number_of_jobs(example, jobs):
+    # given
+    for i in range(20):
+        example.make_note(f'thought:t{i}', f"""
+            [[topic{i % 3}]]
+            [[thought:t{(i + 1) % 20}]]
+        """)
+    for i in range(3):
+        example.make_note(f'topic{i}')
+
+    # when
+    network = synapse.Network(example.path, jobs=jobs)
+    serial = synapse.Network(example.path)
+
+    # then
+    assert list(network._index.items()) == list(serial._index.items())
+    assert network.backlinks('topic0') == serial.backlinks('topic0')
+
+
+# link scanning
+# =============
+
+def test_contents_of_non_utf8_note_are_decoded_as_latin1(example):
+    # given
+    (example.path / 'foo.md').write_bytes(b'caf\xe9 [[bar]]')
+    example.make_note('bar')
+
+    # when
+    network = synapse.Network(example.path)
+
+    # then
+    assert network['foo'].contents == 'café [[bar]]'
+    assert list(network['foo'].links) == ['bar']
+
+
+def test_links_are_scanned_from_large_notes(example, monkeypatch):
+    # given
+    monkeypatch.setattr(synapse._scan, 'MMAP_THRESHOLD', 16)
+    example.make_note('foo', 'x' * 100 + '\n[[bar]] and [[thought:café]]\n' + 'y' * 100)
+
+    # when
+    network = synapse.Network(example.path)
+
+    # then
+    assert list(network['foo'].links) == ['bar', 'thought:café']
+
+
+# known paths
+# ===========
+
+def test_membership_is_answered_from_a_single_walk(example):
+    # given
+    example.make_note('foo')
+    example.make_file('dir/foo.pdf')
+    network = synapse.Network(example.path)
+    assert 'foo' in network
+
+    # when
+    example.make_note('bar')
+
+    # then
+    assert 'file:dir' in network
+    assert 'file:dir/foo.pdf' in network
+    assert 'bar' not in network
+    network.refresh()
+    assert 'bar' in network
+
+
+def test_known_paths_follow_rekey(example):
+    # given
+    example.make_note('foo')
+    example.make_file('dir/foo.pdf')
+    network = synapse.Network(example.path)
+
+    # when
+    network['foo'].rekey('thought:foo')
+    network['file:dir'].rekey('file:other/dir')
+
+    # then
+    assert 'foo' not in network
+    assert 'thought:foo' in network
+    assert 'file:dir/foo.pdf' not in network
+    assert 'file:other' in network
+    assert 'file:other/dir/foo.pdf' in network
+
+
+def test_nested_assets_are_iterated(example):
+    # given
+    example.make_note('foo')
+    example.make_image('a/b/foo.png')
+    example.make_file('dir/foo.pdf')
+    example.make_raw('x/y/z/todo.today')
+
+    # when
+    network = synapse.Network(example.path)
+
+    # then
+    assert [n.key for n in network.images] == ['image:a/b/foo.png']
+    assert [n.key for n in network.files] == ['file:dir/foo.pdf']
+    assert set(network) == {'foo', 'image:a/b/foo.png', 'file:dir/foo.pdf', 'raw:x/y/z/todo.today'}
+
+
+def test_fails_if_nested_image_has_no_predecessor(example):
+    # given
+    example.make_note('foo', """
+        [[image:a/linked.png]]
+    """)
+    example.make_image('a/linked.png')
+    example.make_image('a/b/orphan.png')
+
+    # when
+    network = synapse.Network(example.path)
+    failures = network.check()
+
+    assert len(failures) == 1
+    assert 'image:a/b/orphan.png' in failures[0].message
+
+
+def test_leftover_staged_files_are_not_nodes(example):
+    # given
+    from synapse._tree import classify
+    example.make_note('foo')
+    example.make_note('thought:a', """
+        [[foo]]
+    """)
+    (example.path / 'foo.md').write_text('[[thought:a]]')
+    # as left behind by a crash in the middle of a rekey
+    (example.path / 'thought' / '.a.md.synapse-tmp').write_text('[[foo]] [[missing]]')
+    (example.path / '.foo.md.synapse-rekey').write_text('[[missing]]')
+
+    # when
+    network = synapse.Network(example.path)
+
+    # then
+    assert set(network) == {'foo', 'thought:a'}
+    assert set(network.snapshot()) == {'foo', 'thought:a'}
+    assert network.backlinks('foo') == ['thought:a']
+    assert network.check() == []
+    assert classify('thought/.a.md.synapse-tmp') is None
+    assert classify('.foo.md.synapse-rekey') is None
+
+
+def test_symlinked_asset_directory_is_followed(example, tmp_path_factory):
+    # given
+    elsewhere = tmp_path_factory.mktemp('elsewhere')
+    (elsewhere / 'pics').mkdir()
+    (elsewhere / 'pics' / 'a.png').touch()
+    (example.path / 'image').rmdir()
+    (example.path / 'image').symlink_to(elsewhere, target_is_directory=True)
+    example.make_note('foo', """
+        [[image:pics/a.png]]
+    """)
+
+    # when
+    network = synapse.Network(example.path)
+
+    # then
+    assert 'image:pics/a.png' in set(network)
+    assert 'image:pics/a.png' in network
+    assert network.check() == []
+
+
+def test_symlinked_asset_subdirectory_is_followed(example, tmp_path_factory):
+    # given
+    elsewhere = tmp_path_factory.mktemp('elsewhere')
+    (elsewhere / 'a.png').touch()
+    (example.path / 'image' / 'pics').symlink_to(elsewhere, target_is_directory=True)
+    example.make_note('foo', """
+        [[image:pics/a.png]]
+    """)
+
+    # when
+    network = synapse.Network(example.path)
+
+    # then
+    assert 'image:pics/a.png' in set(network)
+    assert 'image:pics/a.png' in network
+    assert network.check() == []
+
+
+def test_symlink_cycles_are_not_followed(example):
+    # given
+    example.make_image('a/foo.png')
+    (example.path / 'image' / 'a' / 'loop').symlink_to(
+        example.path / 'image', target_is_directory=True
+    )
+    example.make_note('foo', """
+        [[image:a/foo.png]]
+    """)
+
+    # when
+    network = synapse.Network(example.path)
+
+    # then
+    assert [n.key for n in network.images] == ['image:a/foo.png']
+    assert 'image:a/loop' in network
+    assert network.check() == []
+
+
+def test_nodes_can_be_put_in_sets(example):
+    # given
+    example.make_note('foo', """
+        [[bar]]
+        [[thought:baz]]
+    """)
+    example.make_note('bar')
+    example.make_note('thought:baz')
+
+    # when
+    network = synapse.Network(example.path)
+    neighbors = set(network['foo'].neighbors)
+
+    # then
+    assert network['bar'] in neighbors
+    assert network['thought:baz'] in neighbors
+    assert network['foo'] not in neighbors
+    assert {network['bar']: 1}[network['bar']] == 1
+
+
+def test_rekey_resets_cached_type_and_path(example):
+    # given
+    example.make_note('thought:foo')
+    network = synapse.Network(example.path)
+    node = network['thought:foo']
+    assert node.type == 'thought'
+
+    # when
+    node.rekey('foo')
+
+    # then
+    assert node.type == 'topic'
+    assert node.path == example.path / 'foo.md'
+
+
+# profiling
+# =========
+
+def test_check_can_return_a_profile(example):
+    # given
+    example.make_note('foo', """
+        [[bar]]
+    """)
+    example.make_note('bar', """
+        [[foo]]
+    """)
+
+    # when
+    network = synapse.Network(example.path)
+    failures, profile = network.check(profile=True)
+
+    # then
+    assert failures == []
+    assert set(profile.checks) == {c.__name__ for c in network.CHECKS}
+    assert profile.counts['reads'] == 2
+    assert profile.counts['bytes_read'] == (
+        (example.path / 'foo.md').stat().st_size + (example.path / 'bar.md').stat().st_size
+    )
+    # each link, by the missing and the unidirectional link checks
+    assert profile.counts['resolutions'] == 4
+    assert profile.total >= profile.snapshot
+
+
+def test_check_accepts_any_callable_checker(example, monkeypatch):
+    # given
+    import functools
+
+    class Checker:
+        def __call__(self, network, failures):
+            failures.append('object')
+
+    def named(network, failures, message):
+        failures.append(message)
+
+    checkers = [Checker(), functools.partial(named, message='partial'), Checker()]
+    monkeypatch.setattr(synapse.Network, 'CHECKS', synapse.Network.CHECKS + checkers)
+    network = synapse.Network(example.path)
+
+    # when
+    failures = network.check()
+    _, profile = network.check(profile=True)
+
+    # then
+    assert failures == ['object', 'partial', 'object']
+    assert len(profile.checks) == len(network.CHECKS)
+
+
+def test_profile_stops_at_fatal_failure(example):
+    # given
+    example.make_note('foo', """
+        [[missing]]
+    """)
+
+    # when
+    network = synapse.Network(example.path)
+    failures, profile = network.check(profile=True)
+
+    # then
+    assert len(failures) == 1
+    assert list(profile.checks) == ['_all_links_are_existing']
+
+
+# bulk rekey
+# ==========
+
+def test_rekey_many_rewrites_each_referrer_once(example, monkeypatch):
+    # given
+    example.make_note('foo', """
+        [[bar]]
+        [[thought:baz]]
+    """)
+    example.make_note('bar', """
+        [[foo]]
+    """)
+    example.make_note('thought:baz', """
+        [[foo]]
+    """)
+    network = synapse.Network(example.path)
+
+    writes = []
+    original = synapse._network.stage_write
+    monkeypatch.setattr(
+        synapse._network, 'stage_write', lambda path, c: writes.append(path) or original(path, c)
+    )
+
+    # when
+    network.rekey_many({'bar': 'quux', 'thought:baz': 'thought:spam'})
+
+    # then
+    assert writes == [example.path / 'foo.md']
+    assert sorted(network['foo'].links) == ['quux', 'thought:spam']
+    assert 'bar' not in network
+    assert 'thought:baz' not in network
+    assert network.backlinks('foo') == ['quux', 'thought:spam']
+    assert network.check() == []
+
+
+def test_rekey_many_allows_swapping_keys(example):
+    # given
+    example.make_note('foo', """
+        [[bar]]
+        first
+    """)
+    example.make_note('bar', """
+        [[foo]]
+        second
+    """)
+    network = synapse.Network(example.path)
+
+    # when
+    network.rekey_many({'foo': 'bar', 'bar': 'foo'})
+
+    # then
+    assert 'second' in network['foo'].contents
+    assert list(network['foo'].links) == ['bar']
+    assert 'first' in network['bar'].contents
+    assert list(network['bar'].links) == ['foo']
+
+
+def test_rekey_many_leaves_network_untouched_on_error(example):
+    # given
+    example.make_note('foo', """
+        [[bar]]
+    """)
+    example.make_note('bar', """
+        [[foo]]
+    """)
+    example.make_note('baz')
+    network = synapse.Network(example.path)
+
+    # when
+    with pytest.raises(ValueError):
+        network.rekey_many({'foo': 'quux', 'bar': 'baz'})
+
+    # then
+    assert list(network['bar'].links) == ['foo']
+    assert 'foo' in network
+    assert sorted(p.name for p in example.path.glob('*.md')) == ['bar.md', 'baz.md', 'foo.md']
+
+
+@pytest.mark.parametrize('line, error', [
+    ('foo\tbar\tbaz', ':2: expected an old and a new key'),
+    ('foo bar', ':2: expected an old and a new key'),
+    ('foo\tquux', ':2: "foo" is rekeyed more than once'),
+])
+def test_rekey_from_file_rejects_bad_lines(example, tmp_path, line, error):
+    # given
+    from synapse import cli
+    example.make_note('foo')
+    mapping = tmp_path / 'mapping.tsv'
+    mapping.write_text(f'foo\tbar\n{line}\n')
+
+    # when
+    with pytest.raises(SystemExit) as excinfo:
+        cli.main([
+            '--workdir', str(example.path), '--no-daemon', 'rekey', '--from-file', str(mapping)
+        ])
+
+    # then
+    assert str(excinfo.value).startswith(f'{mapping}{error}')
+    assert 'foo' in synapse.Network(example.path)
+
+
+def test_fix_bidirectional_links_writes_each_note_once(example, monkeypatch):
+    # given
+    example.make_note('foo')
+    for name in ['a', 'b', 'c']:
+        example.make_note(f'thought:{name}', """
+            [[foo]]
+        """)
+    example.make_note('project:p', """
+        [[foo]]
+    """)
+    network = synapse.Network(example.path)
+
+    writes = []
+    original = synapse._network.atomic_write
+    monkeypatch.setattr(
+        synapse._network, 'atomic_write', lambda path, c: writes.append(path) or original(path, c)
+    )
+
+    # when
+    plan = network.fix_bidirectional_links()
+
+    # then
+    assert writes == [example.path / 'foo.md']
+    assert sorted(plan['foo']) == ['project:p', 'thought:a', 'thought:b', 'thought:c']
+    lines = network['foo'].contents.split('\n')
+    thoughts = lines.index('## :Thoughts:')
+    assert sorted(lines[thoughts + 1:thoughts + 4]) == [
+        '- [[thought:a]]', '- [[thought:b]]', '- [[thought:c]]'
+    ]
+    assert '- [[project:p]]' in lines
+    assert network.check() == []
+
+
+def test_writing_a_note_keeps_its_permissions(example):
+    # given
+    example.make_note('foo')
+    example.make_note('bar')
+    (example.path / 'foo.md').chmod(0o600)
+    network = synapse.Network(example.path)
+
+    # when
+    network['foo'].add_link('bar')
+
+    # then
+    assert (example.path / 'foo.md').stat().st_mode & 0o777 == 0o600
+    assert list(network['foo'].links) == ['bar']
+
+
+def test_writing_a_symlinked_note_writes_its_target(example, tmp_path_factory):
+    # given
+    target = tmp_path_factory.mktemp('elsewhere') / 'foo.md'
+    target.write_text('')
+    (example.path / 'foo.md').symlink_to(target)
+    example.make_note('bar', """
+        [[foo]]
+    """)
+    network = synapse.Network(example.path)
+
+    # when
+    network['foo'].add_link('bar')
+    network.rekey_many({'bar': 'baz'})
+
+    # then
+    assert (example.path / 'foo.md').is_symlink()
+    assert '[[baz]]' in target.read_text()
+    assert network.check() == []
+
+
+def test_fix_bidirectional_links_dry_run_writes_nothing(example):
+    # given
+    example.make_note('foo')
+    example.make_note('thought:bar', """
+        [[foo]]
+    """)
+    network = synapse.Network(example.path)
+
+    # when
+    plan = network.fix_bidirectional_links(dry_run=True)
+
+    # then
+    assert plan == {'foo': ['thought:bar']}
+    assert network['foo'].contents == ''
+
+
+# connectivity
+# ============
+
+def test_every_disconnected_topic_component_is_reported(example):
+    # given
+    example.make_note('a', """
+        [[b]]
+    """)
+    example.make_note('b', """
+        [[a]]
+        [[c]]
+    """)
+    example.make_note('c', """
+        [[b]]
+    """)
+    example.make_note('d', """
+        [[e]]
+    """)
+    example.make_note('e', """
+        [[d]]
+    """)
+    example.make_note('f')
+
+    # when
+    network = synapse.Network(example.path)
+    failures = network.check()
+
+    # then
+    assert len(failures) == 2
+    assert 'this component has 2: d, e' in failures[0].message
+    assert 'this component has 1: f' in failures[1].message
+
+
+def test_components_of_typed_subgraph(example):
+    # given
+    example.make_note('a', """
+        [[thought:x]]
+    """)
+    example.make_note('b', """
+        [[thought:x]]
+    """)
+    example.make_note('thought:x', """
+        [[a]]
+        [[b]]
+    """)
+
+    # when
+    network = synapse.Network(example.path)
+
+    # then
+    assert network.components(['topic']) == [{'a'}, {'b'}]
+    assert network.components(['topic', 'thought']) == [{'a', 'b', 'thought:x'}]
+
+
+def test_bfs_visits_in_breadth_first_order(example):
+    # given
+    example.make_note('root', """
+        [[a]]
+        [[b]]
+    """)
+    example.make_note('a', """
+        [[root]]
+        [[c]]
+    """)
+    example.make_note('b', """
+        [[root]]
+    """)
+    example.make_note('c', """
+        [[a]]
+    """)
+    network = synapse.Network(example.path)
+    visited = []
+
+    # when
+    synapse.bfs(network['root'], callback=lambda node: visited.append(node.key))
+
+    # then
+    assert visited == ['root', 'a', 'b', 'c']
+
+
+# search
+# ======
+
+@pytest.fixture(params=[{}, {'cache': True}], ids=['memory', 'persisted'])
+def search_options(request):
+    return request.param
+
+
+def test_search_ranks_notes_by_relevance(example, search_options):
+    # given
+    example.make_note('graphs', """
+        graphs and more graphs: graph theory
+    """)
+    example.make_note('thought:aside', """
+        a passing mention of a graph among many other words here
+    """)
+    example.make_note('cooking')
+
+    # when
+    network = synapse.Network(example.path, **search_options)
+    results = network.search('graph theory')
+
+    # then
+    assert [key for key, _ in results] == ['graphs', 'thought:aside']
+    assert results[0][1] > results[1][1] > 0
+
+
+def test_search_can_be_restricted_to_types(example, search_options):
+    # given
+    example.make_note('foo', 'apples')
+    example.make_note('thought:bar', 'apples')
+    example.make_note('journal:2021-01-01', 'apples')
+
+    # when
+    network = synapse.Network(example.path, **search_options)
+    results = network.search('apples', types=['thought', 'journal'])
+
+    # then
+    assert {key for key, _ in results} == {'thought:bar', 'journal:2021-01-01'}
+
+
+def test_search_can_be_restricted_to_a_neighborhood(example, search_options):
+    # given
+    example.make_note('a', """
+        apples
+        [[b]]
+    """)
+    example.make_note('b', """
+        apples
+        [[c]]
+    """)
+    example.make_note('c', 'apples')
+    example.make_note('d', 'apples')
+
+    # when
+    network = synapse.Network(example.path, **search_options)
+
+    # then
+    assert {key for key, _ in network.search('apples', near='b')} == {'a', 'b', 'c'}
+    assert {key for key, _ in network.search('apples', near='a', hops=1)} == {'a', 'b'}
+    assert {key for key, _ in network.search('apples', near='a', hops=2)} == {'a', 'b', 'c'}
+
+
+def test_search_finds_notes_by_name(example, search_options):
+    # given
+    example.make_note('thought:bananas')
+
+    # when
+    network = synapse.Network(example.path, **search_options)
+
+    # then
+    assert [key for key, _ in network.search('bananas')] == ['thought:bananas']
+
+
+def test_search_index_follows_changes_made_by_synapse(example, search_options):
+    # given
+    example.make_note('foo', 'apples')
+    example.make_note('bar', 'bananas')
+    network = synapse.Network(example.path, **search_options)
+    assert [key for key, _ in network.search('apples')] == ['foo']
+
+    # when
+    network['foo'].add_link('bar')
+    network['foo'].rekey('baz')
+
+    # then
+    assert [key for key, _ in network.search('apples')] == ['baz']
+    assert {key for key, _ in network.search('bar')} == {'bar', 'baz'}
+
+
+def test_search_index_follows_reload(example, search_options):
+    # given
+    example.make_note('foo', 'apples')
+    network = synapse.Network(example.path, **search_options)
+    assert network.search('bananas') == []
+
+    # when
+    example.make_note('foo', 'bananas')
+    example.make_note('bar', 'bananas')
+    network.reload(['foo.md', 'bar.md'])
+
+    # then
+    assert network.search('apples') == []
+    assert {key for key, _ in network.search('bananas')} == {'foo', 'bar'}
+
+
+def test_search_index_is_persisted_with_the_cache(example):
+    # given
+    import sqlite3
+    example.make_note('foo', 'apples')
+    example.make_note('bar', 'bananas')
+    assert synapse.Network(example.path, cache=True).search('apples')
+
+    # pretend the index was written long after the notes, and tamper with it
+    with sqlite3.connect(example.path / '.synapse' / 'search.sqlite') as db:
+        db.execute('UPDATE notes SET indexed_ns = indexed_ns + ?', (10 ** 12,))
+        db.execute("INSERT INTO postings SELECT 'cherries', id, 1 FROM notes WHERE key = 'bar'")
+    db.close()
+
+    # when
+    from synapse._profile import COUNTERS
+    reads = COUNTERS.copy().get('reads', 0)
+    results = synapse.Network(example.path, cache=True).search('cherries')
+
+    # then
+    assert [key for key, _ in results] == ['bar']
+    assert COUNTERS.copy().get('reads', 0) == reads
+
+
+@pytest.mark.parametrize('options', [{'cache': True}, {'backend': 'sqlite'}])
+def test_persisted_search_index_follows_edits_outside_synapse(example, options):
+    # given
+    example.make_note('foo', 'apples')
+    example.make_note('bar', 'bananas')
+    example.make_note('baz', 'cherries')
+    synapse.Network(example.path, **options).search('apples')
+
+    # when
+    example.make_note('foo', 'bananas')
+    (example.path / 'baz.md').unlink()
+    example.make_note('thought:new', 'cherries')
+    network = synapse.Network(example.path, **options)
+
+    # then
+    assert network.search('apples') == []
+    assert {key for key, _ in network.search('bananas')} == {'foo', 'bar'}
+    assert [key for key, _ in network.search('cherries')] == ['thought:new']
+    assert network.search('bananas') == synapse.Network(example.path).search('bananas')
+
+
+# graph queries
+# =============
+
+def _chain(example):
+    example.make_note('a', """
+        [[b]]
+    """)
+    example.make_note('b', """
+        [[a]]
+        [[thought:c]]
+    """)
+    example.make_note('thought:c', """
+        [[image:pic.png]]
+    """)
+    example.make_image('pic.png')
+    example.make_note('lonely')
+
+
+def test_shortest_path(example):
+    # given
+    _chain(example)
+
+    # when
+    network = synapse.Network(example.path)
+
+    # then
+    assert network.shortest_path('a', 'image:pic.png') == ['a', 'b', 'thought:c', 'image:pic.png']
+    assert network.shortest_path('thought:c', 'a') == ['thought:c', 'b', 'a']
+    assert network.shortest_path('thought:c', 'a', directed=True) is None
+    assert network.shortest_path('a', 'lonely') is None
+    assert network.shortest_path('a', 'a') == ['a']
+
+
+def test_shortest_path_raises_for_missing_keys(example):
+    # given
+    _chain(example)
+    network = synapse.Network(example.path)
+
+    # when / then
+    with pytest.raises(synapse.NetworkKeyError):
+        network.shortest_path('a', 'nonexistent')
+
+
+def test_neighborhood_filtered_by_type(example):
+    # given
+    _chain(example)
+
+    # when
+    network = synapse.Network(example.path)
+
+    # then
+    assert network.neighborhood('a') == {'a', 'b'}
+    assert network.neighborhood('a', hops=3) == {'a', 'b', 'thought:c', 'image:pic.png'}
+    assert network.neighborhood('a', hops=3, types=['thought', 'image']) == {
+        'thought:c', 'image:pic.png'
+    }
+
+
+def test_subgraph_keeps_only_links_among_its_keys(example):
+    # given
+    _chain(example)
+
+    # when
+    network = synapse.Network(example.path)
+
+    # then
+    assert network.subgraph(['a', 'b', 'image:pic.png']) == {
+        'a': ['b'], 'b': ['a'], 'image:pic.png': []
+    }
+
+
+def test_orphans_and_sinks(example):
+    # given
+    _chain(example)
+
+    # when
+    network = synapse.Network(example.path)
+
+    # then
+    assert network.orphans() == ['lonely']
+    assert network.sinks() == ['image:pic.png']
+    assert network.sinks(['topic']) == []
+
+
+# ranking
+# =======
+
+def _star(example):
+    example.make_note('hub', """
+        [[a]]
+        [[b]]
+        [[c]]
+        [[thought:x]]
+    """)
+    for key in ['a', 'b', 'c']:
+        example.make_note(key, """
+            [[hub]]
+        """)
+    example.make_note('thought:x', """
+        [[hub]]
+    """)
+
+
+@pytest.mark.parametrize('method', ['pagerank', 'degree', 'betweenness'])
+def test_rank_puts_hub_first(example, method):
+    # given
+    _star(example)
+
+    # when
+    network = synapse.Network(example.path)
+    results = network.rank(method)
+
+    # then
+    assert results[0][0] == 'hub'
+    assert len(results) == 5
+
+
+def test_rank_scores(example):
+    # given
+    _star(example)
+
+    # when
+    network = synapse.Network(example.path)
+
+    # then
+    assert sum(score for _, score in network.rank('pagerank')) == pytest.approx(1)
+    assert dict(network.rank('degree'))['hub'] == 4
+    # every path between two of the four leaves passes through the hub
+    assert dict(network.rank('betweenness'))['hub'] == pytest.approx(6)
+    assert dict(network.rank('betweenness'))['a'] == 0
+
+
+def test_rank_can_be_restricted_to_types(example):
+    # given
+    _star(example)
+
+    # when
+    network = synapse.Network(example.path)
+    results = network.rank('degree', types=['topic'], limit=2)
+
+    # then
+    assert results == [('hub', 3), ('a', 1)]
+
+
+@pytest.fixture(params=[False, True], ids=['python', 'numpy'])
+def vectorized(request):
+    if request.param:
+        pytest.importorskip('numpy')
+        pytest.importorskip('scipy')
+    return request.param
+
+
+def _random_adjacency(seed, n=40, edges=80):
+    import random
+    from synapse._graph import Adjacency
+    rng = random.Random(seed)
+    keys = [f'k{i}' for i in range(n)]
+    links = {}
+    for _ in range(edges):
+        links.setdefault(rng.choice(keys), []).append(rng.choice(keys + ['missing']))
+    return Adjacency(keys, links)
+
+
+def test_rank_scores_of_each_backend(example, vectorized):
+    # given
+    from synapse import _rank
+    _star(example)
+    adjacency = synapse.Network(example.path).snapshot().adjacency
+    hub, leaf = adjacency.ids['hub'], adjacency.ids['a']
+
+    # when
+    pagerank = _rank.scores(adjacency, 'pagerank', vectorized=vectorized)
+    degree = _rank.scores(adjacency, 'degree', vectorized=vectorized)
+    betweenness = _rank.scores(adjacency, 'betweenness', vectorized=vectorized)
+
+    # then
+    assert sum(pagerank) == pytest.approx(1)
+    assert max(pagerank) == pagerank[hub]
+    assert degree[hub] == 4
+    assert betweenness[hub] == pytest.approx(6)
+    assert betweenness[leaf] == 0
+
+
+@pytest.mark.parametrize('method', ['pagerank', 'betweenness'])
+def test_rank_backends_agree_on_random_graphs(method):
+    # given
+    from synapse import _rank
+    pytest.importorskip('numpy')
+    pytest.importorskip('scipy')
+
+    for seed in range(30):
+        adjacency = _random_adjacency(seed)
+
+        # when
+        python = _rank.scores(adjacency, method, samples=16, seed=seed, vectorized=False)
+        numpy = _rank.scores(adjacency, method, samples=16, seed=seed, vectorized=True)
+
+        # then
+        assert numpy == pytest.approx(python, abs=1e-9)
+
+
+# export
+# ======
+
+def _exported(network, format):
+    import io
+    out = io.StringIO()
+    network.export(out, format)
+    return out.getvalue()
+
+
+def _linked(example):
+    example.make_note('foo', """
+        [[missing]]
+
+        ## :Thoughts:
+        - [[thought:bar]]
+    """)
+    example.make_note('thought:bar', """
+        [[foo]]
+    """)
+    example.make_image('pic.png')
+
+
+def test_export_jsonl_streams_nodes_and_edges(example):
+    # given
+    _linked(example)
+    network = synapse.Network(example.path)
+
+    # when
+    records = [json.loads(line) for line in _exported(network, 'jsonl').splitlines()]
+
+    # then
+    nodes = {r['key']: r for r in records if r['kind'] == 'node'}
+    edges = [(r['src'], r['dst'], r['section']) for r in records if r['kind'] == 'edge']
+    assert set(nodes) == {'foo', 'thought:bar', 'image:pic.png'}
+    assert nodes['thought:bar']['path'] == 'thought/bar.md'
+    assert nodes['image:pic.png']['type'] == 'image'
+    assert nodes['foo']['size'] == (example.path / 'foo.md').stat().st_size
+    assert sorted(edges, key=str) == sorted([
+        ('foo', 'missing', None),
+        ('foo', 'thought:bar', 'Thoughts'),
+        ('thought:bar', 'foo', None),
+    ], key=str)
+
+
+def test_export_graphml_declares_every_edge_endpoint(example):
+    # given
+    import xml.etree.ElementTree as ET
+    _linked(example)
+    network = synapse.Network(example.path)
+
+    # when
+    root = ET.fromstring(_exported(network, 'graphml'))
+
+    # then
+    ns = {'g': 'http://graphml.graphdrawing.org/xmlns'}
+    nodes = {n.get('id') for n in root.iterfind('.//g:node', ns)}
+    edges = {(e.get('source'), e.get('target')) for e in root.iterfind('.//g:edge', ns)}
+    assert nodes == {'foo', 'thought:bar', 'image:pic.png', 'missing'}
+    assert edges == {('foo', 'missing'), ('foo', 'thought:bar'), ('thought:bar', 'foo')}
+
+
+def test_export_dot_and_csv(example):
+    # given
+    import csv
+    _linked(example)
+    network = synapse.Network(example.path)
+
+    # when
+    dot = _exported(network, 'dot')
+    rows = list(csv.DictReader(_exported(network, 'csv').splitlines()))
+
+    # then
+    assert dot.startswith('digraph synapse {')
+    assert '"foo" -> "thought:bar" [section="Thoughts"];' in dot
+    assert {(r['src'], r['dst']) for r in rows if r['kind'] == 'edge'} == {
+        ('foo', 'missing'), ('foo', 'thought:bar'), ('thought:bar', 'foo')
+    }
+
+
+# structured failures
+# ===================
+
+
+def _reported(network, format):
+    import io
+    from synapse import _report
+    out = io.StringIO()
+    writer = _report.WRITERS[format](out, root=network.root)
+    network.check(report=writer.write)
+    writer.close()
+    return out.getvalue()
+
+
+def test_missing_link_failure_records_line_and_key(example):
+    # given
+    example.make_note('foo', """
+        some text
+
+        [[missing]]
+    """)
+    network = synapse.Network(example.path)
+
+    # when
+    failures = network.check()
+
+    # then
+    assert failures == [synapse.Failure(
+        'SYN001', 'Link to nonexistant "missing"', path=example.path / 'foo.md',
+        line=4, key='missing'
+    )]
+    assert failures[0].check == 'missing-link'
+    assert str(failures[0]) == f'{example.path / "foo.md"} -- Link to nonexistant "missing"'
+
+
+def test_check_reports_each_failure_as_it_is_found(example):
+    # given
+    example.make_note('foo', """
+        [[bar]]
+    """)
+    example.make_note('bar')
+    network = synapse.Network(example.path)
+    reported = []
+
+    # when
+    failures = network.check(report=reported.append)
+
+    # then
+    assert reported == failures
+    assert [f.code for f in failures] == ['SYN002']
+    assert failures[0].key == 'foo'
+
+
+def test_check_reports_failures_added_by_any_list_method(example, monkeypatch):
+    # given
+    def add_in_place(network, failures):
+        failures += ['added']
+        failures.insert(0, 'inserted')
+
+    monkeypatch.setattr(synapse.Network, 'CHECKS', synapse.Network.CHECKS + [add_in_place])
+    network = synapse.Network(example.path)
+    reported = []
+
+    # when
+    failures = network.check(report=reported.append)
+
+    # then
+    assert sorted(reported) == sorted(failures) == ['added', 'inserted']
+
+
+def test_check_json_writes_one_record_per_line(example):
+    # given
+    import json
+    example.make_note('foo', """
+        [[bar]]
+    """)
+    example.make_note('bar')
+    example.make_image('pic.png')
+    network = synapse.Network(example.path)
+
+    # when
+    records = [json.loads(line) for line in _reported(network, 'json').splitlines()]
+
+    # then
+    assert sorted((r['code'], r['check'], r['path'], r['key']) for r in records) == [
+        ('SYN002', 'unidirectional-link', 'bar.md', 'foo'),
+        ('SYN005', 'asset-without-predecessor', 'image/pic.png', 'image:pic.png'),
+    ]
+    assert all(r['severity'] == 'error' for r in records)
+
+
+def test_check_sarif_is_a_valid_log(example):
+    # given
+    import json
+    example.make_note('foo', """
+        [[missing]]
+    """)
+    network = synapse.Network(example.path)
+
+    # when
+    log = json.loads(_reported(network, 'sarif'))
+
+    # then
+    run, = log['runs']
+    assert log['version'] == '2.1.0'
+    assert {rule['id'] for rule in run['tool']['driver']['rules']} >= {'SYN001', 'SYN006'}
+    result, = run['results']
+    assert result['ruleId'] == 'SYN001'
+    location = result['locations'][0]['physicalLocation']
+    assert location == {'artifactLocation': {'uri': 'foo.md'}, 'region': {'startLine': 2}}
+
+
+def test_check_sarif_without_failures_is_a_valid_log(example):
+    # given
+    import json
+    example.make_note('foo')
+    network = synapse.Network(example.path)
+
+    # when
+    log = json.loads(_reported(network, 'sarif'))
+
+    # then
+    assert log['runs'][0]['results'] == []
+
+
+# incremental check
+# =================
+
+
+def _git(path, *args):
+    import subprocess
+    subprocess.run(
+        ['git', '-C', str(path), '-c', 'user.name=test', '-c', 'user.email=test@example.com',
+         *args],
+        check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+
+def _committed_chain(example):
+    # a - b - c - d linked both ways, d linking to an image; x - y and the
+    # thought fail, but are unrelated to the changes made afterwards
+    example.make_note('a', '[[b]]')
+    example.make_note('b', '[[a]] [[c]]')
+    example.make_note('c', '[[b]] [[d]]')
+    example.make_note('d', '[[c]] [[image:pic.png]]')
+    example.make_image('pic.png')
+    example.make_note('x', '[[y]]')
+    example.make_note('y', '[[x]]')
+    example.make_note('thought:lonely')
+    _git(example.path, 'init', '-q')
+    _git(example.path, 'add', '.')
+    _git(example.path, 'commit', '-q', '-m', 'initial')
+
+
+def _concerning(failures, graph, scope):
+    """The failures of a full check which concern the given keys."""
+    paths = {graph.path(key) for key in scope}
+    return {
+        f for f in failures
+        if f.path in paths
+        or f.code == 'SYN006' and not scope.isdisjoint(f.message.split(': ')[1].split(', '))
+    }
+
+
+def test_affected_since_includes_old_and_new_neighbors(example):
+    # given
+    _committed_chain(example)
+    example.make_note('b', '[[a]]')
+
+    # when
+    affected = synapse.Network(example.path).affected_since('HEAD')
+
+    # then
+    assert affected == {'a', 'b', 'c'}
+
+
+def test_check_since_reports_only_affected_failures(example):
+    # given
+    _committed_chain(example)
+    example.make_note('b', '[[a]]')
+    network = synapse.Network(example.path)
+
+    # when
+    scope = network.affected_since('HEAD')
+    failures = network.check(scope=scope)
+
+    # then
+    assert [(f.code, f.path.name, f.key) for f in failures] == [('SYN002', 'b.md', 'c')]
+    assert set(failures) == _concerning(network.check(), network.snapshot(), scope)
+
+
+def test_check_since_reports_split_topic_components(example):
+    # given
+    _committed_chain(example)
+    example.make_note('b', '[[a]]')
+    example.make_note('c', '[[d]]')
+    network = synapse.Network(example.path)
+
+    # when
+    scope = network.affected_since('HEAD')
+    failures = network.check(scope=scope)
+
+    # then
+    assert [(f.code, f.path.name) for f in failures] == [('SYN006', 'c.md')]
+    assert set(failures) == _concerning(network.check(), network.snapshot(), scope)
+
+
+def test_check_since_includes_untracked_notes_and_dropped_links(example):
+    # given
+    _committed_chain(example)
+    example.make_note('d', '[[c]]')
+    example.make_note('thought:new', '[[x]]')
+    example.make_note('x', '[[y]] [[thought:new]]')
+    network = synapse.Network(example.path)
+
+    # when
+    scope = network.affected_since('HEAD')
+    failures = network.check(scope=scope)
+
+    # then
+    assert {'image:pic.png', 'thought:new', 'x'} <= scope
+    assert 'thought:lonely' not in scope
+    assert {(f.code, f.path.name) for f in failures} == {
+        ('SYN005', 'pic.png'), ('SYN006', 'x.md')
+    }
+    assert set(failures) == _concerning(network.check(), network.snapshot(), scope)
+
+
+def test_affected_since_unknown_revision_raises(example):
+    # given
+    _committed_chain(example)
+    network = synapse.Network(example.path)
+
+    # when / then
+    with pytest.raises(synapse.exceptions.GitError):
+        network.affected_since('no-such-revision')
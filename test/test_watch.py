@@ -0,0 +1,240 @@
+import sys
+
+import pytest
+
+import synapse
+from synapse._watch import IncrementalChecker, InotifyWatcher, PollingWatcher, RESCAN, watch
+
+
+def test_reload_picks_up_changed_notes(example):
+    # given
+    example.make_note('foo')
+    example.make_note('bar')
+    network = synapse.Network(example.path)
+    assert network.backlinks('bar') == []
+
+    # when
+    example.make_note('foo', """
+        [[bar]]
+    """)
+    example.make_note('thought:baz')
+    (example.path / 'bar.md').unlink()
+    changed = network.reload(['foo.md', 'thought/baz.md', 'bar.md'])
+
+    # then
+    assert changed == {'foo', 'thought:baz', 'bar'}
+    assert network.backlinks('bar') == ['foo']
+    assert 'thought:baz' in network
+    assert 'bar' not in network
+
+
+def test_reload_of_a_new_directory_finds_the_files_in_it(example):
+    # given
+    example.make_note('foo')
+    network = synapse.Network(example.path)
+
+    # when
+    example.make_image('a/b/foo.png')
+    changed = network.reload(['image/a'])
+
+    # then
+    assert changed == {'image:a/b/foo.png'}
+    assert 'image:a/b/foo.png' in network
+
+
+def test_incremental_check_matches_full_check(example):
+    # given
+    example.make_note('foo', """
+        [[bar]]
+    """)
+    example.make_note('bar', """
+        [[foo]]
+    """)
+    example.make_note('project:p', """
+        [[foo]]
+    """)
+    network = synapse.Network(example.path)
+    checker = IncrementalChecker(network)
+    assert checker.check() == network.check()
+
+    # when
+    example.make_note('project:p')
+    example.make_note('baz')
+    network.reload(['project/p.md', 'baz.md'])
+    failures = checker.check({'project', 'topic'})
+
+    # then
+    assert failures == synapse.Network(example.path).check()
+    assert len(failures) == 2
+
+
+def test_incremental_check_reruns_checkers_skipped_by_a_fatal_failure(example):
+    # given
+    example.make_note('foo', """
+        [[project:p]] [[thought:x]]
+    """)
+    example.make_note('project:p', """
+        [[foo]]
+    """)
+    example.make_note('thought:x', """
+        [[foo]]
+    """)
+    network = synapse.Network(example.path)
+    checker = IncrementalChecker(network)
+    assert checker.check() == []
+
+    example.make_note('project:p')
+    example.make_note('thought:x', """
+        [[foo]] [[missing]]
+    """)
+    network.reload(['project/p.md', 'thought/x.md'])
+    assert [f.code for f in checker.check({'project', 'thought'})] == ['SYN001']
+
+    # when
+    example.make_note('thought:x', """
+        [[foo]]
+    """)
+    network.reload(['thought/x.md'])
+    failures = checker.check({'thought'})
+
+    # then
+    assert failures == synapse.Network(example.path).check()
+    assert 'SYN003' in [f.code for f in failures]
+
+
+def test_incremental_check_only_reruns_affected_checkers(example, monkeypatch):
+    # given
+    example.make_note('foo')
+    example.make_note('thought:bar', """
+        [[foo]]
+    """)
+    network = synapse.Network(example.path)
+    checker = IncrementalChecker(network)
+    checker.check()
+
+    calls = []
+
+    @synapse._network.depends_on('journal')
+    def journal_only(network, failures):
+        calls.append('journal')
+
+    monkeypatch.setattr(synapse.Network, 'CHECKS', synapse.Network.CHECKS + [journal_only])
+
+    # when
+    checker.check()
+    checker.check({'thought'})
+    checker.check({'journal'})
+
+    # then
+    assert calls == ['journal', 'journal']
+
+
+def test_watch_reports_new_and_resolved_failures(example):
+    # given
+    example.make_note('foo', """
+        [[bar]]
+    """)
+    example.make_note('bar')
+    network = synapse.Network(example.path)
+    lines = []
+
+    def edit_then_report_changes():
+        example.make_note('bar', """
+            [[foo]]
+        """)
+        return {'bar.md'}
+
+    class Watcher:
+        def wait(self):
+            return edit_then_report_changes()
+
+    # when
+    watch(network, Watcher(), report=lines.append, iterations=1)
+
+    # then
+    assert len(lines) == 2
+    assert 'but not back' in lines[0]
+    assert lines[1].startswith('- ') and 'but not back' in lines[1]
+
+
+def test_watch_rereads_everything_after_a_rescan(example):
+    # given
+    example.make_note('foo', """
+        [[bar]]
+    """)
+    example.make_note('bar')
+    network = synapse.Network(example.path)
+    lines = []
+
+    def edit_then_lose_track():
+        example.make_note('bar', """
+            [[foo]]
+        """)
+        return {RESCAN}
+
+    class Watcher:
+        def wait(self):
+            return edit_then_lose_track()
+
+    # when
+    watch(network, Watcher(), report=lines.append, iterations=1)
+
+    # then
+    assert len(lines) == 2
+    assert lines[1].startswith('- ') and 'but not back' in lines[1]
+
+
+def test_polling_watcher_finds_changed_files(example):
+    # given
+    example.make_note('foo')
+    watcher = PollingWatcher(example.path, interval=0.01)
+
+    # when
+    example.make_note('foo', 'changed')
+    example.make_image('a/foo.png')
+
+    # then
+    assert watcher.wait(timeout=1) == {'foo.md', 'image/a/foo.png'}
+    assert watcher.wait(timeout=0) == set()
+
+
+@pytest.mark.skipif(not sys.platform.startswith('linux'), reason='inotify is Linux only')
+def test_inotify_watcher_finds_changed_files(example):
+    # given
+    example.make_note('foo')
+    watcher = InotifyWatcher(example.path)
+
+    try:
+        # when
+        example.make_note('thought:bar')
+        example.make_image('a/b/foo.png')
+        changed = watcher.wait(timeout=1)
+    finally:
+        watcher.close()
+
+    # then
+    assert 'thought/bar.md' in changed
+    assert 'image/a' in changed
+    assert 'image/a/b/foo.png' in changed or 'image/a/b' in changed
+
+
+@pytest.mark.skipif(not sys.platform.startswith('linux'), reason='inotify is Linux only')
+def test_inotify_watcher_reports_a_queue_overflow_as_a_rescan(example):
+    # given
+    import os
+    watcher = InotifyWatcher(example.path)
+    read_fd, write_fd = os.pipe()
+    os.set_blocking(read_fd, False)
+    os.close(watcher._fd)
+    watcher._fd = read_fd
+
+    try:
+        # when
+        os.write(write_fd, InotifyWatcher.EVENT.pack(-1, InotifyWatcher.IN_Q_OVERFLOW, 0, 0))
+        changed = watcher.wait(timeout=1)
+    finally:
+        watcher.close()
+        os.close(write_fd)
+
+    # then
+    assert changed == {RESCAN}